@@ -0,0 +1,213 @@
+# File: AdvCache.py
+
+"""
+This module implements the compiled world cache.  The rooms, passages,
+objects and synonyms for a game are stored together in a single binary
+file next to the data files, so that AdvGame can skip parsing the text
+files when nothing has changed since the cache was written.
+"""
+
+# Cache format
+# ------------
+# A cache file consists of a small header followed by the world data,
+# both in marshal format, so that opening a cache never unpickles
+# anything.  The header records the cache version and a signature for
+# each of the source files, which means that a stale cache can be
+# rejected without reading the world.  The world itself is stored as
+# plain tuples, lists and dictionaries, because marshal loads those
+# several times faster than pickle can rebuild class instances.
+#
+# The signature for each source file is the tuple (mtime, size, digest).
+# A cache is fresh if every source file either has the same mtime and
+# size as when the cache was written or, failing that, the same content
+# hash.  A source file that is missing is recorded as None, so adding
+# or removing an Objects.txt or Synonyms.txt file also invalidates the
+# cache.  The signatures are taken before the files are parsed, so an
+# edit made while they are being read leaves the cache looking stale
+# rather than fresh.
+
+import argparse
+import hashlib
+import marshal
+import os
+import sys
+import time
+from AdvObject import AdvObject
+from AdvRoom import AdvRoom
+
+# Constants
+
+CACHE_SUFFIX = "World.cache"
+CACHE_VERSION = 3
+CACHE_TAG = (CACHE_VERSION, marshal.version, sys.implementation.cache_tag)
+SOURCE_SUFFIXES = [ "Rooms.txt", "Objects.txt", "Synonyms.txt" ]
+
+def getCachePath(prefix):
+    """Returns the name of the cache file for the specified prefix."""
+    return prefix + CACHE_SUFFIX
+
+def getSignature(filename):
+    """Returns the (mtime, size, digest) signature of a source file,
+    or None if the file does not exist."""
+    try:
+        with open(filename, "rb") as f:
+            stat = os.fstat(f.fileno())
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, digest)
+
+def getSignatures(prefix):
+    """Returns the dictionary of signatures for the source files with
+    the specified prefix, in the form recorded in a cache header."""
+    return { suffix: getSignature(prefix + suffix)
+             for suffix in SOURCE_SUFFIXES }
+
+def isFresh(prefix, signatures):
+    """Returns True if the source files for prefix still match the
+    signatures recorded in a cache header."""
+    for suffix in SOURCE_SUFFIXES:
+        filename = prefix + suffix
+        saved = signatures.get(suffix)
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            if saved is not None:
+                return False
+            continue
+        if saved is None:
+            return False
+        if (stat.st_mtime_ns, stat.st_size) == saved[:2]:
+            continue
+        current = getSignature(filename)
+        if current is None or current[2] != saved[2]:
+            return False
+    return True
+
+def encodeWorld(world):
+    """Converts the (rooms, objects, synonyms) tuple into plain data.
+    The first room in the list is the starting room."""
+    rooms, objects, synonyms = world
+    room_data = [ ]
+    for name, room in rooms.items():
+        if name != "START":
+            room_data.append((room.getName(), room.getShortDescription(),
+                              room.getLongText(), room.getPassages()))
+    object_data = None
+    if objects is not None:
+        object_data = [ (obj.getName(), obj.getDescription(),
+                         obj.getInitialLocation())
+                        for obj in objects.values() ]
+    return room_data, object_data, synonyms
+
+def decodeWorld(data):
+    """Rebuilds the (rooms, objects, synonyms) tuple from plain data."""
+    room_data, object_data, synonyms = data
+    rooms = { }
+    for name, shortdesc, longdesc, passages in room_data:
+        room = AdvRoom(name, shortdesc, longdesc, passages)
+        if len(rooms) == 0:
+            rooms["START"] = room
+        rooms[name] = room
+    objects = None
+    if object_data is not None:
+        objects = { }
+        for name, description, location in object_data:
+            objects[name] = AdvObject(name, description, location)
+    return rooms, objects, synonyms
+
+def readCache(prefix):
+    """Returns the world stored in the cache for prefix, or None if
+    there is no cache, it is out of date or its data is damaged."""
+    try:
+        with open(getCachePath(prefix), "rb") as f:
+            header = marshal.load(f)
+            if not isinstance(header, dict):
+                return None
+            if header.get("version") != CACHE_TAG:
+                return None
+            if not isFresh(prefix, header.get("sources", { })):
+                return None
+            data = marshal.loads(f.read())
+        return decodeWorld(data)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def writeCache(prefix, world, signatures):
+    """Writes the world to the cache for prefix, recording signatures,
+    which getSignatures must have returned before the world was read
+    from the source files.  The cache is only an optimization, so
+    failing to write it is not an error."""
+    header = {
+        "version": CACHE_TAG,
+        "sources": signatures
+    }
+    filename = getCachePath(prefix)
+    temp = filename + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(temp, "wb") as f:
+            marshal.dump(header, f)
+            marshal.dump(encodeWorld(world), f)
+        os.replace(temp, filename)
+        return True
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return False
+
+def compileWorld(prefix):
+    """Parses the data files for prefix and writes a fresh cache."""
+    from AdvGame import AdvGame
+    signatures = getSignatures(prefix)
+    return writeCache(prefix, AdvGame.readWorld(prefix), signatures)
+
+def benchmark(prefix, repeat):
+    """Compares the time to parse the data files for prefix with the
+    time to load the compiled cache, returning both in seconds."""
+    from AdvGame import AdvGame
+    signatures = getSignatures(prefix)
+    start = time.perf_counter()
+    for i in range(repeat):
+        world = AdvGame.readWorld(prefix)
+    parse_time = (time.perf_counter() - start) / repeat
+    writeCache(prefix, world, signatures)
+    start = time.perf_counter()
+    for i in range(repeat):
+        world = readCache(prefix)
+    load_time = (time.perf_counter() - start) / repeat
+    if world is None:
+        raise RuntimeError("Cannot write the cache for " + prefix)
+    return parse_time, load_time
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Precompile Adventure worlds into binary caches.")
+    parser.add_argument("prefixes", nargs="+", metavar="PREFIX",
+                        help="data file prefix, such as Crowther")
+    parser.add_argument("--bench", action="store_true",
+                        help="compare parse time with cached load time")
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="iterations per benchmark (default 100)")
+    options = parser.parse_args(args)
+    status = 0
+    for prefix in options.prefixes:
+        if options.bench:
+            parse_time, load_time = benchmark(prefix, options.repeat)
+            print("%-12s parse %9.1f us   cached %9.1f us   %6.1fx" %
+                  (prefix, parse_time * 1e6, load_time * 1e6,
+                   parse_time / load_time))
+        elif compileWorld(prefix):
+            print("Compiled " + prefix + " to " + getCachePath(prefix))
+        else:
+            print("Cannot write " + getCachePath(prefix), file=sys.stderr)
+            status = 1
+    return status
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
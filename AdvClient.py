@@ -0,0 +1,105 @@
+# File: AdvClient.py
+
+"""
+This module implements a load generator for AdvServer.  It opens many
+concurrent connections, plays the same script of commands on each one,
+and reports the latency of each command, measured from sending the
+command to receiving the next prompt.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from AdvServer import DEFAULT_PORT, ENCODING, PROMPT
+
+# Constants
+
+DEFAULT_SCRIPT = [ "IN", "TAKE KEYS", "INVENTORY", "DROP KEYS", "LOOK", "OUT" ]
+
+async def playScript(open_connection, script, latencies, world=None):
+    """Plays the script on one connection, appending the latency of each
+    command in seconds to latencies.  If world is given, it is sent first
+    to choose the world on a server that hosts several."""
+    reader, writer = await open_connection()
+    prompt = PROMPT.encode(ENCODING)
+    try:
+        await reader.readuntil(prompt)
+        if world is not None:
+            writer.write((world + "\n").encode(ENCODING))
+            await reader.readuntil(prompt)
+        for command in script:
+            start = time.perf_counter()
+            writer.write((command + "\n").encode(ENCODING))
+            await reader.readuntil(prompt)
+            latencies.append(time.perf_counter() - start)
+        writer.write(b"QUIT\n")
+        await reader.read()
+    finally:
+        writer.close()
+
+def percentile(values, fraction):
+    """Returns the value at the specified fraction of a sorted list."""
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def runLoad(open_connection, connections, script, world=None):
+    """Plays the script on the specified number of concurrent connections
+    and returns the sorted latencies, the elapsed time and the number of
+    connections that failed."""
+    latencies = [ ]
+    start = time.perf_counter()
+    tasks = [ playScript(open_connection, script, latencies, world)
+              for i in range(connections) ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for result in results if isinstance(result, Exception))
+    latencies.sort()
+    return latencies, elapsed, failures
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Measure command latency against an AdvServer.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="server address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="server TCP port (default %d)" % DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH",
+                        help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=1000,
+                        help="number of concurrent connections (default 1000)")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="times to repeat the script on each connection")
+    parser.add_argument("--script", metavar="FILE",
+                        help="file of commands to play, one per line")
+    parser.add_argument("--world",
+                        help="world to choose on a server hosting several")
+    options = parser.parse_args(args)
+    script = DEFAULT_SCRIPT
+    if options.script is not None:
+        with open(options.script) as f:
+            script = [ line.strip() for line in f if line.strip() != "" ]
+    script = script * options.rounds
+    if options.unix is not None:
+        open_connection = lambda: asyncio.open_unix_connection(options.unix)
+    else:
+        open_connection = lambda: asyncio.open_connection(options.host,
+                                                          options.port)
+    latencies, elapsed, failures = asyncio.run(
+        runLoad(open_connection, options.connections, script, options.world))
+    print("connections  %d (%d failed)" % (options.connections, failures))
+    print("commands     %d in %.2f s (%.0f per second)" %
+          (len(latencies), elapsed, len(latencies) / elapsed))
+    for label, fraction in [ ("p50", 0.50), ("p90", 0.90), ("p99", 0.99) ]:
+        print("%-12s %.2f ms" % (label, percentile(latencies, fraction) * 1e3))
+    if len(latencies) != 0:
+        print("%-12s %.2f ms" % ("max", latencies[-1] * 1e3))
+    return 1 if failures != 0 else 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# File: AdvGenerate.py
+
+"""
+This program generates random Adventure worlds for scale and load
+testing.  It writes Rooms.txt, Objects.txt and Synonyms.txt files in the
+same format as the hand-written worlds, and the same seed always
+produces the same world.
+"""
+
+# Structure of a generated world
+# ------------------------------
+# The ordinary rooms are linked into a ring by NORTH and SOUTH passages,
+# so every room can be reached from the starting room.  Each ordinary
+# room then gets additional exits to randomly chosen rooms until it has
+# the requested fan-out.  A fraction of those exits are keyed by a random
+# object, in which case they are followed by an unkeyed passage with the
+# same verb, as in the XYZZY passage of the Crowther world.
+#
+# Forced rooms are generated in chains.  An ordinary room has an exit
+# into the first room of each chain, every room in the chain forces the
+# player on to the next, and the last one forces the player back into a
+# random ordinary room, so chains never form cycles.
+
+import argparse
+import random
+import sys
+
+# Constants
+
+DIRECTIONS = [ "NORTH", "SOUTH", "EAST", "WEST", "UP", "DOWN", "IN", "OUT",
+               "NE", "NW", "SE", "SW" ]
+
+SYNONYMS = [ ("N", "NORTH"), ("S", "SOUTH"), ("E", "EAST"), ("W", "WEST"),
+             ("U", "UP"), ("D", "DOWN"), ("Q", "QUIT"), ("L", "LOOK"),
+             ("I", "INVENTORY"), ("CATCH", "TAKE"), ("RELEASE", "DROP") ]
+
+WORDS = [ "passage", "cavern", "rock", "stream", "twisty", "narrow", "damp",
+          "walls", "ceiling", "floor", "echoes", "dark", "crawl", "low",
+          "chamber", "dust", "ancient", "carvings", "bones", "water", "drips",
+          "cold", "wind", "faint", "light", "steep", "slope", "boulders" ]
+
+ADJECTIVES = [ "small", "rusty", "shiny", "golden", "battered", "glowing",
+               "ancient", "tiny", "heavy", "curious" ]
+
+NOUNS = [ "key", "lamp", "coin", "gem", "rod", "bottle", "scroll", "idol",
+          "ring", "statue" ]
+
+def getVerb(index):
+    """Returns the verb for the exit with the specified index."""
+    if index < len(DIRECTIONS):
+        return DIRECTIONS[index]
+    return "PATH" + str(index)
+
+def describe(rng, lines):
+    """Returns a random description with the specified number of lines."""
+    return [ " ".join(rng.choice(WORDS) for i in range(8)).capitalize()
+             for j in range(lines) ]
+
+def generateWorld(prefix, rooms=1000, fanout=4, keyed=0.05, chains=10,
+                  chainLength=3, objects=20, seed=0):
+    """Writes a random world to the data files with the given prefix and
+    returns the number of (rooms, passages, objects) written."""
+    rng = random.Random(seed)
+    forced = min(chains * chainLength, rooms // 2)
+    chains = forced // chainLength if chainLength > 0 else 0
+    forced = chains * chainLength
+    ordinary = rooms - forced
+    if ordinary < 1:
+        raise ValueError("A world needs at least one ordinary room")
+    names = [ "Room" + str(i) for i in range(rooms) ]
+    object_names = [ "OBJECT" + str(i) for i in range(objects) ]
+
+    # Decide which ordinary rooms lead into the forced chains.
+    entrances = { }
+    for chain in range(chains):
+        room = rng.randrange(ordinary)
+        entrances.setdefault(room, [ ]).append(ordinary + chain * chainLength)
+
+    passages = 0
+    with open(prefix + "Rooms.txt", "w") as f:
+        for i in range(ordinary):
+            lines = [ names[i], "Room " + str(i) ]
+            lines.extend(describe(rng, rng.randint(1, 3)))
+            lines.append("-----")
+            lines.append("NORTH: " + names[(i + 1) % ordinary])
+            lines.append("SOUTH: " + names[(i - 1) % ordinary])
+            index = 2
+            for head in entrances.get(i, [ ]):
+                lines.append(getVerb(index) + ": " + names[head])
+                index += 1
+            while index < fanout:
+                verb = getVerb(index)
+                next = names[rng.randrange(ordinary)]
+                if objects > 0 and rng.random() < keyed:
+                    key = rng.choice(object_names)
+                    lines.append(verb + ": " + next + "/" + key)
+                    next = names[rng.randrange(ordinary)]
+                lines.append(verb + ": " + next)
+                index += 1
+            passages += len(lines) - lines.index("-----") - 1
+            f.write("\n".join(lines) + "\n\n")
+        for chain in range(chains):
+            for j in range(chainLength):
+                i = ordinary + chain * chainLength + j
+                if j + 1 < chainLength:
+                    next = names[i + 1]
+                else:
+                    next = names[rng.randrange(ordinary)]
+                lines = [ names[i], "-" ]
+                lines.extend(describe(rng, 1))
+                lines.append("-----")
+                lines.append("FORCED: " + next)
+                passages += 1
+                f.write("\n".join(lines) + "\n\n")
+
+    with open(prefix + "Objects.txt", "w") as f:
+        for name in object_names:
+            if rng.random() < 0.05:
+                location = "PLAYER"
+            else:
+                location = names[rng.randrange(ordinary)]
+            description = "a " + rng.choice(ADJECTIVES) + " " + rng.choice(NOUNS)
+            f.write(name + "\n" + description + "\n" + location + "\n\n")
+
+    with open(prefix + "Synonyms.txt", "w") as f:
+        for key, value in SYNONYMS:
+            f.write(key + "=" + value + "\n")
+
+    return rooms, passages, objects
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a random Adventure world for load testing.")
+    parser.add_argument("prefix", metavar="PREFIX",
+                        help="prefix for the generated data files")
+    parser.add_argument("--rooms", type=int, default=1000,
+                        help="total number of rooms (default 1000)")
+    parser.add_argument("--fanout", type=int, default=4,
+                        help="exits from each ordinary room (default 4)")
+    parser.add_argument("--keyed", type=float, default=0.05,
+                        help="fraction of extra exits that need a key")
+    parser.add_argument("--chains", type=int, default=10,
+                        help="number of forced-room chains (default 10)")
+    parser.add_argument("--chain-length", type=int, default=3,
+                        help="rooms in each forced chain (default 3)")
+    parser.add_argument("--objects", type=int, default=20,
+                        help="number of objects (default 20)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default 0)")
+    options = parser.parse_args(args)
+    rooms, passages, objects = generateWorld(
+        options.prefix, options.rooms, options.fanout, options.keyed,
+        options.chains, options.chain_length, options.objects, options.seed)
+    print("Wrote %d rooms, %d passages and %d objects to %s*.txt" %
+          (rooms, passages, objects, options.prefix))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
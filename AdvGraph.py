@@ -0,0 +1,284 @@
+# File: AdvGraph.py
+
+"""
+This module defines the WorldGraph class, which exports the map of a
+World as a sparse adjacency matrix over integer room ids and analyzes it
+with whole-array operations instead of Python loops.  It needs NumPy,
+and it uses SciPy for the matrix itself, connected components and hop
+distances.  Both are imported only if they are installed, so the rest of
+the game never depends on them.
+"""
+
+# Implementation notes
+# --------------------
+# An eager World already keeps its passages in compressed sparse row
+# form: passage_starts plays the role of the row pointer array and
+# passage_targets holds the column indices.  The graph wraps those arrays
+# with numpy.frombuffer, so exporting a world costs no copying beyond
+# removing the passages that lead to EXIT, which have no column.  A
+# LazyWorld has no such arrays, so its passages are gathered room by room.
+#
+# A passage mask is a boolean array with one entry per passage.  The mask
+# for a set of carried objects marks the passages that a player carrying
+# exactly those objects would take: for each room and verb, the first
+# passage whose key is carried or that needs no key.  That choice is made
+# over every passage, including those to EXIT, before the ones to EXIT
+# are dropped, since a keyed passage to EXIT hides the passages after it
+# from a player with the key.  Without a mask, every passage is included,
+# which describes the moves open to some player.
+
+import argparse
+import os
+import sys
+from AdvGame import AdvGame
+from AdvWorld import NO_KEY
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import scipy.sparse
+    import scipy.sparse.csgraph
+except ImportError:
+    scipy = None
+
+# Constants
+
+MAX_DENSE_ROOMS = 5000
+DEFAULT_RESTART = 0.05
+DEFAULT_TOLERANCE = 1e-8
+DEFAULT_MAX_ITERATIONS = 1000
+
+class WorldGraph:
+
+    def __init__(self, world):
+        """Creates the graph for the specified World."""
+        if np is None:
+            raise ImportError("WorldGraph requires NumPy")
+        self.world = world
+        self.room_count = world.getRoomCount()
+        # Rooms changed by an update keep their passages elsewhere.
+        if hasattr(world, "passage_starts") and not world.passage_patches:
+            starts = np.frombuffer(world.passage_starts, dtype=np.int32)
+            verbs = np.frombuffer(world.passage_verbs, dtype=np.int32)
+            targets = np.frombuffer(world.passage_targets, dtype=np.int32)
+            keys = np.frombuffer(world.passage_keys, dtype=np.int32)
+        else:
+            starts, verbs, targets, keys = WorldGraph.gatherPassages(world)
+        rows = np.repeat(np.arange(self.room_count, dtype=np.int32),
+                         np.diff(starts))
+        # Passage masks are computed over every passage, but passages to
+        # EXIT have no column in the matrix.
+        self.all_rows = rows
+        self.all_verbs = verbs
+        self.all_keys = keys
+        keep = targets >= 0
+        self.keep = keep
+        self.rows = rows[keep]
+        self.verbs = verbs[keep]
+        self.targets = targets[keep]
+        self.keys = keys[keep]
+        self.passage_count = len(self.targets)
+        self.exit_count = len(targets) - self.passage_count
+
+    @staticmethod
+    def gatherPassages(world):
+        """Returns the (starts, verbs, targets, keys) arrays for a world
+        that does not store its passages in a single set of arrays."""
+        starts = [ 0 ]
+        verbs = [ ]
+        targets = [ ]
+        keys = [ ]
+        for room_id in range(world.getRoomCount()):
+            room_verbs, room_targets, room_keys, start, end = \
+                world.getPassageRange(room_id)
+            verbs.extend(room_verbs[start:end])
+            targets.extend(room_targets[start:end])
+            keys.extend(room_keys[start:end])
+            starts.append(len(verbs))
+        return (np.array(starts, dtype=np.int32),
+                np.array(verbs, dtype=np.int32),
+                np.array(targets, dtype=np.int32),
+                np.array(keys, dtype=np.int32))
+
+    def getRoomCount(self):
+        """Returns the number of rooms, which is the size of the matrix."""
+        return self.room_count
+
+    def getPassageCount(self):
+        """Returns the number of passages that do not lead to EXIT."""
+        return self.passage_count
+
+    def getPassageMask(self, carried):
+        """Returns a boolean array marking the passages taken by a player
+        carrying the objects with the ids in carried."""
+        count = self.world.getObjectCount()
+        rows = self.all_rows
+        verbs = self.all_verbs
+        have = np.zeros(count + 1, dtype=bool)
+        have[[ object_id for object_id in carried ]] = True
+        # Keys that name no object are mapped to count and never held.
+        keys = np.where((self.all_keys == NO_KEY) | (self.all_keys >= count),
+                        count, self.all_keys)
+        unlocked = (self.all_keys == NO_KEY) | have[keys]
+        # Number the runs of passages that share a room and a verb, and
+        # keep the first open passage in each run.
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (verbs[1:] != verbs[:-1])
+        group = np.cumsum(first) - 1
+        opened = np.cumsum(unlocked)
+        before = (opened - unlocked)[first]
+        return (unlocked & (opened - before[group] == 1))[self.keep]
+
+    def getCSR(self, mask=None):
+        """Returns the (indptr, indices) arrays of the adjacency matrix in
+        CSR form, including only the passages selected by mask."""
+        rows = self.rows
+        indices = self.targets
+        if mask is not None:
+            rows = rows[mask]
+            indices = indices[mask]
+        indptr = np.zeros(self.room_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.room_count),
+                  out=indptr[1:])
+        return indptr, indices
+
+    def getAdjacency(self, mask=None):
+        """Returns the adjacency matrix as a SciPy CSR matrix, in which
+        entry (i, j) is the number of passages from room i to room j."""
+        if scipy is None:
+            raise ImportError("getAdjacency requires SciPy")
+        indptr, indices = self.getCSR(mask)
+        data = np.ones(len(indices), dtype=np.int32)
+        matrix = scipy.sparse.csr_matrix(
+            (data, indices, indptr), shape=(self.room_count, self.room_count))
+        matrix.sum_duplicates()
+        return matrix
+
+    def getDegrees(self, mask=None):
+        """Returns the pair (in_degree, out_degree) of arrays counting the
+        passages into and out of each room."""
+        rows = self.rows
+        targets = self.targets
+        if mask is not None:
+            rows = rows[mask]
+            targets = targets[mask]
+        return (np.bincount(targets, minlength=self.room_count),
+                np.bincount(rows, minlength=self.room_count))
+
+    def findComponents(self, mask=None, strong=True):
+        """Returns the pair (count, labels) for the strongly connected
+        components of the graph, or the weakly connected ones if strong
+        is False.  Entry i of labels is the component of room i."""
+        if scipy is None:
+            raise ImportError("findComponents requires SciPy")
+        return scipy.sparse.csgraph.connected_components(
+            self.getAdjacency(mask), directed=True,
+            connection="strong" if strong else "weak")
+
+    def getHopDistances(self, mask=None):
+        """Returns the matrix of the fewest passages needed to get from
+        each room to each other one, with inf where there is no route.
+        The matrix is dense, so it is refused for large worlds."""
+        if scipy is None:
+            raise ImportError("getHopDistances requires SciPy")
+        if self.room_count > MAX_DENSE_ROOMS:
+            raise ValueError("Hop distances are limited to %d rooms"
+                             % MAX_DENSE_ROOMS)
+        return scipy.sparse.csgraph.shortest_path(
+            self.getAdjacency(mask), directed=True, unweighted=True)
+
+    def getStationaryDistribution(self, mask=None, restart=DEFAULT_RESTART,
+                                  tolerance=DEFAULT_TOLERANCE,
+                                  maxIterations=DEFAULT_MAX_ITERATIONS):
+        """Returns the long-run fraction of turns that a random walker
+        spends in each room.  The walker takes a random passage out of
+        its room, and starts again from the first room with probability
+        restart or whenever its room has no way out."""
+        rows = self.rows
+        targets = self.targets
+        if mask is not None:
+            rows = rows[mask]
+            targets = targets[mask]
+        out_degree = np.bincount(rows, minlength=self.room_count)
+        dead_end = out_degree == 0
+        weights = ((1.0 - restart) / np.maximum(out_degree, 1))[rows]
+        if scipy is not None:
+            # The transposed transition matrix, so that each step is a
+            # single sparse matrix-vector product.
+            transitions = scipy.sparse.csr_matrix(
+                (weights, (targets, rows)),
+                shape=(self.room_count, self.room_count))
+            step = lambda p: transitions @ p
+        else:
+            step = lambda p: np.bincount(targets, weights=weights * p[rows],
+                                         minlength=self.room_count)
+        p = np.full(self.room_count, 1.0 / self.room_count)
+        for i in range(maxIterations):
+            moved = step(p)
+            moved[0] += restart * p[~dead_end].sum() + p[dead_end].sum()
+            change = np.abs(moved - p).sum()
+            p = moved
+            if change < tolerance: break
+        return p
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Print statistics about the map of an Adventure world.")
+    parser.add_argument("prefix", nargs="?", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--carry", action="append", default=None,
+                        metavar="OBJECT",
+                        help="only follow the passages taken by a player "
+                             "carrying OBJECT (may be repeated)")
+    parser.add_argument("--top", type=int, default=5,
+                        help="number of most visited rooms to list")
+    options = parser.parse_args(args)
+    if np is None:
+        print("AdvGraph requires NumPy", file=sys.stderr)
+        return 1
+    world = AdvGame(options.prefix).world
+    graph = WorldGraph(world)
+    mask = None
+    if options.carry is not None:
+        carried = [ ]
+        for name in options.carry:
+            object_id = world.getObjectId(name.upper())
+            if object_id is None:
+                print("No object named " + name, file=sys.stderr)
+                return 1
+            carried.append(object_id)
+        mask = graph.getPassageMask(carried)
+    in_degree, out_degree = graph.getDegrees(mask)
+    print("%s: %d rooms, %d passages, %d to EXIT" %
+          (os.path.basename(options.prefix), graph.getRoomCount(),
+           graph.getPassageCount(), graph.exit_count))
+    print("Degree: in max %d, out max %d, out mean %.2f" %
+          (in_degree.max(initial=0), out_degree.max(initial=0),
+           out_degree.mean() if graph.getRoomCount() != 0 else 0))
+    if scipy is not None:
+        strong, labels = graph.findComponents(mask)
+        weak = graph.findComponents(mask, strong=False)[0]
+        largest = np.bincount(labels).max(initial=0)
+        print("Components: %d strong (largest %d rooms), %d weak" %
+              (strong, largest, weak))
+        if graph.getRoomCount() <= MAX_DENSE_ROOMS:
+            distances = graph.getHopDistances(mask)
+            finite = distances[np.isfinite(distances)]
+            print("Hop distances: diameter %d, mean %.2f" %
+                  (finite.max(initial=0), finite.mean()))
+    p = graph.getStationaryDistribution(mask)
+    print("Most visited rooms on a random walk:")
+    for room_id in np.argsort(-p)[:options.top]:
+        print("  %-30s %.4f" % (world.getRoomById(int(room_id)).getName(),
+                               p[room_id]))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
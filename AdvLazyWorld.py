@@ -0,0 +1,232 @@
+# File: AdvLazyWorld.py
+
+"""
+This module defines the LazyWorld class, a World that reads rooms from
+the rooms file only when they are first needed.  It is intended for
+very large generated worlds, in which each player visits only a tiny
+fraction of the rooms.
+"""
+
+# Implementation notes
+# --------------------
+# The rooms file is memory-mapped and scanned once when the world is
+# created.  The scan finds the offset at which each room begins, using
+# regular expressions to skip over descriptions and passages rather than
+# reading them line by line, and records a hash of each room name.  The
+# hashes are then sorted, so that finding a room by name is a binary
+# search followed by a check of the name stored at that offset.  The
+# whole index costs about 20 bytes per room.
+#
+# A room is parsed by AdvRoom.readRoom the first time it is requested,
+# and its passage arrays are built at the same time.  The most recently
+# used rooms are kept in a bounded LRU cache; any other room is simply
+# parsed again if it is needed.  Passage verbs are added to the
+# vocabulary as their rooms are parsed, which is always before a player
+# in that room can use them.  Chains of forced rooms are likewise
+# resolved and checked for cycles the first time a player enters them.
+# The jump for a forced room and the rendered short description of a
+# room are kept in its cache entry, so that nothing derived from a room
+# outlives the room in the cache.
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping
+import io
+import locale
+import mmap
+import re
+from AdvRoom import AdvRoom
+from AdvWorld import World, START_ROOM, FORCED_MARKER
+
+# Constants
+
+DEFAULT_ROOM_CACHE_SIZE = 1024
+
+class LazyWorld(World):
+
+    def __init__(self, filename, objects, synonyms, verbs=(),
+                 cacheSize=DEFAULT_ROOM_CACHE_SIZE):
+        """Creates a World whose rooms are read on demand from the rooms
+        file with the specified name."""
+        with open(filename, "rb") as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # An empty file cannot be mapped.
+                self.data = b""
+        self.encoding = locale.getpreferredencoding(False)
+        self.cache_size = cacheSize
+        self.cache = OrderedDict()
+        World.__init__(self, LazyRoomMap(self), objects, synonyms, verbs)
+
+    def indexRooms(self):
+        """Scans the rooms file for the offset and name of each room."""
+        offsets = array("q")
+        hashes = array("q")
+        for pos, name in scanRooms(self.data):
+            offsets.append(pos)
+            hashes.append(hash(name))
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        self.offsets = offsets
+        self.sorted_hashes = array("q", [ hashes[i] for i in order ])
+        self.sorted_ids = array("i", order)
+
+    def indexPassages(self):
+        """Passage arrays are built as rooms are parsed."""
+        pass
+
+    def indexForcedRooms(self):
+        """Forced rooms are resolved when they are first entered."""
+        self.conditional_rooms = set()
+
+    def findRoomId(self, name):
+        """Returns the id of the room with the specified name, or None
+        if there is no such room."""
+        if name == START_ROOM:
+            return 0 if len(self.offsets) != 0 else None
+        key = name.encode(self.encoding)
+        code = hash(key)
+        i = bisect_left(self.sorted_hashes, code)
+        while i < len(self.sorted_hashes) and self.sorted_hashes[i] == code:
+            room_id = self.sorted_ids[i]
+            if self.readName(room_id) == key:
+                return room_id
+            i += 1
+        return None
+
+    def readName(self, room_id):
+        """Returns the name of a room as bytes, without parsing it."""
+        start = self.offsets[room_id]
+        eol = self.data.find(b"\n", start)
+        if eol == -1:
+            eol = len(self.data)
+        return self.data[start:eol].rstrip()
+
+    def loadRoom(self, room_id):
+        """Returns the cache entry [ room, passages, jump, text ] for a
+        room id, where passages is the (verbs, targets, keys) tuple for
+        the room, and jump and text are its forced jump and short text
+        once they have been needed, parsing the room if it is not in the
+        cache."""
+        entry = self.cache.get(room_id)
+        if entry is not None:
+            self.cache.move_to_end(room_id)
+            return entry
+        start = self.offsets[room_id]
+        if room_id + 1 < len(self.offsets):
+            end = self.offsets[room_id + 1]
+        else:
+            end = len(self.data)
+        text = self.data[start:end].decode(self.encoding)
+        room = AdvRoom.readRoom(io.StringIO(text, newline=None))
+        entry = [ room, self.compilePassages(room), None, None ]
+        self.cache[room_id] = entry
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return entry
+
+    def getForcedJump(self, room_id):
+        """Returns the jump for a room as World.getForcedJump does,
+        keeping it in the cache entry for the room."""
+        entry = self.loadRoom(room_id)
+        jump = entry[2]
+        if jump is None and entry[0].getShortDescription() == FORCED_MARKER:
+            jump = self.buildForcedJump(room_id, entry[0])
+            entry[2] = jump
+        return jump
+
+    def getShortText(self, room_id):
+        """Returns the short text for a room as World.getShortText does,
+        keeping it in the cache entry for the room."""
+        entry = self.loadRoom(room_id)
+        text = entry[3]
+        if text is None:
+            text = entry[0].getShortDescription() + "\n"
+            entry[3] = text
+        return text
+
+    def getRoom(self, name):
+        """Returns the AdvRoom object with the specified name."""
+        room_id = self.findRoomId(name)
+        if room_id is None:
+            raise KeyError(name)
+        return self.loadRoom(room_id)[0]
+
+    def getRoomId(self, name):
+        """Returns the integer id of the room with the specified name."""
+        room_id = self.findRoomId(name)
+        if room_id is None:
+            raise KeyError(name)
+        return room_id
+
+    def getRoomById(self, room_id):
+        """Returns the AdvRoom object with the specified id."""
+        return self.loadRoom(room_id)[0]
+
+    def getPassageRange(self, room_id):
+        """Returns the tuple (verbs, targets, keys, start, end) for the
+        passages of the room with the specified id."""
+        verbs, targets, keys = self.loadRoom(room_id)[1]
+        return verbs, targets, keys, 0, len(verbs)
+
+    def getRoomCount(self):
+        """Returns the number of rooms in this world."""
+        return len(self.offsets)
+
+    def getCachedRoomCount(self):
+        """Returns the number of rooms currently parsed in memory."""
+        return len(self.cache)
+
+class LazyRoomMap(Mapping):
+
+    """This class lets the rooms of a LazyWorld be used as a dictionary
+    from room names to AdvRoom objects, as in an ordinary World."""
+
+    def __init__(self, world):
+        self.world = world
+
+    def __getitem__(self, name):
+        return self.world.getRoom(name)
+
+    def __contains__(self, name):
+        return self.world.findRoomId(name) is not None
+
+    def __iter__(self):
+        world = self.world
+        if world.getRoomCount() != 0:
+            yield START_ROOM
+        for room_id in range(world.getRoomCount()):
+            yield world.readName(room_id).decode(world.encoding)
+
+    def __len__(self):
+        count = self.world.getRoomCount()
+        return count + 1 if count != 0 else 0
+
+def scanRooms(data, pos=0):
+    """Generates the pair (offset, name) for each room in the contents of
+    a rooms file, starting at the room that begins at pos, where name is
+    the room name as bytes.  Only the lines that begin and end each room
+    are examined."""
+    size = len(data)
+    while pos < size:
+        eol = data.find(b"\n", pos)
+        if eol == -1:
+            eol = size
+        name = data[pos:eol].rstrip()
+        if name == b"": break
+        yield pos, name
+        # Skip the short description, which is never a marker.
+        eol = data.find(b"\n", eol + 1)
+        marker = None
+        if eol != -1:
+            marker = _MARKER_PATTERN.search(data, eol + 1)
+        if marker is None: break
+        blank = _BLANK_PATTERN.search(data, marker.end() + 1)
+        if blank is None: break
+        pos = blank.end() + 1
+
+# Private constants
+
+_MARKER_PATTERN = re.compile(rb"^-----[ \t\r\f\v]*$", re.MULTILINE)
+_BLANK_PATTERN = re.compile(rb"^[ \t\r\f\v]*$", re.MULTILINE)
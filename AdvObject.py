@@ -4,13 +4,19 @@
 This module defines a class that models an object in Adventure.
 """
 
+import sys
+
 class AdvObject:
 
+    __slots__ = ("name", "description", "location")
+
     def __init__(self, name, description, location):
-        """Creates an AdvObject from the specified properties."""
-        self.name = name
+        """Creates an AdvObject from the specified properties.  The name
+        and location are interned, since they also appear as passage keys
+        and room names."""
+        self.name = sys.intern(name)
         self.description = description
-        self.location = location
+        self.location = sys.intern(location)
 
     def __str__(self):
         """Converts an AdvObject to a string."""
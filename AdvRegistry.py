@@ -0,0 +1,315 @@
+# File: AdvRegistry.py
+
+"""
+This module defines the WorldRegistry class, which loads and shares the
+worlds hosted by a single process.  Worlds are registered by name and
+data file prefix, loaded together by a pool of worker processes, and
+handed out to sessions, which all share one World for each distinct set
+of data files.  A world that no session has used for a while is evicted
+and loaded again the next time it is needed.  Run as a program, it loads
+a set of worlds and compares the time taken with loading them one at a
+time.
+"""
+
+# Implementation notes
+# --------------------
+# A world is identified by the SHA-256 digests of its data files, which
+# AdvCache already computes to check its cache, so two prefixes whose
+# files are identical share a single World.  The files are hashed by a
+# pool of threads, since hashlib releases the GIL while it hashes, and
+# the distinct worlds are then read by a pool of processes, largest
+# first.  Each worker loads its world through AdvGame, using the compiled
+# cache when it is fresh, and sends the finished World back pickled,
+# which the parent unpickles in a fraction of the time it would take to
+# build it.  Loading many worlds therefore takes about as long as the
+# largest of them plus a short step in the parent for each.
+#
+# The worlds handed out are shared by every session that plays them and
+# by every name with the same files, so they must not be changed, which
+# also means that a registry does not reload them when their files are
+# edited.  Each distinct world counts the sessions using it and records
+# when it was last released, and evictIdle drops the ones that have had
+# no users for idleTimeout seconds.  An evicted world is hashed again
+# when it is next acquired, so it picks up any edits made in between.
+#
+# A server acquires worlds with acquireAsync, which reads a world that is
+# not in memory in the event loop's default executor so that the other
+# connections go on playing meanwhile.  Reading is split from recording:
+# readWorlds hashes and reads without touching the registry, and
+# addWorlds, which always runs on the caller's thread, records the result,
+# so the registry is only ever changed by the event loop.  Connections
+# that ask for the same world while it is being read wait for the one
+# read already under way, which is shielded so that a connection closing
+# does not cancel it for the others.
+
+import argparse
+import asyncio
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import tempfile
+import time
+import AdvCache
+from AdvGame import AdvGame
+
+# Constants
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+DEFAULT_EVICT_INTERVAL = 60.0
+MAX_HASH_THREADS = 8
+
+class WorldEntry:
+
+    """This class holds a loaded World and the number of sessions using it."""
+
+    __slots__ = ("world", "names", "users", "last_used")
+
+    def __init__(self, world):
+        self.world = world
+        self.names = set()
+        self.users = 0
+        self.last_used = time.monotonic()
+
+class WorldRegistry:
+
+    def __init__(self, idleTimeout=DEFAULT_IDLE_TIMEOUT, processes=None):
+        """Creates an empty registry.  Worlds that no session has used for
+        idleTimeout seconds are dropped by evictIdle, and worlds are read
+        by a pool of processes, which defaults to one per CPU."""
+        self.idle_timeout = idleTimeout
+        self.processes = processes
+        self.prefixes = { }
+        self.keys = { }
+        self.entries = { }
+        # The reads under way in acquireAsync, by name.
+        self.reading = { }
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, prefix, name=None):
+        """Adds the world with the specified data file prefix under name,
+        which defaults to the last component of the prefix, and returns
+        the name.  The world is not read until it is loaded or acquired."""
+        if name is None:
+            name = os.path.basename(prefix)
+        if name in self.prefixes:
+            raise ValueError("World " + name + " is already registered")
+        self.prefixes[name] = prefix
+        return name
+
+    def getNames(self):
+        """Returns the names of the registered worlds in the order they
+        were registered."""
+        return list(self.prefixes)
+
+    def isLoaded(self, name):
+        """Returns True if the named world is in memory."""
+        return name in self.keys
+
+    def load(self, names=None):
+        """Loads the named worlds, or every registered world, that are not
+        already in memory, reading each distinct world only once."""
+        if names is None:
+            names = self.getNames()
+        names = [ name for name in names if name not in self.keys ]
+        if len(names) == 0:
+            return
+        self.addWorlds(names, *self.readWorlds(self.getPrefixes(names),
+                                               set(self.entries)))
+
+    def getPrefixes(self, names):
+        """Returns the data file prefixes of the named worlds."""
+        for name in names:
+            if name not in self.prefixes:
+                raise ValueError("Unknown world " + name)
+        return [ self.prefixes[name] for name in names ]
+
+    def readWorlds(self, prefixes, known):
+        """Returns the pair (keys, worlds) for a list of prefixes, where
+        keys holds the key of each prefix and worlds is a list of (key,
+        world) pairs for the distinct keys that are not in known.  The
+        worlds are read in a pool of processes if there is more than one
+        of them.  The registry itself is left unchanged, so this method
+        may be called from any thread."""
+        threads = min(len(prefixes), MAX_HASH_THREADS)
+        with ThreadPool(threads) as pool:
+            signatures = pool.map(getSignatures, prefixes)
+        pending = { }
+        for prefix, (key, size) in zip(prefixes, signatures):
+            if key not in known and key not in pending:
+                pending[key] = (size, prefix)
+        tasks = [ (key, prefix) for key, (size, prefix)
+                  in sorted(pending.items(), key=lambda item: -item[1][0]) ]
+        keys = [ key for key, size in signatures ]
+        processes = min(self.processes or os.cpu_count() or 1, len(tasks))
+        if processes <= 1:
+            return keys, [ _loadTask(task) for task in tasks ]
+        with multiprocessing.Pool(processes) as pool:
+            return keys, list(pool.imap_unordered(_loadTask, tasks))
+
+    def addWorlds(self, names, keys, worlds):
+        """Records the keys and worlds returned by readWorlds for the named
+        worlds.  A name whose world was evicted while it was being read is
+        left out, and is read again when it is next needed."""
+        for key, world in worlds:
+            if key not in self.entries:
+                self.entries[key] = WorldEntry(world)
+                self.loads += 1
+        for name, key in zip(names, keys):
+            entry = self.entries.get(key)
+            if entry is not None and name not in self.keys:
+                self.keys[name] = key
+                entry.names.add(name)
+
+    def acquire(self, name):
+        """Returns the World for the named world, loading it if it is not
+        in memory, and counts the caller as one of its users until it
+        calls release.  The World is shared and must not be changed."""
+        if name not in self.keys:
+            self.load([ name ])
+        entry = self.entries[self.keys[name]]
+        entry.users += 1
+        entry.last_used = time.monotonic()
+        return entry.world
+
+    async def acquireAsync(self, name):
+        """Does the same as acquire, but reads a world that is not in
+        memory in the event loop's default executor, so that the loop is
+        free to serve others while it waits.  Calls for a world that is
+        already being read wait for that read rather than starting one."""
+        while name not in self.keys:
+            future = self.reading.get(name)
+            if future is None:
+                future = asyncio.ensure_future(self.loadAsync(name))
+                self.reading[name] = future
+                future.add_done_callback(
+                    lambda future: self.reading.pop(name, None))
+            await asyncio.shield(future)
+        return self.acquire(name)
+
+    async def loadAsync(self, name):
+        """Loads the named world in the event loop's default executor."""
+        names = [ name ]
+        prefixes = self.getPrefixes(names)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, self.readWorlds, prefixes,
+                                            set(self.entries))
+        self.addWorlds(names, *result)
+
+    def release(self, name):
+        """Records that a caller of acquire has finished with the named
+        world."""
+        entry = self.entries[self.keys[name]]
+        entry.users -= 1
+        entry.last_used = time.monotonic()
+
+    def evictIdle(self, now=None):
+        """Drops every world that has had no users for the idle timeout
+        and returns the names of the worlds that were dropped."""
+        if now is None:
+            now = time.monotonic()
+        evicted = [ ]
+        for key, entry in list(self.entries.items()):
+            if entry.users == 0 and now - entry.last_used >= self.idle_timeout:
+                del self.entries[key]
+                for name in entry.names:
+                    del self.keys[name]
+                evicted.extend(sorted(entry.names))
+                self.evictions += 1
+        return evicted
+
+    async def evictPeriodically(self, interval=DEFAULT_EVICT_INTERVAL):
+        """Calls evictIdle every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            self.evictIdle()
+
+    def getStats(self):
+        """Returns a dictionary with the number of registered worlds, the
+        number in memory, the number of distinct Worlds holding them, the
+        number of those in use, and the number of loads and evictions."""
+        return {
+            "registered": len(self.prefixes),
+            "loaded": len(self.keys),
+            "distinct": len(self.entries),
+            "in_use": sum(1 for entry in self.entries.values()
+                          if entry.users != 0),
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+def getSignatures(prefix):
+    """Returns the pair (key, size) for the data files with the specified
+    prefix, where key holds the digest of each file and size is their
+    total size in bytes."""
+    key = [ ]
+    size = 0
+    for suffix in AdvCache.SOURCE_SUFFIXES:
+        signature = AdvCache.getSignature(prefix + suffix)
+        if signature is None:
+            key.append(None)
+        else:
+            key.append(signature[2])
+            size += signature[1]
+    if key[0] is None:
+        raise ValueError("No rooms file for " + prefix)
+    return tuple(key), size
+
+# Private functions
+
+def _loadTask(task):
+    """Loads the world for a (key, prefix) task and returns (key, world)."""
+    key, prefix = task
+    return key, AdvGame(prefix).world
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Load many worlds at once and compare the time taken "
+                    "with loading them one at a time.")
+    parser.add_argument("prefixes", nargs="*",
+                        default=[ "Tiny", "Small", "Crowther" ],
+                        help="data file prefixes (default Tiny Small Crowther)")
+    parser.add_argument("--generated", type=int, default=0,
+                        help="number of generated worlds to add (default 0)")
+    parser.add_argument("--distinct", type=int, default=None,
+                        help="how many of the generated worlds differ, the "
+                             "rest being copies (default all)")
+    parser.add_argument("--rooms", type=int, default=5000,
+                        help="rooms in each generated world (default 5000)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default one per CPU)")
+    options = parser.parse_args(args)
+    from AdvGenerate import generateWorld
+    distinct = options.distinct or options.generated
+    with tempfile.TemporaryDirectory() as directory:
+        prefixes = list(options.prefixes)
+        for i in range(options.generated):
+            prefix = os.path.join(directory, "Generated%d" % i)
+            # Generated worlds are used as they would be after their first
+            # load, with a compiled cache beside them.
+            generateWorld(prefix, rooms=options.rooms,
+                          objects=options.rooms // 20, seed=i % distinct)
+            AdvCache.compileWorld(prefix)
+            prefixes.append(prefix)
+        results = [ ]
+        for label, processes in [ ("one at a time", 1),
+                                  ("concurrently", options.processes) ]:
+            registry = WorldRegistry(processes=processes)
+            for prefix in prefixes:
+                registry.register(prefix)
+            start = time.perf_counter()
+            registry.load()
+            results.append((label, time.perf_counter() - start,
+                            registry.getStats()))
+    for label, elapsed, stats in results:
+        print("%-14s %8.1f ms for %d worlds, %d distinct" %
+              (label, elapsed * 1e3, stats["loaded"], stats["distinct"]))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+# File: AdvReload.py
+
+"""
+This module defines the WorldReloader class, which watches the data
+files behind a running World and brings in edits to them without
+restarting the games in progress.  Only the rooms, objects and synonyms
+whose text has changed are parsed and applied.  An edit that would
+strand a player, such as deleting an object or the room a player is
+standing in, is refused and the World is left as it was.  Run as a
+program, it loads a world, watches its files and reports what each
+reload changed and how long it took.
+"""
+
+# Implementation notes
+# --------------------
+# The reloader keeps the text of each data file as it was last read,
+# together with a BlockIndex that records the offset and name of every
+# block in it: a room in the rooms file, and four lines in the objects
+# file.  When a file changes, the new text is compared with the old to
+# find the longest common prefix and suffix, which takes a few memcmp
+# calls over large chunks rather than a Python loop over the blocks.
+# Only the blocks that overlap the part in between are scanned again and
+# compared with their old text, and only those that differ are parsed.
+# The blocks after the change keep their offsets, moved by the change in
+# length, so a reload costs time in proportion to the size of the edit
+# apart from reading the file and copying the index.  The synonyms file
+# is always small and is simply read again.
+#
+# Rooms that are no longer in the rooms file are deleted as described in
+# AdvWorld, and a reload is refused if a live game has its player or any
+# object in one of them.  Hibernated games and SAVE files are not read,
+# since that would cost time in proportion to the number of players, but
+# AdvSave refuses any snapshot left in a deleted room, so such a game
+# cannot be resumed there either.  The first room must keep its name, since a new
+# game starts there.  Because the server runs every game on one thread,
+# a reload happens between turns and no player sees it half done.
+
+import argparse
+import asyncio
+from bisect import bisect_left, bisect_right
+import io
+import locale
+import os
+import sys
+import time
+from AdvGame import AdvGame
+from AdvLazyWorld import LazyWorld, scanRooms
+from AdvObject import AdvObject
+from AdvRoom import AdvRoom, MARKER
+
+# Constants
+
+DEFAULT_RELOAD_INTERVAL = 2.0
+SOURCE_SUFFIXES = [ "Rooms.txt", "Objects.txt", "Synonyms.txt" ]
+OBJECT_LINES = 4
+CHUNK_SIZE = 65536
+
+# The data files are read in the encoding that open uses by default.
+ENCODING = locale.getpreferredencoding(False)
+
+class BlockIndex:
+
+    """This class records where each block of a data file begins, so that
+    a new version of the file can be compared with it block by block."""
+
+    def __init__(self, data, scanner, offsets=None, names=None):
+        """Indexes the contents of a data file, calling scanner(data, pos)
+        to generate the (offset, name) pair of each block from pos on.
+        The offsets and names may be given if they are already known."""
+        self.data = data
+        self.scanner = scanner
+        if offsets is None:
+            offsets = [ ]
+            names = [ ]
+            for pos, name in scanner(data):
+                offsets.append(pos)
+                names.append(name)
+        self.offsets = offsets
+        self.names = names
+
+    def getBlockCount(self):
+        """Returns the number of blocks in the file."""
+        return len(self.offsets)
+
+    def getBlocks(self, first, last, end=None):
+        """Returns the list of (name, block) pairs for blocks first to
+        last - 1, where names are strings and blocks are bytes.  The
+        last block ends at end, which defaults to the start of the next
+        block or the end of the file."""
+        offsets = self.offsets
+        if end is None:
+            end = offsets[last] if last < len(offsets) else len(self.data)
+        blocks = [ ]
+        for i in range(first, last):
+            stop = offsets[i + 1] if i + 1 < last else end
+            blocks.append((self.names[i].decode(ENCODING),
+                           self.data[offsets[i]:stop]))
+        return blocks
+
+    def diff(self, data):
+        """Compares this index with new contents for the file and returns
+        the triple (index, old, new), where index is the BlockIndex for
+        data and old and new list the (name, block) pairs of the blocks
+        in the part of the file that differs, before and after."""
+        old = self.data
+        if data == old:
+            return self, [ ], [ ]
+        offsets = self.offsets
+        prefix = findCommonPrefix(old, data)
+        suffix = findCommonSuffix(old, data, min(len(old), len(data)) - prefix)
+        delta = len(data) - len(old)
+        changed_end = len(old) - suffix
+        first = max(bisect_right(offsets, prefix) - 1, 0)
+        start = offsets[first] if first < len(offsets) else 0
+        # Scanning stops at the first block that starts inside the common
+        # suffix at the offset of one of the old blocks.
+        last = len(offsets)
+        new_offsets = [ ]
+        new_names = [ ]
+        for pos, name in self.scanner(data, start):
+            if pos - delta >= changed_end:
+                i = bisect_left(offsets, pos - delta)
+                if i < len(offsets) and offsets[i] == pos - delta:
+                    last = i
+                    break
+            new_offsets.append(pos)
+            new_names.append(name)
+        index = BlockIndex(data, self.scanner,
+                           offsets[:first] + new_offsets
+                           + [ pos + delta for pos in offsets[last:] ],
+                           self.names[:first] + new_names + self.names[last:])
+        return (index, self.getBlocks(first, last),
+                index.getBlocks(first, first + len(new_offsets)))
+
+class WorldReloader:
+
+    def __init__(self, world, prefix):
+        """Creates a reloader for a World that was read from the data
+        files with the specified prefix.  The files are read at once, so
+        any edit made after this point is brought in by reload."""
+        if isinstance(world, LazyWorld):
+            raise ValueError("A LazyWorld cannot be reloaded")
+        self.world = world
+        self.prefix = prefix
+        # Sorting the passages by target takes a moment in a large world,
+        # so it is done now rather than in the first reload that deletes
+        # a room.
+        world.indexPassageSources()
+        self.signatures = self.getSignatures()
+        self.room_index = BlockIndex(self.readFile("Rooms.txt"), scanRooms)
+        self.object_index = BlockIndex(self.readFile("Objects.txt"),
+                                       scanObjects)
+        self.synonyms = AdvGame.readSynonyms(prefix) or { }
+
+    def getSignatures(self):
+        """Returns the (mtime, size) pair of each data file, or None for
+        a file that does not exist."""
+        signatures = { }
+        for suffix in SOURCE_SUFFIXES:
+            try:
+                stat = os.stat(self.prefix + suffix)
+                signatures[suffix] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                signatures[suffix] = None
+        return signatures
+
+    def hasChanged(self):
+        """Returns True if any data file has changed since it was last
+        read."""
+        return self.getSignatures() != self.signatures
+
+    def readFile(self, suffix):
+        """Returns the contents of a data file as bytes, which are empty
+        if the file does not exist."""
+        try:
+            with open(self.prefix + suffix, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def parseRoom(self, name, block):
+        """Parses the block for a room, which may have been cut short if
+        the file is still being written."""
+        text = io.StringIO(block.decode(ENCODING), newline=None).read()
+        if not any(line.rstrip() == MARKER for line in text.split("\n")):
+            raise ValueError("Room " + name + " has no end of its description")
+        return AdvRoom.readRoom(io.StringIO(text))
+
+    def parseObject(self, block):
+        """Parses the block for an object."""
+        return AdvObject.readObject(io.StringIO(block.decode(ENCODING),
+                                                newline=None))
+
+    def reload(self, states=()):
+        """Applies the edits made to the data files since they were last
+        read, after checking that they leave every GameState in states
+        playable, and returns a dictionary with the number of rooms,
+        objects and synonyms changed, added or deleted.  Raises ValueError
+        if the edits are refused, in which case nothing changes."""
+        world = self.world
+        signatures = self.getSignatures()
+        room_index, old_blocks, new_blocks = \
+            self.room_index.diff(self.readFile("Rooms.txt"))
+        if room_index.getBlockCount() == 0:
+            raise ValueError("The rooms file is empty")
+        if room_index.names[0] != self.room_index.names[0]:
+            raise ValueError("The first room cannot be renamed or moved")
+        previous = dict(old_blocks)
+        rooms = [ ]
+        added = 0
+        for name, block in new_blocks:
+            if isSameBlock(previous.pop(name, None), block): continue
+            rooms.append(self.parseRoom(name, block))
+            if world.findRoomId(name) is None:
+                added += 1
+        deleted = list(previous)
+        object_index, old_blocks, new_blocks = \
+            self.object_index.diff(self.readFile("Objects.txt"))
+        previous = dict(old_blocks)
+        objects = [ ]
+        for name, block in new_blocks:
+            if isSameBlock(previous.pop(name, None), block): continue
+            objects.append(self.parseObject(block))
+        if len(previous) != 0:
+            raise ValueError("Object " + next(iter(previous))
+                             + " cannot be deleted")
+        synonyms = AdvGame.readSynonyms(self.prefix) or { }
+        changed_synonyms = { key: value for key, value in synonyms.items()
+                             if self.synonyms.get(key) != value }
+        removed_synonyms = [ key for key in self.synonyms if key not in synonyms ]
+        deleted_ids = { world.getRoomId(name): name for name in deleted }
+        for state in states:
+            name = deleted_ids.get(state.getCurrentRoom())
+            if name is not None:
+                raise ValueError("A player is in deleted room " + name)
+            for room_id, name in deleted_ids.items():
+                if room_id in state.locations:
+                    raise ValueError("An object is in deleted room " + name)
+        if rooms or deleted or objects or changed_synonyms or removed_synonyms:
+            world.applyUpdate(rooms, deleted, objects, changed_synonyms,
+                              removed_synonyms)
+            for state in states:
+                state.extend(world)
+        self.signatures = signatures
+        self.room_index = room_index
+        self.object_index = object_index
+        self.synonyms = synonyms
+        return {
+            "rooms": len(rooms) - added,
+            "added_rooms": added,
+            "deleted_rooms": len(deleted),
+            "objects": len(objects),
+            "synonyms": len(changed_synonyms) + len(removed_synonyms)
+        }
+
+    async def watch(self, getStates, interval=DEFAULT_RELOAD_INTERVAL):
+        """Checks the data files every interval seconds and reloads them
+        when they change, calling getStates for the GameStates of the live
+        games.  A refused edit is reported once and tried again when the
+        files next change."""
+        refused = None
+        while True:
+            await asyncio.sleep(interval)
+            if not self.hasChanged(): continue
+            signatures = self.getSignatures()
+            if signatures == refused: continue
+            start = time.perf_counter()
+            try:
+                summary = self.reload(getStates())
+            except (OSError, ValueError) as e:
+                refused = signatures
+                print("Reload of " + self.prefix + " refused: " + str(e),
+                      file=sys.stderr)
+                continue
+            print("Reloaded %s in %.1f ms: %s" %
+                  (self.prefix, (time.perf_counter() - start) * 1e3,
+                   formatSummary(summary)))
+
+def scanObjects(data, pos=0):
+    """Generates the pair (offset, name) for each object in the contents
+    of an objects file, starting at the object that begins at pos."""
+    size = len(data)
+    while pos < size:
+        eol = data.find(b"\n", pos)
+        if eol == -1:
+            eol = size
+        name = data[pos:eol].rstrip()
+        if name == b"": break
+        yield pos, name
+        for i in range(OBJECT_LINES):
+            eol = data.find(b"\n", pos)
+            if eol == -1: return
+            pos = eol + 1
+
+def isSameBlock(old, new):
+    """Returns True if two blocks differ at most in the blank lines that
+    follow them, as the last block of a file does when another is added
+    after it."""
+    return old is not None and old.rstrip() == new.rstrip()
+
+def findCommonPrefix(old, new):
+    """Returns the length of the longest common prefix of two byte
+    strings, comparing them a chunk at a time."""
+    size = min(len(old), len(new))
+    pos = 0
+    while pos < size and old[pos:pos + CHUNK_SIZE] == new[pos:pos + CHUNK_SIZE]:
+        pos += CHUNK_SIZE
+    # The first difference is within the chunk at pos.
+    low = min(pos, size)
+    high = min(pos + CHUNK_SIZE, size)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[low:middle] == new[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def findCommonSuffix(old, new, limit):
+    """Returns the length of the longest common suffix of two byte
+    strings that is no longer than limit."""
+    end_old = len(old)
+    end_new = len(new)
+    pos = 0
+    while pos < limit:
+        step = min(pos + CHUNK_SIZE, limit)
+        if old[end_old - step:end_old - pos] != new[end_new - step:end_new - pos]:
+            break
+        pos = step
+    low = pos
+    high = min(pos + CHUNK_SIZE, limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if (old[end_old - middle:end_old - low]
+                == new[end_new - middle:end_new - low]):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def formatSummary(summary):
+    """Returns a summary from WorldReloader.reload as readable text."""
+    return ("%(rooms)d rooms changed, %(added_rooms)d added, "
+            "%(deleted_rooms)d deleted, %(objects)d objects and "
+            "%(synonyms)d synonyms changed" % summary)
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Load a world and reload it whenever its data files "
+                    "change, reporting what changed.")
+    parser.add_argument("--prefix", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--interval", type=float,
+                        default=DEFAULT_RELOAD_INTERVAL,
+                        help="seconds between checks (default %g)"
+                             % DEFAULT_RELOAD_INTERVAL)
+    options = parser.parse_args(args)
+    start = time.perf_counter()
+    world = AdvGame(options.prefix, useCache=False).world
+    print("Loaded %s in %.1f ms" %
+          (options.prefix, (time.perf_counter() - start) * 1e3))
+    reloader = WorldReloader(world, options.prefix)
+    try:
+        asyncio.run(reloader.watch(lambda: (), options.interval))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,22 +2,44 @@
 
 """
 This module is responsible for modeling a single room in Adventure.
+Rooms hold only the static data read from the rooms file; whether a
+room has been visited and which objects it contains are part of the
+GameState for each player.
 """
 
+# Representation
+# --------------
+# Large worlds contain hundreds of thousands of rooms, so rooms use
+# __slots__ and keep their data in as few objects as possible.  The long
+# description is stored as a single string in which every line ends with
+# a newline, and the passages are flattened into one tuple of the form
+# (response, next, key, response, next, key, ...).  Room names, passage
+# verbs and keys are interned, so the many passages that lead to the same
+# room share a single copy of its name.
+
+import sys
+
 # Constants
 
 MARKER = "-----"
 
 class AdvRoom:
 
+    __slots__ = ("name", "shortdesc", "longdesc", "passages")
+
     def __init__(self, name, shortdesc, longdesc, passages):
-        """Creates a new room with the specified attributes."""
-        self.name = name
+        """Creates a new room with the specified attributes.  The long
+        description may be either a list of lines or a string in which
+        each line ends with a newline."""
+        self.name = sys.intern(name)
         self.shortdesc = shortdesc
+        if not isinstance(longdesc, str):
+            longdesc = "".join(line + "\n" for line in longdesc)
         self.longdesc = longdesc
-        self.passages = passages
-        self.visited = False
-        self.objects = {}
+        flat = [ ]
+        for passage in passages:
+            flat.extend(passage)
+        self.passages = tuple(flat)
 
     def getName(self):
         """Returns the name of this room.."""
@@ -29,29 +51,18 @@ class AdvRoom:
 
     def getLongDescription(self):
         """Returns the list of lines describing this room."""
+        return self.longdesc.split("\n")[:-1]
+
+    def getLongText(self):
+        """Returns the long description as a single string in which
+        each line ends with a newline."""
         return self.longdesc
 
     def getPassages(self):
-        """Returns the passages for the room."""
-        return self.passages
-
-    def setVisited(self, boolean):
-        self.visited = boolean
-
-    def hasBeenVisited(self):
-        return(self.visited)
-
-    def addObject(self, object):
-        self.objects[object.getName()] = object
-
-    def removeObject(self, name):
-        self.objects.pop(name, None)
-
-    def containsObject(self, name):
-        return self.objects[name] is not None
-
-    def getContents(self):
-        return self.objects
+        """Returns the passages for the room as a list of
+        (response, next, key) tuples."""
+        p = self.passages
+        return [ (p[i], p[i + 1], p[i + 2]) for i in range(0, len(p), 3) ]
 
     @staticmethod
     def readRoom(f):
@@ -74,14 +85,14 @@ class AdvRoom:
             if colon == -1:
                 raise ValueError("Missing colon in " + line)
             if slash == -1:
-                response = line[:colon].strip().upper()
-                next = line[colon + 1:].strip()
+                response = sys.intern(line[:colon].strip().upper())
+                next = sys.intern(line[colon + 1:].strip())
                 passage = (response, next, None)
                 passages.append(passage)
             else:
-                response = line[:colon].strip().upper()
-                next = line[colon + 1:slash].strip()
-                key = line[slash + 1:].strip()
+                response = sys.intern(line[:colon].strip().upper())
+                next = sys.intern(line[colon + 1:slash].strip())
+                key = sys.intern(line[slash + 1:].strip())
                 passage = (response, next, key)
                 passages.append(passage)
 
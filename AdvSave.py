@@ -0,0 +1,284 @@
+# File: AdvSave.py
+
+"""
+This module saves and restores the progress of a player.  A snapshot
+holds the complete GameState in a compact binary form, and a Journal
+keeps a player's progress on disk as a snapshot followed by the changes
+made on each turn, so that saving after every turn costs only as much as
+the turn changed.
+"""
+
+# Snapshot format
+# ---------------
+# A snapshot starts with the magic bytes ADVS and a header holding the
+# format version, a generation number, the current room and the number
+# of rooms and objects in the world.  The header is followed by the
+# visited bitset, one bit per room, and the location of each object as a
+# little-endian 32-bit integer, and the whole snapshot ends with a CRC-32
+# checksum.  A Crowther snapshot is about 90 bytes.  The checksum only
+# catches accidents, so the current room and every object location are
+# also checked against the world before a snapshot is accepted.  A
+# snapshot whose player or objects are in a room that has since been
+# deleted from the world is refused as well.
+#
+# Journal format
+# --------------
+# A journal file starts with the magic bytes ADVJ and the generation of
+# the snapshot it applies to.  Each turn appends one record holding its
+# length, a CRC-32 checksum and the changes made during the turn, each of
+# which is a kind byte followed by two 32-bit integers.  A record is
+# written with a single call, and a record whose checksum does not match,
+# as happens if the program stops partway through a write, ends the
+# journal.  Every change sets a value outright, so replaying a record is
+# never affected by what came before it.  As with a snapshot, every
+# room and object a change refers to is checked against the world, and
+# a record that fails the check means the journal is damaged.
+#
+# When the journal grows past its limit, it is compacted by writing a new
+# snapshot with the next generation and then starting a new, empty
+# journal.  If the program stops between those steps, the old journal
+# no longer matches the generation of the snapshot and is ignored, which
+# is correct because the snapshot already includes its changes.
+
+from array import array
+import os
+import struct
+import sys
+import zlib
+from AdvState import GameState, CHANGE_ROOM, CHANGE_VISITED, CHANGE_OBJECT
+from AdvWorld import PLAYER_ID
+
+# Constants
+
+SAVE_SUFFIX = "Save.dat"
+AUTOSAVE_SUFFIX = "Autosave.dat"
+JOURNAL_SUFFIX = ".journal"
+SNAPSHOT_MAGIC = b"ADVS"
+JOURNAL_MAGIC = b"ADVJ"
+SNAPSHOT_VERSION = 1
+DEFAULT_COMPACT_AFTER = 1000
+
+SNAPSHOT_HEADER = struct.Struct("<4sBIiII")
+JOURNAL_HEADER = struct.Struct("<4sI")
+RECORD_HEADER = struct.Struct("<II")
+CHANGE = struct.Struct("<Bii")
+CHECKSUM = struct.Struct("<I")
+
+def encodeState(state, generation=0):
+    """Returns the snapshot of a GameState as bytes."""
+    locations = array("i", state.locations)
+    if sys.byteorder == "big":
+        locations.byteswap()
+    data = b"".join([
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation,
+                             state.current, len(state.visited) * 8,
+                             len(state.locations)),
+        state.visited, locations.tobytes()
+    ])
+    return data + CHECKSUM.pack(zlib.crc32(data))
+
+def decodeState(world, data):
+    """Returns the pair (state, generation) for a snapshot, raising
+    ValueError if the snapshot is damaged or belongs to another world."""
+    if len(data) < SNAPSHOT_HEADER.size + CHECKSUM.size:
+        raise ValueError("Saved game is truncated")
+    body = data[:-CHECKSUM.size]
+    if CHECKSUM.unpack(data[-CHECKSUM.size:])[0] != zlib.crc32(body):
+        raise ValueError("Saved game is damaged")
+    magic, version, generation, current, rooms, objects = \
+        SNAPSHOT_HEADER.unpack_from(body)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Not a saved game")
+    state = GameState(world)
+    # A snapshot taken before rooms or objects were added to the world
+    # leaves the new ones unvisited and in their starting locations.
+    if rooms > len(state.visited) * 8 or objects > len(state.locations):
+        raise ValueError("Saved game is for a different world")
+    start = SNAPSHOT_HEADER.size
+    end = start + rooms // 8
+    if rooms % 8 != 0 or len(body) != end + 4 * objects:
+        raise ValueError("Saved game is damaged")
+    room_count = world.getRoomCount()
+    if not 0 <= current < room_count:
+        raise ValueError("Saved game is damaged")
+    locations = array("i")
+    locations.frombytes(body[end:])
+    if sys.byteorder == "big":
+        locations.byteswap()
+    if len(locations) != 0 and (min(locations) < PLAYER_ID
+                                or max(locations) >= room_count):
+        raise ValueError("Saved game is damaged")
+    deleted = world.getDeletedRoomIds()
+    if len(deleted) != 0 and (current in deleted
+                              or not deleted.isdisjoint(locations)):
+        raise ValueError("Saved game is in a deleted room")
+    state.current = current
+    state.visited[:rooms // 8] = body[start:end]
+    state.locations[:objects] = locations
+    state.contents = None
+    return state, generation
+
+def writeFile(filename, data):
+    """Replaces the contents of a file atomically."""
+    temp = filename + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, filename)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+def saveState(filename, state, generation=0):
+    """Writes a snapshot of the state to the file."""
+    writeFile(filename, encodeState(state, generation))
+
+def restoreState(filename, world):
+    """Returns the GameState saved in the file, or None if there is no
+    such file.  A damaged snapshot raises ValueError."""
+    try:
+        with open(filename, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    return decodeState(world, data)[0]
+
+def encodeChanges(changes):
+    """Returns the journal record for a list of changes."""
+    payload = b"".join(CHANGE.pack(*change) for change in changes)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def applyChanges(world, state, payload):
+    """Applies the changes in a journal record to a state in the world,
+    raising ValueError if any of them refers to a room or object that
+    the world does not have."""
+    room_count = world.getRoomCount()
+    object_count = world.getObjectCount()
+    deleted = world.getDeletedRoomIds()
+    for kind, index, value in CHANGE.iter_unpack(payload):
+        if kind == CHANGE_ROOM:
+            if not 0 <= index < room_count or index in deleted:
+                raise ValueError("Journal is damaged")
+            state.current = index
+        elif kind == CHANGE_VISITED:
+            if not 0 <= index < room_count:
+                raise ValueError("Journal is damaged")
+            state.visited[index >> 3] |= 1 << (index & 7)
+        elif kind == CHANGE_OBJECT:
+            if (not 0 <= index < object_count
+                    or not PLAYER_ID <= value < room_count
+                    or value in deleted):
+                raise ValueError("Journal is damaged")
+            state.moveObject(index, value)
+        else:
+            raise ValueError("Unknown change in journal")
+
+class Journal:
+
+    def __init__(self, filename, world, compactAfter=DEFAULT_COMPACT_AFTER):
+        """Creates a journal whose snapshot is stored in the file with the
+        specified name and whose changes are appended to the same name
+        with JOURNAL_SUFFIX added.  The journal is compacted into a new
+        snapshot once it holds more than compactAfter records."""
+        self.filename = filename
+        self.journal_name = filename + JOURNAL_SUFFIX
+        self.world = world
+        self.compact_after = compactAfter
+        self.generation = 0
+        self.records = 0
+        self.fd = None
+
+    def restore(self):
+        """Returns the GameState recorded by the journal, or None if
+        nothing has been recorded.  The journal is then ready to record
+        further turns of that state.  A damaged snapshot, or a complete
+        record that does not fit the world, raises ValueError."""
+        try:
+            with open(self.filename, "rb") as f:
+                state, generation = decodeState(self.world, f.read())
+        except FileNotFoundError:
+            return None
+        self.generation = generation
+        self.records = 0
+        try:
+            with open(self.journal_name, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        valid = 0
+        if data[:JOURNAL_HEADER.size] == JOURNAL_HEADER.pack(JOURNAL_MAGIC,
+                                                            generation):
+            pos = JOURNAL_HEADER.size
+            valid = pos
+            while pos + RECORD_HEADER.size <= len(data):
+                length, checksum = RECORD_HEADER.unpack_from(data, pos)
+                start = pos + RECORD_HEADER.size
+                payload = data[start:start + length]
+                if len(payload) != length or zlib.crc32(payload) != checksum:
+                    break
+                applyChanges(self.world, state, payload)
+                pos = start + length
+                valid = pos
+                self.records += 1
+        if valid == 0:
+            self.startJournal()
+        else:
+            # Drop any partial record so that new records follow the
+            # last complete one.
+            self.openJournal()
+            os.ftruncate(self.fd, valid)
+        return state
+
+    def reset(self, state):
+        """Replaces everything recorded so far with a snapshot of state."""
+        self.generation += 1
+        saveState(self.filename, state, self.generation)
+        self.startJournal()
+        state.takeChanges()
+
+    def record(self, state):
+        """Appends the changes made to a state that is tracking changes
+        since the last call, compacting the journal if it is full."""
+        changes = state.takeChanges()
+        if changes is None or len(changes) == 0:
+            return
+        if self.fd is None:
+            self.reset(state)
+            return
+        os.write(self.fd, encodeChanges(changes))
+        self.records += 1
+        if self.records > self.compact_after:
+            self.reset(state)
+
+    def startJournal(self):
+        """Replaces the journal file with an empty one for the current
+        generation."""
+        self.close()
+        writeFile(self.journal_name,
+                  JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.generation))
+        self.records = 0
+        self.openJournal()
+
+    def openJournal(self):
+        """Opens the journal file for appending."""
+        self.close()
+        self.fd = os.open(self.journal_name, os.O_WRONLY | os.O_APPEND)
+
+    def close(self):
+        """Closes the journal file."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def remove(self):
+        """Closes the journal and deletes its snapshot and journal files,
+        so that nothing is restored from them."""
+        self.close()
+        for filename in [ self.filename, self.journal_name ]:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
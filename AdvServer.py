@@ -0,0 +1,311 @@
+# File: AdvServer.py
+
+"""
+This module implements a server that hosts many games of Adventure in
+a single process.  Every connection gets its own Session, and all of
+the sessions share one World loaded at startup.  A server can also host
+several worlds from an AdvRegistry.WorldRegistry, in which case each
+connection first chooses the world it will play.  The protocol is plain
+text: the server sends the output of each command followed by the "> "
+prompt, and the client sends one command per line.
+"""
+
+import argparse
+import asyncio
+import signal
+import sys
+import time
+import uuid
+from AdvGame import AdvGame
+from AdvRegistry import WorldRegistry, DEFAULT_EVICT_INTERVAL
+from AdvRegistry import DEFAULT_IDLE_TIMEOUT as DEFAULT_WORLD_TIMEOUT
+from AdvReload import WorldReloader, DEFAULT_RELOAD_INTERVAL
+from AdvSession import Session
+from AdvSessionManager import SessionManager, DEFAULT_MAX_LIVE
+from AdvStats import GameStats, InstrumentedSession
+from AdvStats import DEFAULT_DUMP_INTERVAL, DEFAULT_PROFILE_COMMANDS
+
+# Constants
+
+PROMPT = "> "
+ENCODING = "utf-8"
+DEFAULT_PORT = 1121
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_WRITE_LIMIT = 64 * 1024
+LISTEN_BACKLOG = 4096
+MAX_COMMAND_LENGTH = 1024
+IDLE_MESSAGE = "You have been idle too long.  Goodbye!\n"
+LOST_MESSAGE = "Your game could not be restored.  Goodbye!\n"
+CHOOSE_MESSAGE = "Which world would you like to play?  The worlds are:\n"
+
+class AdvServer:
+
+    def __init__(self, world, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 write_limit=DEFAULT_WRITE_LIMIT, stats=None, manager=None,
+                 registry=None):
+        """Creates a server for the specified World.  Connections that
+        send nothing for idle_timeout seconds are closed, and a session
+        stops reading commands while more than write_limit bytes of its
+        output are waiting to be sent.  If stats is an AdvStats.GameStats
+        object, every session records its commands there.  If manager is
+        an AdvSessionManager.SessionManager, the sessions are kept there,
+        so that those of idle connections can be hibernated to disk.  If
+        registry is an AdvRegistry.WorldRegistry, world is None and each
+        connection plays one of the registered worlds."""
+        self.world = world
+        self.stats = stats
+        self.manager = manager
+        self.registry = registry
+        self.idle_timeout = idle_timeout
+        self.write_limit = write_limit
+        self.active = 0
+        self.total = 0
+        self.server = None
+        # The sessions of live connections when there is no manager.
+        self.sessions = set()
+
+    async def handleConnection(self, reader, writer):
+        """Plays one game over the connection given by reader and writer."""
+        writer.transport.set_write_buffer_limits(high=self.write_limit)
+        self.active += 1
+        self.total += 1
+        # Connections have no lasting identity, so each is a new player
+        # whose files cannot be confused with those of any other.
+        player = uuid.uuid4().hex
+        world = self.world
+        name = None
+        session = None
+        try:
+            if self.registry is not None:
+                name = await self.chooseWorld(reader, writer)
+                if name is None: return
+                world = await self.registry.acquireAsync(name)
+            if self.manager is not None:
+                session = self.manager.getSession(player)
+            elif self.stats is None:
+                session = Session(world)
+            else:
+                session = InstrumentedSession(world, self.stats)
+            if self.manager is None:
+                self.sessions.add(session)
+            output = session.start()
+            while not session.isFinished():
+                if self.manager is not None:
+                    # The session is fetched again for each command, so
+                    # that one hibernated while the player is idle can
+                    # leave memory.
+                    session = None
+                writer.write((output + PROMPT).encode(ENCODING))
+                # Waiting for the buffer to drain stops a client that does
+                # not read its output from making the server queue it all.
+                await writer.drain()
+                try:
+                    line = await asyncio.wait_for(reader.readline(),
+                                                  self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(IDLE_MESSAGE.encode(ENCODING))
+                    break
+                if line == b"": break
+                command = line.decode(ENCODING, "replace")
+                if self.manager is not None:
+                    try:
+                        session = self.manager.getSession(player)
+                    except ValueError:
+                        # The room the game was hibernated in may have
+                        # been deleted by a reload.
+                        writer.write(LOST_MESSAGE.encode(ENCODING))
+                        break
+                output = session.step(command)
+            else:
+                writer.write(output.encode(ENCODING))
+            await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.active -= 1
+            if self.manager is not None:
+                self.manager.discard(player)
+            else:
+                self.sessions.discard(session)
+            if world is not None and name is not None:
+                self.registry.release(name)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def chooseWorld(self, reader, writer):
+        """Asks the player which registered world to play and returns its
+        name, or None if the connection closes or goes idle first."""
+        names = self.registry.getNames()
+        choices = { name.upper(): name for name in names }
+        message = CHOOSE_MESSAGE + ", ".join(names) + "\n"
+        while True:
+            writer.write((message + PROMPT).encode(ENCODING))
+            await writer.drain()
+            try:
+                line = await asyncio.wait_for(reader.readline(),
+                                              self.idle_timeout)
+            except asyncio.TimeoutError:
+                writer.write(IDLE_MESSAGE.encode(ENCODING))
+                return None
+            if line == b"":
+                return None
+            name = choices.get(line.decode(ENCODING, "replace").strip().upper())
+            if name is not None:
+                return name
+            message = "There is no such world.\n"
+
+    def getLiveStates(self):
+        """Returns the GameStates of the sessions held in memory, which a
+        reload of the world must keep playable."""
+        if self.manager is not None:
+            sessions = self.manager.live.values()
+        else:
+            sessions = self.sessions
+        return [ session.getState() for session in sessions ]
+
+    async def start(self, host=None, port=DEFAULT_PORT, path=None):
+        """Starts listening on a Unix socket if path is given, and on
+        a TCP port otherwise."""
+        if path is not None:
+            self.server = await asyncio.start_unix_server(
+                self.handleConnection, path, limit=MAX_COMMAND_LENGTH,
+                backlog=LISTEN_BACKLOG)
+        else:
+            self.server = await asyncio.start_server(
+                self.handleConnection, host, port, limit=MAX_COMMAND_LENGTH,
+                backlog=LISTEN_BACKLOG)
+        return self.server
+
+    async def serveForever(self, host=None, port=DEFAULT_PORT, path=None):
+        """Starts the server and handles connections until cancelled."""
+        server = await self.start(host, port, path)
+        async with server:
+            await server.serve_forever()
+
+async def serve(server, options, reloader=None):
+    """Runs the server, letting SIGUSR1 start a profile if the server is
+    collecting statistics, watching the data files if reloader is a
+    WorldReloader and evicting idle worlds if the server has a registry."""
+    stats = server.stats
+    if stats is not None and hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGUSR1, stats.profileNext, options.profile_commands,
+            options.stats + ".prof")
+    tasks = [ ]
+    if reloader is not None:
+        tasks.append(asyncio.create_task(
+            reloader.watch(server.getLiveStates, options.reload)))
+    if server.registry is not None:
+        tasks.append(asyncio.create_task(
+            server.registry.evictPeriodically(
+                min(DEFAULT_EVICT_INTERVAL, options.world_timeout))))
+    try:
+        await server.serveForever(options.host, options.port, options.unix)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Host many Adventure sessions in one process.")
+    parser.add_argument("--prefix", action="append", default=None,
+                        help="data file prefix (default Crowther); repeat it "
+                             "to host several worlds")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="TCP port to listen on (default %d)" % DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH",
+                        help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--idle-timeout", type=float,
+                        default=DEFAULT_IDLE_TIMEOUT,
+                        help="seconds before an idle connection is closed")
+    parser.add_argument("--write-limit", type=int,
+                        default=DEFAULT_WRITE_LIMIT,
+                        help="bytes of unsent output allowed per connection")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="measure every command and dump the "
+                             "statistics to FILE")
+    parser.add_argument("--stats-interval", type=float,
+                        default=DEFAULT_DUMP_INTERVAL,
+                        help="seconds between statistics dumps "
+                             "(default %g)" % DEFAULT_DUMP_INTERVAL)
+    parser.add_argument("--profile-commands", type=int,
+                        default=DEFAULT_PROFILE_COMMANDS,
+                        help="commands profiled after SIGUSR1, written to "
+                             "FILE.prof (default %d)" % DEFAULT_PROFILE_COMMANDS)
+    parser.add_argument("--hibernate", metavar="DIR",
+                        help="hibernate the sessions of idle connections "
+                             "to files in DIR")
+    parser.add_argument("--max-live", type=int, default=DEFAULT_MAX_LIVE,
+                        help="sessions kept in memory with --hibernate "
+                             "(default %d)" % DEFAULT_MAX_LIVE)
+    parser.add_argument("--reload", type=float, nargs="?", default=None,
+                        const=DEFAULT_RELOAD_INTERVAL, metavar="SECONDS",
+                        help="bring in edits to the data files while games "
+                             "are running, checking every SECONDS (default "
+                             "%g)" % DEFAULT_RELOAD_INTERVAL)
+    parser.add_argument("--world-timeout", type=float,
+                        default=DEFAULT_WORLD_TIMEOUT,
+                        help="seconds a world of several may go unplayed "
+                             "before it is evicted (default %g)"
+                             % DEFAULT_WORLD_TIMEOUT)
+    options = parser.parse_args(args)
+    prefixes = options.prefix or [ "Crowther" ]
+    world = None
+    registry = None
+    if len(prefixes) > 1:
+        # Hibernated sessions and reloads each belong to a single world.
+        if options.hibernate is not None or options.reload is not None:
+            parser.error("--hibernate and --reload need a single --prefix")
+        registry = WorldRegistry(options.world_timeout)
+        for prefix in prefixes:
+            registry.register(prefix)
+        start = time.perf_counter()
+        registry.load()
+        print("Loaded %d worlds in %.0f ms" %
+              (len(prefixes), (time.perf_counter() - start) * 1e3))
+    else:
+        world = AdvGame(prefixes[0]).world
+    reloader = None
+    if options.reload is not None:
+        reloader = WorldReloader(world, prefixes[0])
+    stats = None
+    if options.stats is not None:
+        stats = GameStats(options.stats, options.stats_interval)
+    manager = None
+    if options.hibernate is not None:
+        manager = SessionManager(world, options.hibernate,
+                                 options.max_live, stats)
+        # Files left by an earlier run belong to connections that are gone.
+        manager.clear()
+    server = AdvServer(world, options.idle_timeout, options.write_limit,
+                       stats, manager, registry)
+    if options.unix is not None:
+        print("Serving " + ", ".join(prefixes) + " on " + options.unix)
+    else:
+        print("Serving %s on %s:%d" % (", ".join(prefixes), options.host,
+                                       options.port))
+    try:
+        asyncio.run(serve(server, options, reloader))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if stats is not None:
+            stats.dump()
+        if manager is not None:
+            summary = manager.getStats()
+            print("Sessions: hit rate %.1f%%, %d restored in %.1f us on "
+                  "average" % (100 * summary["hit_rate"], summary["misses"],
+                               summary["rehydration_us"]["mean"]))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
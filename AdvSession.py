@@ -0,0 +1,361 @@
+# File: AdvSession.py
+
+"""
+This module defines the Session class, which plays a single game of
+Adventure one command at a time.  A session never reads from or writes
+to the terminal; each call to step returns the text that the command
+produced, which makes it possible to drive the game from scripts.
+Sessions keep their progress in a GameState, so any number of them can
+share the same World.
+"""
+
+from AdvSave import saveState, restoreState
+from AdvState import GameState
+from AdvWorld import EXIT_ID, PLAYER_ID
+from tokenscanner import TokenScanner
+
+class Session:
+
+    def __init__(self, world, state=None, journal=None, savePath=None):
+        """Starts a new session in the specified World.  If state is
+        supplied, the session continues from that GameState.  If journal
+        is supplied, the changes made by each command are recorded in
+        that AdvSave.Journal, and savePath names the file used by the
+        SAVE and RESTORE commands."""
+        self.world = world
+        if state is None:
+            state = GameState(world)
+        self.state = state
+        self.journal = journal
+        self.save_path = savePath
+        if journal is not None:
+            state.trackChanges()
+        self.finished = False
+        # The after_help variable keeps track of which type of command
+        # was just given, so that redundant information isn't printed.
+        self.after_help = False
+        # The rendered list of objects in each room the player has seen,
+        # which TAKE and DROP discard for the room they change.
+        self.listings = { }
+        self.world_generation = world.generation
+        self._output = [ ]
+
+    def isFinished(self):
+        """Returns True if the player has quit or the game has ended."""
+        return self.finished
+
+    def getCurrentRoom(self):
+        """Returns the name of the room the player is in."""
+        return self.world.getRoomById(self.state.getCurrentRoom()).getName()
+
+    def getState(self):
+        """Returns the GameState for this session."""
+        return self.state
+
+    def start(self):
+        """Returns the text describing the room the player starts in."""
+        self._output = [ ]
+        self.describe()
+        if self.journal is not None:
+            self.journal.record(self.state)
+        return "".join(self._output)
+
+    def step(self, command):
+        """Executes one command and returns the text it produces, which
+        includes the description of the room the player ends up in."""
+        if self.finished:
+            return ""
+        self._output = [ ]
+        self.execute(command.strip().upper())
+        if not self.finished:
+            self.describe()
+        if self.journal is not None:
+            self.journal.record(self.state)
+        return "".join(self._output)
+
+    def runScript(self, commands):
+        """Executes each command in turn and returns the list of their
+        outputs.  The script stops early if the game ends."""
+        outputs = [ ]
+        for command in commands:
+            if self.finished: break
+            outputs.append(self.step(command))
+        return outputs
+
+    def describe(self):
+        """Describes the current room, moving through any forced rooms."""
+        world = self.world
+        state = self.state
+        # Check what room the player is in, and print the appropriate description.
+        current = state.getCurrentRoom()
+
+        # If the player is in a forced room, print the descriptions of the
+        # forced rooms along the way and move to the room at the end.
+        forced = world.followForcedRooms(current, state)
+        if forced is not None:
+            text, current = forced
+            self.write(text)
+            self.moveTo(current)
+            if self.finished: return
+        if self.after_help:
+            return
+        if state.hasVisited(current):
+            self.write(world.getShortText(current))
+        else:
+            self.write(world.getRoomById(current).getLongText())
+            state.setVisited(current)
+        self.listContents(current)
+
+    def listContents(self, location):
+        """Lists the objects in the room with the specified id."""
+        world = self.world
+        if self.world_generation != world.generation:
+            # An update to the world may have changed how objects appear.
+            self.listings.clear()
+            self.world_generation = world.generation
+        text = self.listings.get(location)
+        if text is None:
+            text = "".join([ world.getPresenceText(object_id) for object_id
+                             in self.state.getObjectsAt(location) ])
+            self.listings[location] = text
+        if text != "":
+            self.write(text)
+
+    def moveTo(self, room_id):
+        """Moves the player to the room with the specified id, which ends
+        the game if the id is EXIT_ID."""
+        if room_id == EXIT_ID:
+            self.finished = True
+        else:
+            self.state.setCurrentRoom(room_id)
+
+    def execute(self, cmd):
+        """Processes one command, which has already been converted to
+        upper case.  The first word of the command selects a handler from
+        the verbs table; anything else is taken to be the name of a
+        passage out of the current room."""
+        cmd, tokens = self.parseCommand(cmd)
+        handler = None
+        if len(tokens) != 0:
+            handler = self.verbs.get(tokens[0])
+        if handler is None:
+            self.doMove(cmd)
+        else:
+            handler(self, tokens)
+
+    def parseCommand(self, cmd):
+        """Returns the pair (cmd, tokens) for a command, where cmd has any
+        synonym for the whole command replaced and tokens is the list of
+        its words with their synonyms replaced."""
+        world = self.world
+        if world.synonyms is not None:
+            cmd = world.synonyms.get(cmd, cmd)
+        return cmd, world.canonicalize(_scanner.tokenize(cmd))
+
+    @classmethod
+    def defineVerb(cls, verb, handler):
+        """Adds a verb to the table used by execute.  The handler is
+        called with the session and the list of tokens in the command.
+        Defining a verb on a subclass of Session does not affect the
+        verbs of its base class."""
+        if "verbs" not in cls.__dict__:
+            cls.verbs = dict(cls.verbs)
+        cls.verbs[verb] = handler
+
+    def doLook(self, tokens):
+        """Prints the long description and the items in the room."""
+        current = self.state.getCurrentRoom()
+        self.write(self.world.getRoomById(current).getLongText())
+        self.listContents(current)
+        self.after_help = True
+
+    def doHelp(self, tokens):
+        """Prints the help text."""
+        self.write(HELP_BLOCK)
+        self.after_help = True
+
+    def doInventory(self, tokens):
+        """Tells the player what they are carrying."""
+        self.print("You are carrying:")
+        for object_id in self.state.getInventory():
+            self.print("  " + self.world.getObject(object_id).getDescription())
+        self.after_help = True
+
+    def doTake(self, tokens):
+        """Moves each object named in the command from the room to the
+        inventory, or notifies the player if none of them are here.  The
+        word ALL takes every object in the room."""
+        world = self.world
+        state = self.state
+        current = state.getCurrentRoom()
+        found_object = False
+        for object_id in self.findObjects(tokens, current):
+            # Note that we found an object
+            found_object = True
+            # Move the object from the room to the inventory
+            state.moveObject(object_id, PLAYER_ID)
+            # Let the player know it was successful.
+            object = world.getObject(object_id)
+            self.print("A " + object.getDescription()[2:] + " was added to your inventory.")
+        if found_object:
+            self.listings.pop(current, None)
+        # If the object isn't in the room, let the player know
+        else:
+            self.print("That object doesn't seem to be in this room.")
+        self.after_help = True
+
+    def doDrop(self, tokens):
+        """Moves each object named in the command from the inventory to
+        the room, or notifies the player that they don't have it.  The
+        word ALL drops everything the player carries."""
+        world = self.world
+        state = self.state
+        current = state.getCurrentRoom()
+        found_object = False
+        for object_id in self.findObjects(tokens, PLAYER_ID):
+            state.moveObject(object_id, current)
+            object = world.getObject(object_id)
+            self.print("You dropped " + object.getDescription() + ".")
+            found_object = True
+        if found_object:
+            self.listings.pop(current, None)
+        else:
+            self.print("That object doesn't seem to be in your inventory.")
+
+    def findObjects(self, tokens, location):
+        """Returns the list of ids for the objects named by the tokens
+        after the verb that are at the location, in the order they were
+        named.  The word ALL stands for every object at the location,
+        unless the world has an object of that name."""
+        world = self.world
+        state = self.state
+        # A dictionary serves as an ordered set, so an object named twice
+        # is only moved once.
+        found = { }
+        for token in tokens[1:]:
+            object_id = world.getObjectId(token)
+            if object_id is None and token == ALL_WORD:
+                found.update(dict.fromkeys(state.getObjectsAt(location)))
+            elif object_id is not None and state.getLocation(object_id) == location:
+                found[object_id] = None
+        return list(found)
+
+    def doSave(self, tokens):
+        """Saves a snapshot of the game to the save file."""
+        self.after_help = True
+        if not self.canSave():
+            self.print("Saving is not available in this game.")
+            return
+        try:
+            self.writeSave(self.state)
+            self.print("Game saved.")
+        except OSError:
+            self.print("Your game could not be saved.")
+
+    def doRestore(self, tokens):
+        """Returns the game to the snapshot in the save file."""
+        self.after_help = True
+        if not self.canSave():
+            self.print("Saving is not available in this game.")
+            return
+        try:
+            state = self.readSave()
+        except (OSError, ValueError):
+            self.print("Your saved game could not be read.")
+            return
+        if state is None:
+            self.print("There is no saved game.")
+            return
+        if self.journal is not None:
+            state.trackChanges()
+            self.journal.reset(state)
+        self.state = state
+        self.listings.clear()
+        self.print("Game restored.")
+        self.after_help = False
+
+    def canSave(self):
+        """Returns True if this session has a save file."""
+        return self.save_path is not None
+
+    def writeSave(self, state):
+        """Writes a snapshot of state to the save file."""
+        saveState(self.save_path, state)
+
+    def readSave(self):
+        """Returns the GameState in the save file, or None if there is no
+        saved game.  A damaged snapshot raises ValueError."""
+        return restoreState(self.save_path, self.world)
+
+    def doQuit(self, tokens):
+        """Ends the game."""
+        self.finished = True
+
+    def doMove(self, cmd):
+        """Moves the player through the passage named by cmd."""
+        world = self.world
+        next = world.getNextRoomId(self.state.getCurrentRoom(),
+                                   world.lookupWord(cmd), self.state)
+        self.after_help = False
+        if next is None:
+            self.print("I don't understand that response.")
+            self.after_help = True
+        else:
+            self.moveTo(next)
+
+    def print(self, line):
+        """Adds a line to the output of the current command."""
+        self._output.append(line)
+        self._output.append("\n")
+
+    def write(self, text):
+        """Adds text that already ends with a newline to the output."""
+        self._output.append(text)
+
+    # The table of verbs, which maps the first word of a command to the
+    # method that carries it out
+    verbs = {
+        "LOOK": doLook,
+        "HELP": doHelp,
+        "INVENTORY": doInventory,
+        "TAKE": doTake,
+        "DROP": doDrop,
+        "SAVE": doSave,
+        "RESTORE": doRestore,
+        "QUIT": doQuit
+    }
+
+# Private data
+
+_scanner = TokenScanner()
+_scanner.ignoreWhitespace()
+
+
+# Constants
+
+HELP_TEXT = [
+    "Welcome to Adventure!",
+    "Somewhere nearby is Colossal Cave, where others have found fortunes in",
+    "treasure and gold, though it is rumored that some who enter are never",
+    "seen again.  Magic is said to work in the cave.  I will be your eyes",
+    "and hands.  Direct me with natural English commands; I don't understand",
+    "all of the English language, but I do a pretty good job.",
+    "",
+    "It's important to remember that cave passages turn a lot, and that",
+    "leaving a room to the north does not guarantee entering the next from",
+    "the south, although it often works out that way.  You'd best make",
+    "yourself a map as you go along.",
+    "",
+    "Much of my vocabulary describes places and is used to move you there.",
+    "To move, try words like IN, OUT, EAST, WEST, NORTH, SOUTH, UP, or DOWN.",
+    "I also know about a number of objects hidden within the cave which you",
+    "can TAKE or DROP.  To see what objects you're carrying, say INVENTORY.",
+    "To reprint the detailed description of where you are and see which objects,",
+    "are in the room, say LOOK. If you want to end your adventure, say QUIT.",
+    "To save your progress, say SAVE, and to return to it later, say RESTORE."
+]
+
+HELP_BLOCK = "\n".join(HELP_TEXT) + "\n"
+
+# The word that stands for every object in TAKE and DROP
+ALL_WORD = "ALL"
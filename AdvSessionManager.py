@@ -0,0 +1,249 @@
+# File: AdvSessionManager.py
+
+"""
+This module defines the SessionManager class, which keeps the sessions
+of many players while holding only a bounded number of them in memory.
+When there are too many live sessions, the least recently used one is
+hibernated to a compact snapshot on disk, and it is restored the next
+time its player gives a command.  Run as a program, it simulates many
+players, most of them idle, and reports the hit rate and the time taken
+to hibernate and restore sessions.
+"""
+
+# Implementation notes
+# --------------------
+# The live sessions are kept in an OrderedDict in order of use, as the
+# rooms of a LazyWorld are, so finding a session and marking it as the
+# most recent takes constant time.  Nothing about a hibernated session
+# is kept in memory: whether a player has one is decided by looking for
+# its file, so memory depends only on the number of live sessions.
+#
+# A hibernated session is an AdvSave snapshot followed by the same flags
+# byte that transcripts use, so a Crowther session takes under 100 bytes.
+# The file is written atomically and left in place when the session is
+# restored, which means that a crash loses only what the player did
+# since the session was last hibernated.  Player names are quoted to
+# make file names, so any string can be used as a name.  A player's SAVE
+# file is kept in the same directory, and discarding a player removes it
+# along with the hibernated session.  A server whose players last only as
+# long as their connections calls clear at startup, so that files left
+# behind by a crash are never mistaken for a new player's.
+
+import argparse
+from collections import OrderedDict
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import quote
+from AdvSave import encodeState, decodeState, writeFile, SAVE_SUFFIX
+from AdvSession import Session
+from AdvStats import Histogram, InstrumentedSession
+from AdvTranscript import getFlags, FINISHED_FLAG, AFTER_HELP_FLAG
+
+# Constants
+
+DEFAULT_MAX_LIVE = 1000
+SESSION_SUFFIX = ".session"
+
+class SessionManager:
+
+    def __init__(self, world, directory, maxLive=DEFAULT_MAX_LIVE, stats=None):
+        """Creates a manager for sessions in the specified World that
+        keeps at most maxLive of them in memory and hibernates the rest
+        to files in directory.  If stats is an AdvStats.GameStats object,
+        the sessions record their commands there."""
+        self.world = world
+        self.directory = directory
+        self.max_live = maxLive
+        self.stats = stats
+        self.live = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.hibernations = 0
+        self.rehydration = Histogram()
+        self.hibernation = Histogram()
+        os.makedirs(directory, exist_ok=True)
+
+    def getSession(self, player):
+        """Returns the session for the named player, restoring it from
+        disk if it was hibernated and starting a new one if the player
+        has none.  A new session has not yet been started."""
+        session = self.live.get(player)
+        if session is not None:
+            self.hits += 1
+            self.live.move_to_end(player)
+            return session
+        start = time.perf_counter()
+        session = self.rehydrate(player)
+        if session is None:
+            session = self.createSession(player)
+            self.created += 1
+        else:
+            self.misses += 1
+            self.rehydration.add((time.perf_counter() - start) * 1e6)
+        self.live[player] = session
+        while len(self.live) > self.max_live:
+            self.hibernate(next(iter(self.live)))
+        return session
+
+    def step(self, player, command):
+        """Executes a command in the named player's session and returns
+        its output."""
+        return self.getSession(player).step(command)
+
+    def createSession(self, player, state=None):
+        """Returns a new session for the named player, starting from state
+        if it is given."""
+        save_path = self.getPath(player, SAVE_SUFFIX)
+        if self.stats is None:
+            return Session(self.world, state, savePath=save_path)
+        return InstrumentedSession(self.world, self.stats, state,
+                                   savePath=save_path)
+
+    def hibernate(self, player):
+        """Writes the named player's live session to disk and removes it
+        from memory."""
+        start = time.perf_counter()
+        session = self.live[player]
+        writeFile(self.getPath(player, SESSION_SUFFIX),
+                  encodeState(session.getState()) + bytes([ getFlags(session) ]))
+        del self.live[player]
+        self.hibernations += 1
+        self.hibernation.add((time.perf_counter() - start) * 1e6)
+
+    def rehydrate(self, player):
+        """Returns the session hibernated for the named player, or None if
+        there is none.  A damaged file, or one whose game is in a room
+        that has since been deleted, raises ValueError."""
+        try:
+            with open(self.getPath(player, SESSION_SUFFIX), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) == 0:
+            raise ValueError("Hibernated session is truncated")
+        session = self.createSession(player, decodeState(self.world,
+                                                         data[:-1])[0])
+        session.finished = (data[-1] & FINISHED_FLAG) != 0
+        session.after_help = (data[-1] & AFTER_HELP_FLAG) != 0
+        return session
+
+    def discard(self, player):
+        """Forgets the named player's session, both in memory and on disk,
+        together with the player's SAVE file."""
+        self.live.pop(player, None)
+        for suffix in [ SESSION_SUFFIX, SAVE_SUFFIX ]:
+            try:
+                os.remove(self.getPath(player, suffix))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Forgets every session and removes every hibernated session and
+        SAVE file in the directory."""
+        self.live.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith(SESSION_SUFFIX) or name.endswith(SAVE_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def hibernateAll(self):
+        """Writes every live session to disk, as before shutting down."""
+        while len(self.live) != 0:
+            self.hibernate(next(iter(self.live)))
+
+    def getPath(self, player, suffix):
+        """Returns the path of a file belonging to the named player."""
+        return os.path.join(self.directory, quote(player, safe="") + suffix)
+
+    def getLiveCount(self):
+        """Returns the number of sessions held in memory."""
+        return len(self.live)
+
+    def getStats(self):
+        """Returns a dictionary with the number of lookups that found a
+        live session (hits), restored a hibernated one (misses) or
+        started a new one, the hit rate, and summaries in microseconds
+        of the time taken to hibernate and to restore sessions."""
+        lookups = self.hits + self.misses + self.created
+        return {
+            "live": len(self.live),
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "hibernations": self.hibernations,
+            "hit_rate": self.hits / lookups if lookups != 0 else 0.0,
+            "rehydration_us": self.rehydration.getSummary(),
+            "hibernation_us": self.hibernation.getSummary()
+        }
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Simulate many mostly idle players sharing a "
+                    "SessionManager.")
+    parser.add_argument("--prefix", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--players", type=int, default=20000,
+                        help="number of players (default 20000)")
+    parser.add_argument("--max-live", type=int, default=DEFAULT_MAX_LIVE,
+                        help="sessions kept in memory (default %d)"
+                             % DEFAULT_MAX_LIVE)
+    parser.add_argument("--commands", type=int, default=50000,
+                        help="commands to play (default 50000)")
+    parser.add_argument("--active", type=float, default=0.05,
+                        help="fraction of players who give most of the "
+                             "commands (default 0.05)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default 0)")
+    options = parser.parse_args(args)
+    from AdvGame import AdvGame
+    from sessionbench import DEFAULT_SCRIPT
+    world = AdvGame(options.prefix).world
+    rng = random.Random(options.seed)
+    active = max(1, int(options.players * options.active))
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        manager = SessionManager(world, directory, options.max_live)
+        turns = { }
+        start = time.perf_counter()
+        for i in range(options.commands):
+            # Nine commands in ten come from the active players.
+            if rng.random() < 0.9:
+                player = "player%d" % rng.randrange(active)
+            else:
+                player = "player%d" % rng.randrange(options.players)
+            session = manager.getSession(player)
+            turn = turns.get(player, 0)
+            if turn == 0:
+                session.start()
+            session.step(DEFAULT_SCRIPT[turn % len(DEFAULT_SCRIPT)])
+            turns[player] = turn + 1
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stats = manager.getStats()
+    print("%d commands from %d players in %.2f s, at most %d live sessions"
+          % (options.commands, options.players, elapsed, options.max_live))
+    print("Hit rate %.1f%%: %d hits, %d misses, %d new, %d hibernations"
+          % (100 * stats["hit_rate"], stats["hits"], stats["misses"],
+             stats["created"], stats["hibernations"]))
+    for label in [ "rehydration_us", "hibernation_us" ]:
+        summary = stats[label]
+        print("%-14s mean %7.1f us, p50 %d, p99 %d, max %d" %
+              (label[:-3], summary["mean"], summary["p50"], summary["p99"],
+               summary["max"]))
+    print("Peak traced memory %.1f MB" % (peak / 1e6))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# File: AdvSimulate.py
+
+"""
+This program estimates how random players fare in a world by simulating
+large numbers of random walks.  It reports how often each room is
+visited, which rooms are never seen, how many turns it takes to first
+reach a set of target rooms and how long the walks last.  The walks are
+spread over a pool of worker processes that share the loaded world.
+"""
+
+# Simulation model
+# ----------------
+# Each walk starts in the first room, exactly as a new game does.  On
+# every turn, the walker first picks up the objects it finds in the room,
+# each with probability take, which costs one turn for the whole room.
+# Otherwise it chooses one of the passage verbs out of the room, either
+# uniformly or in proportion to a weight given for each verb, and moves
+# according to the same rules as the game, so keyed passages depend on
+# the objects carried and forced rooms are passed through at once.  A
+# walk ends when it reaches EXIT or after maxTurns turns.
+#
+# Sharing the world
+# -----------------
+# Worker processes are started with fork after the world is loaded, so
+# they inherit it through copy-on-write memory instead of receiving a
+# pickled copy with every task.  Each task is just a seed and a number
+# of walks, and each result holds only counts, which are added together
+# in the parent.  Where fork is not available, the walks are run in the
+# parent process.
+
+import argparse
+from array import array
+import multiprocessing
+import os
+import random
+import sys
+import time
+from AdvGame import AdvGame
+from AdvWorld import EXIT_ID, PLAYER_ID
+
+# Constants
+
+DEFAULT_MAX_TURNS = 500
+DEFAULT_TAKE = 1.0
+TASK_COUNT = 64
+
+class WalkResults:
+
+    """This class holds the totals for a batch of walks."""
+
+    def __init__(self, targetCount, maxTurns):
+        """Creates empty totals.  The visits are kept in a dictionary from
+        room ids to counts, since walks in a large world visit only a
+        small fraction of its rooms."""
+        self.walks = 0
+        self.turns = 0
+        self.exits = 0
+        self.visits = { }
+        self.lengths = zeros(maxTurns + 1)
+        self.first_visits = [ zeros(maxTurns + 1) for i in range(targetCount) ]
+
+    def merge(self, other):
+        """Adds the totals from another WalkResults to these."""
+        self.walks += other.walks
+        self.turns += other.turns
+        self.exits += other.exits
+        for room_id, count in other.visits.items():
+            self.visits[room_id] = self.visits.get(room_id, 0) + count
+        addCounts(self.lengths, other.lengths)
+        for mine, theirs in zip(self.first_visits, other.first_visits):
+            addCounts(mine, theirs)
+
+class Simulator:
+
+    def __init__(self, world, targets=(), maxTurns=DEFAULT_MAX_TURNS,
+                 take=DEFAULT_TAKE, weights=None):
+        """Creates a simulator for walks in the specified World.  The
+        targets are the ids of the rooms whose first visits are timed,
+        and weights maps verbs to their relative chance of being chosen,
+        with 1 for any verb that is not listed."""
+        self.world = world
+        self.targets = list(targets)
+        self.max_turns = maxTurns
+        self.take = take
+        self.target_index = { room_id: i for i, room_id in enumerate(targets) }
+        self.weights = { }
+        if weights is not None:
+            for verb, weight in weights.items():
+                self.weights[world.lookupWord(verb)] = weight
+        self.objects_at = { }
+        for object_id, location in enumerate(world.getInitialLocations()):
+            if location != PLAYER_ID:
+                self.objects_at.setdefault(location, [ ]).append(object_id)
+        self.forced = bytearray(world.getRoomCount())
+        for room_id in range(world.getRoomCount()):
+            if world.getForcedJump(room_id) is not None:
+                self.forced[room_id] = 1
+        self.choices = { }
+
+    def getChoices(self, room_id):
+        """Returns the pair (verbs, weights) for the verbs the walker may
+        choose in a room, where weights is None if all are equal."""
+        entry = self.choices.get(room_id)
+        if entry is None:
+            world = self.world
+            verbs, targets, keys, start, end = world.getPassageRange(room_id)
+            choices = [ ]
+            for i in range(start, end):
+                word_id = verbs[i]
+                if word_id != world.forced_word and (len(choices) == 0
+                                                     or choices[-1] != word_id):
+                    choices.append(word_id)
+            weights = None
+            if len(self.weights) != 0:
+                weights = [ self.weights.get(word_id, 1) for word_id in choices ]
+            entry = (choices, weights)
+            self.choices[room_id] = entry
+        return entry
+
+    def runWalks(self, count, seed):
+        """Runs count walks from the given seed and returns their totals."""
+        results = WalkResults(len(self.targets), self.max_turns)
+        rng = random.Random(seed)
+        for i in range(count):
+            self.walk(rng, results)
+        return results
+
+    def walk(self, rng, results):
+        """Runs a single walk and adds it to the results."""
+        world = self.world
+        state = WalkState()
+        visits = results.visits
+        forced = self.forced
+        target_index = self.target_index
+        first_visits = results.first_visits
+        seen = set()
+        turn = 0
+        room_id = 0
+        while True:
+            # Pass through any forced rooms, recording each of them.
+            while room_id != EXIT_ID and forced[room_id]:
+                visits[room_id] = visits.get(room_id, 0) + 1
+                if room_id in target_index and room_id not in seen:
+                    seen.add(room_id)
+                    first_visits[target_index[room_id]][turn] += 1
+                room_id = world.getNextRoomId(room_id, world.forced_word,
+                                              state)
+            if room_id == EXIT_ID:
+                results.exits += 1
+                break
+            visits[room_id] = visits.get(room_id, 0) + 1
+            if room_id in target_index and room_id not in seen:
+                seen.add(room_id)
+                first_visits[target_index[room_id]][turn] += 1
+            if turn == self.max_turns: break
+            turn += 1
+            taken = False
+            for object_id in self.objects_at.get(room_id, ()):
+                if (not state.isCarrying(object_id)
+                        and rng.random() < self.take):
+                    state.carried |= 1 << object_id
+                    taken = True
+            if taken: continue
+            choices, weights = self.getChoices(room_id)
+            if len(choices) == 0: continue
+            if weights is None:
+                word_id = choices[int(rng.random() * len(choices))]
+            else:
+                word_id = rng.choices(choices, weights)[0]
+            next_id = world.getNextRoomId(room_id, word_id, state)
+            if next_id is not None:
+                room_id = next_id
+        results.walks += 1
+        results.turns += turn
+        results.lengths[turn] += 1
+
+    def run(self, walks, seed=0, processes=None):
+        """Runs the walks, split across a pool of processes, and returns
+        the combined WalkResults.  The walks are always divided into the
+        same tasks, so the results depend only on the seed."""
+        if processes is None:
+            processes = os.cpu_count() or 1
+        tasks = max(1, min(walks, TASK_COUNT))
+        counts = [ walks // tasks + (1 if i < walks % tasks else 0)
+                   for i in range(tasks) ]
+        arguments = [ (count, seed * 1000003 + i)
+                      for i, count in enumerate(counts) ]
+        total = WalkResults(len(self.targets), self.max_turns)
+        global _simulator
+        if processes <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for count, task_seed in arguments:
+                total.merge(self.runWalks(count, task_seed))
+            return total
+        _simulator = self
+        try:
+            context = multiprocessing.get_context("fork")
+            with context.Pool(processes) as pool:
+                for results in pool.imap_unordered(_runTask, arguments):
+                    total.merge(results)
+        finally:
+            _simulator = None
+        return total
+
+class WalkState:
+
+    """This class stands in for a GameState during a walk.  It only
+    records which objects are carried, as a bitset."""
+
+    __slots__ = ("carried",)
+
+    def __init__(self):
+        self.carried = 0
+
+    def isCarrying(self, object_id):
+        """Returns True if the walker is carrying the object."""
+        return (self.carried >> object_id) & 1 == 1
+
+# Count arrays
+
+def zeros(length):
+    """Returns an array of length 64-bit counts, all zero."""
+    return array("q", bytes(8 * length))
+
+def addCounts(total, counts):
+    """Adds each entry of counts to the same entry of total."""
+    for i, count in enumerate(counts):
+        if count != 0:
+            total[i] += count
+
+def summarize(histogram):
+    """Returns the tuple (count, mean, median, p90) for a histogram in
+    which entry i is the number of walks that took i turns."""
+    count = sum(histogram)
+    if count == 0:
+        return 0, 0.0, 0, 0
+    mean = sum(i * n for i, n in enumerate(histogram)) / count
+    percentiles = [ ]
+    for fraction in (0.5, 0.9):
+        running = 0
+        for i, n in enumerate(histogram):
+            running += n
+            if running >= fraction * count: break
+        percentiles.append(i)
+    return count, mean, percentiles[0], percentiles[1]
+
+# Private functions
+
+_simulator = None
+
+def _runTask(arguments):
+    """Runs one task in a worker process using the inherited simulator."""
+    count, seed = arguments
+    return _simulator.runWalks(count, seed)
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Simulate random walks through an Adventure world.")
+    parser.add_argument("prefix", nargs="?", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--walks", type=int, default=10000,
+                        help="number of walks (default 10000)")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS,
+                        help="turns before a walk is abandoned "
+                             "(default %d)" % DEFAULT_MAX_TURNS)
+    parser.add_argument("--target", action="append", default=[ ],
+                        metavar="ROOM", help="time the first visit to ROOM")
+    parser.add_argument("--take", type=float, default=DEFAULT_TAKE,
+                        help="chance of picking up each object found")
+    parser.add_argument("--weight", action="append", default=[ ],
+                        metavar="VERB=WEIGHT",
+                        help="relative chance of choosing VERB")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default one per core)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default 0)")
+    options = parser.parse_args(args)
+    world = AdvGame(options.prefix).world
+    targets = [ ]
+    for name in options.target:
+        room_id = world.findRoomId(name)
+        if room_id is None:
+            print("No room named " + name, file=sys.stderr)
+            return 1
+        targets.append(room_id)
+    weights = { }
+    for entry in options.weight:
+        verb, weight = entry.split("=")
+        weights[verb.strip().upper()] = float(weight)
+    simulator = Simulator(world, targets, options.max_turns, options.take,
+                          weights)
+    start = time.perf_counter()
+    results = simulator.run(options.walks, options.seed, options.processes)
+    elapsed = time.perf_counter() - start
+    print("%d walks, %d turns in %.2f s (%.0f walks, %.0f turns per second)"
+          % (results.walks, results.turns, elapsed, results.walks / elapsed,
+             results.turns / elapsed))
+    count, mean, median, p90 = summarize(results.lengths)
+    print("Walk length: mean %.1f, median %d, p90 %d turns; %d reached EXIT"
+          % (mean, median, p90, results.exits))
+    never = [ room_id for room_id in range(world.getRoomCount())
+              if room_id not in results.visits ]
+    print("Rooms never visited: %d of %d" % (len(never), world.getRoomCount()))
+    if 0 < len(never) <= 20:
+        print("  " + ", ".join(world.getRoomById(room_id).getName()
+                               for room_id in never))
+    for name, histogram in zip(options.target, results.first_visits):
+        count, mean, median, p90 = summarize(histogram)
+        if count == 0:
+            print("%s: never reached" % name)
+        else:
+            print("%s: reached in %.1f%% of walks, mean %.1f, median %d, "
+                  "p90 %d turns" % (name, 100.0 * count / results.walks,
+                                    mean, median, p90))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
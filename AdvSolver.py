@@ -0,0 +1,570 @@
+# File: AdvSolver.py
+
+"""
+This module defines the Solver class, which analyzes a World to find
+the rooms a player can reach, the objects a player can collect and the
+shortest sequence of commands that reaches a given room.  Run as a
+program, it prints a report for the world with the specified prefix.
+"""
+
+# Search model
+# ------------
+# A position in the game is the room the player is in together with the
+# location of every key object, which is an object that opens a keyed
+# passage somewhere in the world.  The locations of other objects never
+# change where a passage leads, so they are left out of the search, and
+# such an object can be collected exactly when its starting room can be
+# reached.  Each position is a tuple (room_id, carried, locations), where
+# carried is a bitset of the carried objects indexed by object id, so that
+# each keyed passage is checked with a single shift and AND, and locations
+# holds the room id of each key object or PLAYER_ID if it is carried.
+#
+# The commands considered in each position are the passage verbs of the
+# room, TAKE for each key object in the room and DROP for each carried
+# key object.  Passing through forced rooms is part of the move that
+# enters them, and every forced room passed through counts as reached.
+# To keep the number of positions manageable, a key object is dropped
+# only in a room where leaving it behind changes where one of the room's
+# passages leads.
+#
+# Before searching, the solver finds every room that could be reached if
+# the player were always able to choose which of the available keys to
+# carry.  Rooms outside that set can never be reached, and distances in
+# that relaxed graph, measured backwards from a goal, give A* an estimate
+# of the commands still needed that never overestimates.  A search gives
+# up after examining maxStates positions, so that it stays bounded on
+# very large worlds; a report based on such a search lists the rooms it
+# could not decide.
+#
+# To classify every room, the solver first explores the positions near
+# the start breadth first.  If that is cut short, the rooms it did not
+# reach are searched for one at a time, and every room that any of these
+# searches steps into is reachable, so a room on the way to one found
+# earlier needs no search of its own.  The rooms are taken in decreasing
+# order of the estimate A* makes for them at the start, since the rooms
+# that need the most commands are the most likely to lie beyond others.
+
+import argparse
+from collections import deque
+import heapq
+import os
+import sys
+import time
+from AdvGame import AdvGame
+from AdvWorld import EXIT_ID, NO_KEY, PLAYER_ID
+
+# Constants
+
+DEFAULT_MAX_STATES = 2000000
+DEFAULT_EXPLORE_STATES = 100000
+NO_ROUTE = -1
+
+# Room status values returned by classifyRooms
+
+UNREACHABLE = 0
+REACHABLE = 1
+UNDECIDED = 2
+
+class Solver:
+
+    def __init__(self, world, maxStates=DEFAULT_MAX_STATES):
+        """Creates a solver for the specified World, which examines at
+        most maxStates positions in any one search."""
+        self.world = world
+        self.max_states = maxStates
+        self.truncated = False
+        self.moves = { }
+        self.forced_targets = { }
+        self.relevant_keys = { }
+        self.outcomes = { }
+        self.reverse = None
+        self.possible_without = { }
+        self.walkthroughs = { }
+        self.findKeyObjects()
+
+    def findKeyObjects(self):
+        """Finds the objects that open at least one keyed passage."""
+        world = self.world
+        keys = set()
+        for room_id in range(world.getRoomCount()):
+            for word_id, candidates in self.getExits(room_id):
+                for target, key_id in candidates:
+                    if key_id != NO_KEY:
+                        keys.add(key_id)
+        self.key_objects = sorted(keys)
+
+    def getKeyObjects(self):
+        """Returns the sorted list of ids of the key objects."""
+        return self.key_objects
+
+    def wasTruncated(self):
+        """Returns True if the last search gave up after maxStates
+        positions, in which case its answer may be incomplete."""
+        return self.truncated
+
+    # Moves
+
+    def getMoves(self, room_id):
+        """Returns a list of (word_id, candidates) pairs for the verbs of
+        an ordinary room.  The candidates are the (target, key_id) pairs
+        for the verb that the player might take, in the order they are
+        tried, ending with the first passage that needs no key."""
+        moves = self.moves.get(room_id)
+        if moves is None:
+            world = self.world
+            count = world.getObjectCount()
+            verbs, targets, keys, start, end = world.getPassageRange(room_id)
+            moves = [ ]
+            for i in range(start, end):
+                word_id = verbs[i]
+                if word_id == world.forced_word: continue
+                if len(moves) == 0 or moves[-1][0] != word_id:
+                    moves.append((word_id, [ ]))
+                candidates = moves[-1][1]
+                if len(candidates) != 0 and candidates[-1][1] == NO_KEY:
+                    continue
+                # A key that names no object can never be carried.
+                if keys[i] < count:
+                    candidates.append((targets[i], keys[i]))
+            self.moves[room_id] = moves
+        return moves
+
+    def getForcedTargets(self, room_id):
+        """Returns the candidates for the FORCED passages of a forced
+        room, or None if the room is an ordinary one."""
+        if room_id in self.forced_targets:
+            return self.forced_targets[room_id]
+        targets = None
+        if self.world.getForcedJump(room_id) is not None:
+            targets = self.world.getForcedTargets(room_id)
+        self.forced_targets[room_id] = targets
+        return targets
+
+    def getExits(self, room_id):
+        """Returns the (word_id, candidates) pairs for the ways out of a
+        room, where a forced room has the single verb FORCED."""
+        targets = self.getForcedTargets(room_id)
+        if targets is None:
+            return self.getMoves(room_id)
+        return [ (self.world.forced_word, targets) ]
+
+    @staticmethod
+    def choose(candidates, carried):
+        """Returns the target of the first candidate that is open to a
+        player carrying the objects in the bitset, or None."""
+        for target, key_id in candidates:
+            if key_id == NO_KEY or (carried >> key_id) & 1:
+                return target
+        return None
+
+    def enterRoom(self, room_id, carried, passed=None):
+        """Returns the room in which a player carrying the objects in the
+        bitset stops after entering room_id, or EXIT_ID.  The ids of any
+        forced rooms passed through are appended to the passed list."""
+        while room_id != EXIT_ID:
+            candidates = self.getForcedTargets(room_id)
+            if candidates is None: break
+            if passed is not None:
+                passed.append(room_id)
+            room_id = Solver.choose(candidates, carried)
+        return room_id
+
+    def getRelevantKeys(self, room_id):
+        """Returns a bitset of the objects that can change where the moves
+        out of an ordinary room lead, including through forced rooms."""
+        relevant = self.relevant_keys.get(room_id)
+        if relevant is None:
+            relevant = 0
+            pending = [ ]
+            for word_id, candidates in self.getMoves(room_id):
+                pending.extend(candidates)
+            seen = set()
+            while len(pending) != 0:
+                target, key_id = pending.pop()
+                if key_id != NO_KEY:
+                    relevant |= 1 << key_id
+                if target in seen: continue
+                seen.add(target)
+                if target != EXIT_ID:
+                    pending.extend(self.getForcedTargets(target) or ())
+            self.relevant_keys[room_id] = relevant
+        return relevant
+
+    def getOutcomes(self, room_id, carried):
+        """Returns the pair (outcomes, droppable) for a player carrying the
+        objects in the bitset, which must include only relevant keys.
+        The outcomes are (command, target, passed) triples for each move
+        out of the room, and droppable is a bitset of the carried objects
+        whose absence would change at least one of them."""
+        entry = self.outcomes.get((room_id, carried))
+        if entry is None:
+            world = self.world
+            moves = self.getMoves(room_id)
+            outcomes = [ ]
+            for word_id, candidates in moves:
+                target = Solver.choose(candidates, carried)
+                if target is None: continue
+                passed = [ ]
+                target = self.enterRoom(target, carried, passed)
+                outcomes.append((world.getWord(word_id), target,
+                                 tuple(passed)))
+            droppable = 0
+            for object_id in self.key_objects:
+                if (carried >> object_id) & 1:
+                    without = carried & ~(1 << object_id)
+                    if self.getOutcomes(room_id, without)[0] != outcomes:
+                        droppable |= 1 << object_id
+            entry = (outcomes, droppable)
+            self.outcomes[(room_id, carried)] = entry
+        return entry
+
+    def getStartPosition(self):
+        """Returns the pair (position, passed) for the start of the game,
+        where passed lists the forced rooms the player passes through."""
+        locations = self.world.getInitialLocations()
+        carried = 0
+        for object_id, location in enumerate(locations):
+            if location == PLAYER_ID:
+                carried |= 1 << object_id
+        passed = [ ]
+        room_id = self.enterRoom(0, carried, passed)
+        placed = tuple(locations[object_id] for object_id in self.key_objects)
+        return (room_id, carried, placed), passed
+
+    def expand(self, position):
+        """Generates a (command, position, passed) triple for each useful
+        command in a position.  The position is None if the command ends
+        the game, and passed lists the forced rooms passed through."""
+        world = self.world
+        room_id, carried, placed = position
+        outcomes, droppable = self.getOutcomes(
+            room_id, carried & self.getRelevantKeys(room_id))
+        for command, target, passed in outcomes:
+            if target == EXIT_ID:
+                yield command, None, passed
+            else:
+                yield command, (target, carried, placed), passed
+        for i, object_id in enumerate(self.key_objects):
+            location = placed[i]
+            if location == room_id:
+                name = world.getObject(object_id).getName()
+                moved = placed[:i] + (PLAYER_ID,) + placed[i + 1:]
+                yield ("TAKE " + name,
+                       (room_id, carried | (1 << object_id), moved), ())
+            elif (droppable >> object_id) & 1:
+                name = world.getObject(object_id).getName()
+                moved = placed[:i] + (room_id,) + placed[i + 1:]
+                yield ("DROP " + name,
+                       (room_id, carried & ~(1 << object_id), moved), ())
+
+    # Relaxed analysis
+
+    def findPossibleRooms(self, without=None):
+        """Returns a bytearray in which entry i is 1 if room i could be
+        reached by a player who can always choose which of the keys found
+        so far to carry.  Every room that is really reachable is in this
+        set, so any room outside it can never be reached.  If without is
+        the id of an object, passages that need that object are closed."""
+        world = self.world
+        possible = bytearray(world.getRoomCount())
+        objects_at = { }
+        available = set()
+        for object_id, location in enumerate(world.getInitialLocations()):
+            if location == PLAYER_ID:
+                available.add(object_id)
+            else:
+                objects_at.setdefault(location, [ ]).append(object_id)
+        waiting = { }
+        queue = [ ]
+
+        def reach(room_id):
+            if room_id != EXIT_ID and not possible[room_id]:
+                possible[room_id] = 1
+                queue.append(room_id)
+
+        reach(0)
+        while len(queue) != 0:
+            room_id = queue.pop()
+            for object_id in objects_at.get(room_id, [ ]):
+                available.add(object_id)
+                for target in waiting.pop(object_id, [ ]):
+                    reach(target)
+            for word_id, candidates in self.getExits(room_id):
+                for target, key_id in candidates:
+                    if key_id == NO_KEY or key_id in available:
+                        reach(target)
+                    elif key_id != without:
+                        waiting.setdefault(key_id, [ ]).append(target)
+        return possible
+
+    def getDistancesTo(self, goal_id):
+        """Returns a list giving the number of commands needed to reach the
+        goal from each room in the relaxed graph, in which every passage
+        is open, or NO_ROUTE if the goal cannot be reached at all."""
+        world = self.world
+        if self.reverse is None:
+            self.reverse = [ [ ] for i in range(world.getRoomCount()) ]
+            for room_id in range(world.getRoomCount()):
+                # Passing through a forced room costs no extra commands.
+                cost = 0 if self.getForcedTargets(room_id) is not None else 1
+                for word_id, candidates in self.getExits(room_id):
+                    for target, key_id in candidates:
+                        if target != EXIT_ID:
+                            self.reverse[target].append((room_id, cost))
+        distances = [ NO_ROUTE ] * world.getRoomCount()
+        distances[goal_id] = 0
+        queue = deque([ goal_id ])
+        while len(queue) != 0:
+            room_id = queue.popleft()
+            distance = distances[room_id]
+            for source, cost in self.reverse[room_id]:
+                old = distances[source]
+                if old == NO_ROUTE or distance + cost < old:
+                    distances[source] = distance + cost
+                    if cost == 0:
+                        queue.appendleft(source)
+                    else:
+                        queue.append(source)
+        return distances
+
+    def findNecessaryKeys(self, goal_id):
+        """Returns the ids of the key objects without which the goal room
+        cannot be reached even in the relaxed graph."""
+        necessary = [ ]
+        for object_id in self.key_objects:
+            possible = self.possible_without.get(object_id)
+            if possible is None:
+                possible = self.findPossibleRooms(object_id)
+                self.possible_without[object_id] = possible
+            if not possible[goal_id]:
+                necessary.append(object_id)
+        return necessary
+
+    # Searches
+
+    def classifyRooms(self, exploreStates=DEFAULT_EXPLORE_STATES):
+        """Returns a bytearray giving the status of each room, which is
+        REACHABLE, UNREACHABLE or UNDECIDED.  The positions near the start
+        are explored first, looking at no more than exploreStates of them,
+        and a search is then made for each room that remains unless an
+        earlier search has already stepped into it."""
+        count = self.world.getRoomCount()
+        status = bytearray(count)
+        possible = self.findPossibleRooms()
+        reached = self.explore(exploreStates)
+        if self.truncated:
+            start = self.getStartPosition()[0]
+            remaining = [ room_id for room_id in range(count)
+                          if possible[room_id] and not reached[room_id] ]
+            remaining.sort(
+                key=lambda room_id: -self.getEstimator(room_id)(start))
+            for room_id in remaining:
+                if reached[room_id]: continue
+                self.truncated = False
+                if self.searchFor(room_id, reached) is None and self.truncated:
+                    status[room_id] = UNDECIDED
+        for room_id in range(count):
+            if reached[room_id]:
+                status[room_id] = REACHABLE
+        return status
+
+    def explore(self, maxStates=None):
+        """Searches the positions the player can reach, breadth first, and
+        returns a bytearray in which entry i is 1 if room i was reached.
+        The search gives up after maxStates positions, which defaults to
+        the limit for the solver."""
+        if maxStates is None:
+            maxStates = self.max_states
+        reached = bytearray(self.world.getRoomCount())
+        start, passed = self.getStartPosition()
+        for room_id in passed:
+            reached[room_id] = 1
+        self.truncated = False
+        if start[0] == EXIT_ID:
+            return reached
+        reached[start[0]] = 1
+        seen = { start }
+        queue = deque([ start ])
+        while len(queue) != 0:
+            position = queue.popleft()
+            for command, next, passed in self.expand(position):
+                for room_id in passed:
+                    reached[room_id] = 1
+                if next is None or next in seen: continue
+                if len(seen) >= maxStates:
+                    self.truncated = True
+                    return reached
+                reached[next[0]] = 1
+                seen.add(next)
+                queue.append(next)
+        return reached
+
+    def findWalkthrough(self, goal_id):
+        """Returns the shortest list of commands that takes the player to
+        the room with the specified id, or None if no route was found.
+        Reaching a forced room counts as soon as the player passes
+        through it."""
+        self.truncated = False
+        if goal_id in self.walkthroughs:
+            return self.walkthroughs[goal_id]
+        commands = self.searchFor(goal_id)
+        if not self.truncated:
+            self.walkthroughs[goal_id] = commands
+        return commands
+
+    def getEstimator(self, goal_id):
+        """Returns a function that takes a position and returns a lower
+        bound on the commands needed from there to reach the goal room,
+        or NO_ROUTE if it cannot be reached at all."""
+        distances = self.getDistancesTo(goal_id)
+        # A necessary key that is not carried must be fetched from where
+        # it lies before going on to the goal, which gives a second lower
+        # bound on the commands left.
+        needed = [ (self.key_objects.index(object_id), object_id)
+                   for object_id in self.findNecessaryKeys(goal_id) ]
+        fetch = { }
+
+        def estimate(position):
+            room_id, carried, placed = position
+            best = distances[room_id]
+            if best == NO_ROUTE:
+                return NO_ROUTE
+            for i, object_id in needed:
+                if not (carried >> object_id) & 1:
+                    location = placed[i]
+                    if location not in fetch:
+                        fetch[location] = self.getDistancesTo(location)
+                    distance = fetch[location][room_id]
+                    if distance == NO_ROUTE:
+                        return NO_ROUTE
+                    best = max(best, distance + 1 + distances[location])
+            return best
+
+        return estimate
+
+    def searchFor(self, goal_id, reached=None):
+        """Runs the A* search for findWalkthrough.  If reached is a
+        bytearray, the entry for every room the search steps into is set
+        to 1."""
+        start, passed = self.getStartPosition()
+        if goal_id in passed or start[0] == goal_id:
+            return [ ]
+        if start[0] == EXIT_ID:
+            return None
+        estimate = self.getEstimator(goal_id)
+        if estimate(start) == NO_ROUTE:
+            return None
+        goal = (goal_id, None, None)
+        parents = { start: None }
+        costs = { start: 0 }
+        order = 0
+        heap = [ (estimate(start), order, 0, start) ]
+        while len(heap) != 0:
+            total, n, cost, position = heapq.heappop(heap)
+            if position is goal:
+                commands = [ ]
+                while parents[position] is not None:
+                    position, command = parents[position]
+                    commands.append(command)
+                commands.reverse()
+                return commands
+            if cost > costs[position]: continue
+            for command, next, passed in self.expand(position):
+                if reached is not None:
+                    for room_id in passed:
+                        reached[room_id] = 1
+                    if next is not None:
+                        reached[next[0]] = 1
+                if goal_id in passed or (next is not None
+                                         and next[0] == goal_id):
+                    next = goal
+                    remaining = 0
+                elif next is None:
+                    continue
+                else:
+                    remaining = estimate(next)
+                    if remaining == NO_ROUTE: continue
+                old = costs.get(next)
+                if old is not None and old <= cost + 1: continue
+                if old is None and len(costs) >= self.max_states:
+                    self.truncated = True
+                    return None
+                costs[next] = cost + 1
+                parents[next] = (position, command)
+                order += 1
+                heapq.heappush(heap, (cost + 1 + remaining, order, cost + 1,
+                                      next))
+        return None
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Report the reachable rooms, collectible objects and "
+                    "shortest walkthroughs for an Adventure world.")
+    parser.add_argument("prefix", nargs="?", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--goal", action="append", default=[ ],
+                        metavar="ROOM",
+                        help="print a shortest walkthrough to ROOM")
+    parser.add_argument("--max-states", type=int, default=DEFAULT_MAX_STATES,
+                        help="positions examined in each search "
+                             "(default %d)" % DEFAULT_MAX_STATES)
+    parser.add_argument("--explore-states", type=int,
+                        default=DEFAULT_EXPLORE_STATES,
+                        help="positions explored from the start before "
+                             "searching for each remaining room "
+                             "(default %d)" % DEFAULT_EXPLORE_STATES)
+    options = parser.parse_args(args)
+    world = AdvGame(options.prefix).world
+    solver = Solver(world, options.max_states)
+    count = world.getRoomCount()
+    print("%s: %d rooms, %d objects, %d key objects" %
+          (os.path.basename(options.prefix), count, world.getObjectCount(),
+           len(solver.getKeyObjects())))
+    start = time.perf_counter()
+    status = solver.classifyRooms(options.explore_states)
+    elapsed = time.perf_counter() - start
+    names = lambda ids: ", ".join(world.getRoomById(room_id).getName()
+                                  for room_id in ids)
+    unreachable = [ room_id for room_id in range(count)
+                    if status[room_id] == UNREACHABLE ]
+    undecided = [ room_id for room_id in range(count)
+                  if status[room_id] == UNDECIDED ]
+    print("Reachable rooms: %d of %d (classified in %.2f s)" %
+          (status.count(REACHABLE), count, elapsed))
+    if len(unreachable) != 0:
+        print("Unreachable rooms: " + names(unreachable))
+    if len(undecided) != 0:
+        print("Undecided rooms: " + names(undecided))
+    lost = [ ]
+    for object_id, location in enumerate(world.getInitialLocations()):
+        if location != PLAYER_ID and status[location] != REACHABLE:
+            lost.append(world.getObject(object_id).getName())
+    if len(lost) != 0:
+        label = "Objects that can never be collected: "
+        if len(undecided) != 0:
+            label = "Objects that may never be collected: "
+        print(label + ", ".join(lost))
+    for goal in options.goal:
+        goal_id = world.findRoomId(goal)
+        if goal_id is None:
+            print("No room named " + goal)
+            continue
+        commands = solver.findWalkthrough(goal_id)
+        if commands is None:
+            if solver.wasTruncated():
+                print("No walkthrough to %s within %d positions" %
+                      (goal, options.max_states))
+            else:
+                print("%s can never be reached" % goal)
+        else:
+            print("Walkthrough to %s (%d commands):" % (goal, len(commands)))
+            for command in commands:
+                print("  " + command)
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
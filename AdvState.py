@@ -0,0 +1,149 @@
+# File: AdvState.py
+
+"""
+This module defines the GameState class, which records the progress of
+a single player through a shared World.  Rooms and objects are referred
+to by their integer ids, which keeps each state down to a few hundred
+bytes no matter how large the descriptions in the world are.
+"""
+
+# Implementation notes
+# --------------------
+# The locations array maps each object to the room that holds it, and
+# the contents dictionary maps each location back to the objects there,
+# so that both questions take constant time.  Each entry of contents is
+# a set of object ids, which is sorted only when the objects are listed.
+# Listing them in order of id rather than in the order they arrived
+# means that the listing depends only on the locations array, so a game
+# that is saved, hibernated or replayed from a checkpoint reads exactly
+# as it did before.  The contents index is built from the locations
+# array the first time it is needed and then kept up to date by
+# moveObject, so states that are only saved, compared or restored never
+# pay for it.
+
+from array import array
+from AdvWorld import PLAYER_ID
+
+# Kinds of change recorded by a GameState that is tracking changes
+
+CHANGE_ROOM = 1
+CHANGE_VISITED = 2
+CHANGE_OBJECT = 3
+
+class GameState:
+
+    __slots__ = ("current", "visited", "locations", "contents", "changes")
+
+    def __init__(self, world):
+        """Creates the starting state for a player in world."""
+        self.current = 0
+        self.visited = bytearray((world.getRoomCount() + 7) // 8)
+        self.locations = array("i", world.getInitialLocations())
+        self.contents = None
+        self.changes = None
+
+    def trackChanges(self):
+        """Starts recording every change to this state as a tuple
+        (kind, index, value), where kind is one of the CHANGE constants."""
+        if self.changes is None:
+            self.changes = [ ]
+
+    def takeChanges(self):
+        """Returns the changes recorded since the last call and clears
+        them, or returns None if changes are not being tracked."""
+        changes = self.changes
+        if changes is not None:
+            self.changes = [ ]
+        return changes
+
+    def getCurrentRoom(self):
+        """Returns the id of the room the player is in."""
+        return self.current
+
+    def setCurrentRoom(self, room_id):
+        """Moves the player to the room with the specified id."""
+        self.current = room_id
+        if self.changes is not None:
+            self.changes.append((CHANGE_ROOM, room_id, 0))
+
+    def hasVisited(self, room_id):
+        """Returns True if the player has been in the room before."""
+        return (self.visited[room_id >> 3] >> (room_id & 7)) & 1 == 1
+
+    def setVisited(self, room_id):
+        """Records that the player has been in the room."""
+        self.visited[room_id >> 3] |= 1 << (room_id & 7)
+        if self.changes is not None:
+            self.changes.append((CHANGE_VISITED, room_id, 0))
+
+    def getLocation(self, object_id):
+        """Returns the id of the room containing the object, or PLAYER_ID
+        if the player is carrying it."""
+        return self.locations[object_id]
+
+    def moveObject(self, object_id, location):
+        """Moves the object to a room id or to PLAYER_ID."""
+        previous = self.locations[object_id]
+        self.locations[object_id] = location
+        contents = self.contents
+        if contents is not None and previous != location:
+            objects = contents[previous]
+            objects.remove(object_id)
+            if len(objects) == 0:
+                del contents[previous]
+            objects = contents.get(location)
+            if objects is None:
+                objects = set()
+                contents[location] = objects
+            objects.add(object_id)
+        if self.changes is not None:
+            self.changes.append((CHANGE_OBJECT, object_id, location))
+
+    def isCarrying(self, object_id):
+        """Returns True if the player is carrying the object."""
+        return self.locations[object_id] == PLAYER_ID
+
+    def getObjectsAt(self, location):
+        """Returns the sorted list of ids for the objects at the location."""
+        objects = self.getContents().get(location)
+        if objects is None:
+            return [ ]
+        return sorted(objects)
+
+    def countObjectsAt(self, location):
+        """Returns the number of objects at the location."""
+        objects = self.getContents().get(location)
+        return 0 if objects is None else len(objects)
+
+    def getContents(self):
+        """Returns the dictionary that maps each location holding any
+        objects to the set of their ids, building it if needed."""
+        contents = self.contents
+        if contents is None:
+            contents = { }
+            for object_id, location in enumerate(self.locations):
+                objects = contents.get(location)
+                if objects is None:
+                    objects = set()
+                    contents[location] = objects
+                objects.add(object_id)
+            self.contents = contents
+        return contents
+
+    def getInventory(self):
+        """Returns the list of ids for the objects the player carries."""
+        return self.getObjectsAt(PLAYER_ID)
+
+    def extend(self, world):
+        """Makes room in this state for the rooms and objects added to the
+        world since the state was created, which start out unvisited and
+        in their initial locations."""
+        size = (world.getRoomCount() + 7) // 8
+        if len(self.visited) < size:
+            self.visited.extend(bytes(size - len(self.visited)))
+        initial = world.getInitialLocations()
+        for object_id in range(len(self.locations), len(initial)):
+            location = initial[object_id]
+            self.locations.append(location)
+            if self.contents is not None:
+                self.contents.setdefault(location, set()).add(object_id)
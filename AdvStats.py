@@ -0,0 +1,308 @@
+# File: AdvStats.py
+
+"""
+This module measures where the time goes while games are played.  A
+GameStats object collects latency histograms for each kind of command,
+the number of passages examined to find each move, the time spent
+parsing commands and the bytes of output per turn.  Only sessions
+created as InstrumentedSession objects are measured, so ordinary
+sessions pay nothing for it.  GameStats can also run cProfile over the
+next few commands.  Run as a program, it prints a file of statistics
+dumped by a running game or server.
+"""
+
+# Implementation notes
+# --------------------
+# Every measurement goes into a Histogram whose buckets are powers of
+# two: bucket 0 counts zeros and bucket i counts values from 2^(i-1) to
+# 2^i - 1.  Adding a value costs a call to bit_length and an increment,
+# the histogram stays the same size no matter how many values it holds,
+# and its percentiles are accurate to within a factor of two, which is
+# enough to see where the time goes.  Times are kept in microseconds.
+#
+# Commands are grouped by the verb that selects their handler, and every
+# other command is counted as MOVE.  The scan length of a move is the
+# number of passages with its verb that getNextRoomId examines before
+# finding an open one, which grows with the number of keyed passages
+# that share a verb.
+#
+# The statistics are dumped by whichever session finishes a turn after
+# the dump interval has passed, so no extra thread is needed.  The dump
+# is a JSON file that is replaced atomically, so it can be read at any
+# time.
+
+import argparse
+from array import array
+from bisect import bisect_left
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from AdvSave import writeFile
+from AdvSession import Session
+from AdvWorld import NO_KEY
+
+# Constants
+
+HISTOGRAM_BUCKETS = 40
+DEFAULT_DUMP_INTERVAL = 60.0
+DEFAULT_PROFILE_COMMANDS = 1000
+MOVE_VERB = "MOVE"
+START_VERB = "START"
+ENCODING = "utf-8"
+
+class Histogram:
+
+    """This class counts values in buckets whose bounds are powers of two."""
+
+    __slots__ = ("counts", "total", "maximum")
+
+    def __init__(self):
+        self.counts = array("q", bytes(8 * HISTOGRAM_BUCKETS))
+        self.total = 0
+        self.maximum = 0
+
+    def add(self, value):
+        """Adds a value, which is rounded down to an integer."""
+        value = int(value)
+        self.counts[min(value.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def getCount(self):
+        """Returns the number of values added."""
+        return sum(self.counts)
+
+    def getPercentile(self, fraction):
+        """Returns the upper bound of the bucket holding the value below
+        which the specified fraction of the values fall."""
+        count = self.getCount()
+        running = 0
+        for i, n in enumerate(self.counts):
+            running += n
+            if running > 0 and running >= fraction * count:
+                return min((1 << i) - 1, self.maximum)
+        return 0
+
+    def getSummary(self):
+        """Returns a dictionary with the count, mean, median, 90th and
+        99th percentiles and maximum of the values."""
+        count = self.getCount()
+        return {
+            "count": count,
+            "mean": self.total / count if count != 0 else 0.0,
+            "p50": self.getPercentile(0.5),
+            "p90": self.getPercentile(0.9),
+            "p99": self.getPercentile(0.99),
+            "max": self.maximum
+        }
+
+class GameStats:
+
+    def __init__(self, dumpFile=None, dumpInterval=DEFAULT_DUMP_INTERVAL):
+        """Creates an empty set of statistics.  If dumpFile is given, the
+        statistics are written to that file every dumpInterval seconds."""
+        self.dump_file = dumpFile
+        self.dump_interval = dumpInterval
+        self.next_dump = time.monotonic() + dumpInterval
+        self.profiler = None
+        self.profile_left = 0
+        self.profile_file = None
+        self.profile = None
+        self.reset()
+
+    def reset(self):
+        """Clears every counter."""
+        self.started = time.time()
+        self.turns = 0
+        self.latency = { }
+        self.scan = Histogram()
+        self.parsing = Histogram()
+        self.output = Histogram()
+
+    def recordTurn(self, verb, seconds, size):
+        """Records a turn of the specified kind that took seconds and
+        produced size bytes of output."""
+        histogram = self.latency.get(verb)
+        if histogram is None:
+            histogram = Histogram()
+            self.latency[verb] = histogram
+        histogram.add(seconds * 1e6)
+        self.output.add(size)
+        self.turns += 1
+        if self.profiler is not None:
+            self.profile_left -= 1
+            if self.profile_left <= 0:
+                self.finishProfile()
+        if self.dump_file is not None and time.monotonic() >= self.next_dump:
+            self.dump()
+
+    def recordParsing(self, seconds):
+        """Records the time taken to tokenize a command."""
+        self.parsing.add(seconds * 1e6)
+
+    def recordScan(self, length):
+        """Records the number of passages examined to find a move."""
+        self.scan.add(length)
+
+    def getSnapshot(self):
+        """Returns a dictionary holding a summary of every counter, which
+        can be written as JSON."""
+        return {
+            "started": self.started,
+            "time": time.time(),
+            "turns": self.turns,
+            "latency_us": { verb: histogram.getSummary() for verb, histogram
+                            in sorted(self.latency.items()) },
+            "parsing_us": self.parsing.getSummary(),
+            "scan_length": self.scan.getSummary(),
+            "output_bytes": self.output.getSummary()
+        }
+
+    def dump(self, filename=None):
+        """Writes the snapshot to a file, which is the dump file if no
+        filename is given."""
+        if filename is None:
+            filename = self.dump_file
+        self.next_dump = time.monotonic() + self.dump_interval
+        data = json.dumps(self.getSnapshot(), indent=2) + "\n"
+        writeFile(filename, data.encode(ENCODING))
+
+    def profileNext(self, count=DEFAULT_PROFILE_COMMANDS, filename=None):
+        """Runs cProfile over the next count commands.  When they are
+        done, the profile is available from getProfileReport and, if
+        filename is given, is also written there for use with pstats."""
+        self.profiler = cProfile.Profile()
+        self.profile_left = count
+        self.profile_file = filename
+
+    def isProfiling(self):
+        """Returns True if commands are currently being profiled."""
+        return self.profiler is not None
+
+    def finishProfile(self):
+        """Stops profiling and keeps the profile collected so far."""
+        profiler = self.profiler
+        self.profiler = None
+        self.profile = profiler
+        if self.profile_file is not None:
+            profiler.dump_stats(self.profile_file)
+
+    def getProfileReport(self, limit=20):
+        """Returns the functions with the most cumulative time in the last
+        completed profile as text, or None if there is no profile."""
+        if self.profile is None:
+            return None
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+class InstrumentedSession(Session):
+
+    """This class is a Session that records its commands in a GameStats."""
+
+    def __init__(self, world, stats, state=None, journal=None, savePath=None):
+        """Starts a session whose commands are recorded in stats.  The
+        other arguments are the same as for Session."""
+        Session.__init__(self, world, state, journal, savePath)
+        self.stats = stats
+        self.verb = None
+
+    def start(self):
+        """Describes the starting room and records it as a turn."""
+        return self.measure(Session.start, START_VERB)
+
+    def step(self, command):
+        """Executes one command and records it as a turn."""
+        if self.finished:
+            return ""
+        return self.measure(Session.step, None, command)
+
+    def measure(self, method, verb, *args):
+        """Calls method, profiling it if needed, and records the turn.
+        The verb is set by parseCommand if it is not given."""
+        stats = self.stats
+        profiler = stats.profiler
+        self.verb = verb
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        output = method(self, *args)
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        stats.recordTurn(self.verb or MOVE_VERB, elapsed,
+                         len(output.encode(ENCODING)))
+        return output
+
+    def parseCommand(self, cmd):
+        """Tokenizes the command, recording the time it took and the
+        verb that selects its handler."""
+        start = time.perf_counter()
+        cmd, tokens = Session.parseCommand(self, cmd)
+        self.stats.recordParsing(time.perf_counter() - start)
+        if len(tokens) != 0 and tokens[0] in self.verbs:
+            self.verb = tokens[0]
+        return cmd, tokens
+
+    def doMove(self, cmd):
+        """Moves the player, recording how many passages were examined."""
+        world = self.world
+        state = self.state
+        self.stats.recordScan(countScan(world, state.getCurrentRoom(),
+                                        world.lookupWord(cmd), state))
+        Session.doMove(self, cmd)
+
+def countScan(world, room_id, word_id, state):
+    """Returns the number of passages with the verb id that getNextRoomId
+    examines in the room before it finds an open one."""
+    verbs, targets, keys, start, end = world.getPassageRange(room_id)
+    i = bisect_left(verbs, word_id, start, end)
+    count = 0
+    while i < end and verbs[i] == word_id:
+        count += 1
+        key_id = keys[i]
+        if key_id == NO_KEY or (key_id < world.getObjectCount()
+                                and state.isCarrying(key_id)):
+            break
+        i += 1
+    return count
+
+def formatReport(snapshot):
+    """Returns a snapshot from GameStats.getSnapshot as readable text."""
+    lines = [ "%d turns since %s" %
+              (snapshot["turns"], time.strftime("%Y-%m-%d %H:%M:%S",
+                                                time.localtime(snapshot["started"]))) ]
+    lines.append("%-16s %9s %9s %9s %9s %9s %9s" %
+                 ("", "count", "mean", "p50", "p90", "p99", "max"))
+    rows = [ (verb + " (us)", summary) for verb, summary
+             in snapshot["latency_us"].items() ]
+    rows.append(("parsing (us)", snapshot["parsing_us"]))
+    rows.append(("scan length", snapshot["scan_length"]))
+    rows.append(("output bytes", snapshot["output_bytes"]))
+    for label, summary in rows:
+        lines.append("%-16s %9d %9.1f %9d %9d %9d %9d" %
+                     (label, summary["count"], summary["mean"], summary["p50"],
+                      summary["p90"], summary["p99"], summary["max"]))
+    return "\n".join(lines) + "\n"
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Print statistics dumped by an instrumented game.")
+    parser.add_argument("filename", help="statistics file to read")
+    options = parser.parse_args(args)
+    with open(options.filename, encoding=ENCODING) as f:
+        snapshot = json.load(f)
+    print(formatReport(snapshot), end="")
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
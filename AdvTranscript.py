@@ -0,0 +1,298 @@
+# File: AdvTranscript.py
+
+"""
+This module records games as compact binary transcripts and replays
+them.  A transcript holds every command together with a hash of the
+game state after it, and a full checkpoint of the state every so many
+turns.  Run as a program, it shows the game at any turn of a transcript
+by replaying from the nearest checkpoint, and it finds the first turn
+at which replaying the commands no longer produces the recorded state.
+"""
+
+# Transcript format
+# -----------------
+# A transcript starts with the magic bytes ADVT, a version number, the
+# checkpoint interval and the data file prefix of the world.  It is then
+# a sequence of records, each of which starts with a tag byte:
+#
+#   C  a command: its length, its UTF-8 text and the 8-byte hash of the
+#      state after the command was executed
+#   K  a checkpoint: the turn number, the length of the snapshot and the
+#      snapshot itself, as written by AdvSave.encodeState, followed by a
+#      byte holding the flags of the session
+#
+# Turn 0 is the state after the opening description, and turn n is the
+# state after the nth command.  The hash covers both the snapshot and the
+# flags, so any difference in how a command is carried out shows up at
+# the turn where it happens.
+#
+# A command that replaces the game state, as a successful RESTORE does,
+# depends on a save file that the transcript does not hold.  The recorder
+# therefore writes a checkpoint right after such a command, with the
+# RESTORED_FLAG bit set in its flags byte.  A replay runs in a
+# ReplaySession, whose RESTORE reads the state from that checkpoint
+# instead of a file and whose SAVE writes nothing, so the replayed game
+# produces the same output and the same states as the recorded one.
+
+import argparse
+import hashlib
+import struct
+import sys
+from AdvSave import encodeState, decodeState
+from AdvSession import Session
+
+# Constants
+
+TRANSCRIPT_MAGIC = b"ADVT"
+TRANSCRIPT_VERSION = 1
+DEFAULT_CHECKPOINT_INTERVAL = 100
+HASH_SIZE = 8
+COMMAND_TAG = b"C"
+CHECKPOINT_TAG = b"K"
+
+TRANSCRIPT_HEADER = struct.Struct("<4sBIH")
+COMMAND_HEADER = struct.Struct("<cH")
+CHECKPOINT_HEADER = struct.Struct("<cII")
+
+FINISHED_FLAG = 1
+AFTER_HELP_FLAG = 2
+RESTORED_FLAG = 4
+
+def getFlags(session):
+    """Returns the flags byte for a session."""
+    flags = 0
+    if session.finished:
+        flags |= FINISHED_FLAG
+    if session.after_help:
+        flags |= AFTER_HELP_FLAG
+    return flags
+
+def hashSession(session):
+    """Returns the hash of the state of a session as bytes."""
+    data = encodeState(session.getState()) + bytes([ getFlags(session) ])
+    return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+
+def restoreSession(world, transcript, turn):
+    """Returns a ReplaySession restored from the checkpoint for the
+    specified turn of a transcript."""
+    snapshot, flags = transcript.checkpoints[turn]
+    session = ReplaySession(world, transcript, turn,
+                            decodeState(world, snapshot)[0])
+    session.finished = (flags & FINISHED_FLAG) != 0
+    session.after_help = (flags & AFTER_HELP_FLAG) != 0
+    return session
+
+class ReplaySession(Session):
+
+    """This class replays the commands of a transcript.  SAVE writes
+    nothing, and RESTORE returns to the state that the transcript
+    recorded after it rather than reading a save file."""
+
+    def __init__(self, world, transcript, turn=0, state=None):
+        """Starts a replay of transcript in the specified World, in which
+        the next command is the one after the specified turn."""
+        Session.__init__(self, world, state)
+        self.transcript = transcript
+        self.turn = turn
+
+    def step(self, command):
+        """Executes the command for the next turn."""
+        self.turn += 1
+        return Session.step(self, command)
+
+    def canSave(self):
+        """Returns True, since SAVE and RESTORE were available when the
+        game was recorded."""
+        return True
+
+    def writeSave(self, state):
+        """Does nothing, since a replay must not change any save file."""
+        pass
+
+    def readSave(self):
+        """Returns the state restored on this turn of the recorded game,
+        or None if the transcript records none."""
+        checkpoint = self.transcript.checkpoints.get(self.turn)
+        if checkpoint is None or not checkpoint[1] & RESTORED_FLAG:
+            return None
+        return decodeState(self.world, checkpoint[0])[0]
+
+class TranscriptRecorder:
+
+    def __init__(self, filename, session, prefix,
+                 interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """Creates a recorder that writes the transcript of session to the
+        file with the specified name.  The prefix is stored so that the
+        replay tool can load the same world."""
+        self.session = session
+        self.interval = interval
+        self.turn = 0
+        self.file = open(filename, "wb")
+        encoded = prefix.encode("utf-8")
+        self.file.write(TRANSCRIPT_HEADER.pack(TRANSCRIPT_MAGIC,
+                                               TRANSCRIPT_VERSION, interval,
+                                               len(encoded)))
+        self.file.write(encoded)
+
+    def start(self):
+        """Starts the session and records the checkpoint for turn 0."""
+        output = self.session.start()
+        self.writeCheckpoint()
+        self.file.flush()
+        return output
+
+    def step(self, command):
+        """Executes a command in the session, records it and returns its
+        output."""
+        state = self.session.getState()
+        output = self.session.step(command)
+        self.turn += 1
+        encoded = command.encode("utf-8")
+        self.file.write(COMMAND_HEADER.pack(COMMAND_TAG, len(encoded)))
+        self.file.write(encoded)
+        self.file.write(hashSession(self.session))
+        restored = self.session.getState() is not state
+        if restored or self.turn % self.interval == 0:
+            self.writeCheckpoint(restored)
+        self.file.flush()
+        return output
+
+    def writeCheckpoint(self, restored=False):
+        """Writes a checkpoint of the session for the current turn, which
+        is marked if the command for the turn restored a saved game."""
+        snapshot = encodeState(self.session.getState())
+        flags = getFlags(self.session)
+        if restored:
+            flags |= RESTORED_FLAG
+        self.file.write(CHECKPOINT_HEADER.pack(CHECKPOINT_TAG, self.turn,
+                                               len(snapshot)))
+        self.file.write(snapshot)
+        self.file.write(bytes([ flags ]))
+
+    def close(self):
+        """Closes the transcript file."""
+        self.file.close()
+
+class Transcript:
+
+    def __init__(self, filename):
+        """Reads the transcript in the file with the specified name.  A
+        record cut short at the end of the file is ignored."""
+        with open(filename, "rb") as f:
+            data = f.read()
+        if len(data) < TRANSCRIPT_HEADER.size:
+            raise ValueError("Not a transcript")
+        magic, version, interval, length = TRANSCRIPT_HEADER.unpack_from(data)
+        if magic != TRANSCRIPT_MAGIC or version != TRANSCRIPT_VERSION:
+            raise ValueError("Not a transcript")
+        pos = TRANSCRIPT_HEADER.size
+        self.prefix = data[pos:pos + length].decode("utf-8")
+        self.interval = interval
+        self.commands = [ ]
+        self.hashes = [ ]
+        self.checkpoints = { }
+        pos += length
+        while pos < len(data):
+            tag = data[pos:pos + 1]
+            if tag == COMMAND_TAG:
+                if pos + COMMAND_HEADER.size > len(data): break
+                length = COMMAND_HEADER.unpack_from(data, pos)[1]
+                start = pos + COMMAND_HEADER.size
+                end = start + length + HASH_SIZE
+                if end > len(data): break
+                self.commands.append(data[start:start + length].decode("utf-8"))
+                self.hashes.append(data[start + length:end])
+            elif tag == CHECKPOINT_TAG:
+                if pos + CHECKPOINT_HEADER.size > len(data): break
+                tag, turn, length = CHECKPOINT_HEADER.unpack_from(data, pos)
+                start = pos + CHECKPOINT_HEADER.size
+                end = start + length + 1
+                if end > len(data): break
+                self.checkpoints[turn] = (data[start:start + length],
+                                          data[end - 1])
+            else:
+                raise ValueError("Transcript is damaged")
+            pos = end
+
+    def getTurnCount(self):
+        """Returns the number of commands in the transcript."""
+        return len(self.commands)
+
+    def replayTo(self, world, turn):
+        """Returns the pair (session, output) for the game just after the
+        specified turn, where output is the text that turn produced.  The
+        game is restored from the nearest checkpoint before the turn, and
+        only the commands after it are replayed."""
+        if turn < 0 or turn > len(self.commands):
+            raise ValueError("No turn %d in this transcript" % turn)
+        if turn == 0:
+            session = ReplaySession(world, self)
+            return session, session.start()
+        start = max(t for t in self.checkpoints if t < turn)
+        session = restoreSession(world, self, start)
+        output = ""
+        for command in self.commands[start:turn]:
+            output = session.step(command)
+        return session, output
+
+    def findDivergence(self, world, fromCheckpoints=False):
+        """Replays the commands and returns the first turn whose state
+        hash differs from the recorded one, or None if they all match.
+        Normally the whole game is replayed from the start; if
+        fromCheckpoints is True, each stretch between checkpoints is
+        replayed from its own checkpoint instead, which finds the first
+        stretch that a change affects without carrying earlier
+        differences forward."""
+        session = ReplaySession(world, self)
+        session.start()
+        for turn, command in enumerate(self.commands, 1):
+            if fromCheckpoints and turn - 1 in self.checkpoints:
+                session = restoreSession(world, self, turn - 1)
+            session.step(command)
+            if hashSession(session) != self.hashes[turn - 1]:
+                return turn
+        return None
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Inspect and verify recorded Adventure transcripts.")
+    parser.add_argument("transcript", help="transcript file to read")
+    parser.add_argument("--prefix",
+                        help="data file prefix (default from the transcript)")
+    parser.add_argument("--turn", type=int,
+                        help="show the game just after this turn")
+    parser.add_argument("--verify", action="store_true",
+                        help="report the first turn that replays differently")
+    parser.add_argument("--from-checkpoints", action="store_true",
+                        help="verify each stretch from its own checkpoint")
+    options = parser.parse_args(args)
+    from AdvGame import AdvGame
+    transcript = Transcript(options.transcript)
+    prefix = options.prefix or transcript.prefix
+    world = AdvGame(prefix).world
+    print("%s: %d turns of %s, checkpoints every %d turns" %
+          (options.transcript, transcript.getTurnCount(), prefix,
+           transcript.interval))
+    if options.turn is not None:
+        session, output = transcript.replayTo(world, options.turn)
+        if options.turn > 0:
+            print("Command: " + transcript.commands[options.turn - 1])
+        print(output, end="")
+        if not session.isFinished():
+            print("Now in " + session.getCurrentRoom())
+    if options.verify or options.from_checkpoints:
+        turn = transcript.findDivergence(world, options.from_checkpoints)
+        if turn is None:
+            print("Replay matches every recorded turn")
+        else:
+            print("Replay diverges at turn %d: %s" %
+                  (turn, transcript.commands[turn - 1]))
+            return 1
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,739 @@
+# File: AdvWorld.py
+
+"""
+This module defines the World class, which holds the rooms, objects
+and synonyms for a game.  A single instance is shared by any number of
+players, each of whom keeps their own progress in a GameState.  A World
+changes only through applyUpdate, which AdvReload uses to bring in edits
+to the data files while games are running.
+"""
+
+# Vocabulary
+# ----------
+# Every word the game knows about -- the built-in verbs, the verbs that
+# label passages, the names of objects and both sides of each synonym --
+# is interned into a single vocabulary when the World is created.  Each
+# word has an integer id, and a synonym shares the id of the word it
+# stands for, so resolving a token to its canonical meaning is a single
+# dictionary lookup.  Passages are indexed by the id of their verb and
+# refer to rooms and keys by id, which means that moving the player never
+# compares strings.
+#
+# The passages of all the rooms are stored in three parallel arrays that
+# hold the verb id, destination room id and key object id of each passage.
+# The passages of room i occupy the slice from passage_starts[i] up to
+# passage_starts[i + 1], sorted by verb id but otherwise in the order they
+# appear in the rooms file.  Finding the passages for a verb is therefore
+# a binary search within the room's slice, which stays fast even for rooms
+# with hundreds of exits and costs only 12 bytes per passage.
+#
+# Forced rooms
+# ------------
+# A room whose short description is "-" is a forced room: entering it
+# prints its long description and immediately moves the player on through
+# its FORCED passage.  Chains of forced rooms are resolved when the World
+# is loaded into jumps of the form (text, next_id), where text is the
+# output of the whole chain and next_id is the first room at which the
+# player stops.  A forced room whose FORCED passages depend on keys cannot
+# be resolved in advance, so its jump has a next_id of None and the key is
+# checked when the player arrives.  Cycles of forced rooms, forced rooms
+# without an unkeyed FORCED passage and passages to rooms that do not
+# exist are all reported as errors when the World is created.
+#
+# Updates
+# -------
+# Rooms and objects keep their ids for as long as the World exists, since
+# every GameState refers to them by id.  An update therefore replaces
+# changed rooms and objects in place and gives new ones the next free
+# ids.  A deleted room keeps its id and its definition but loses its
+# name, so it can no longer be reached.  A room cannot be deleted while
+# a live game has its player or an object in it, and a snapshot saved
+# in a deleted room is refused when it is read, so no game is ever left
+# there.  Deleting objects is not supported, because players may be
+# carrying them.
+#
+# The passages of changed rooms are kept in passage_patches, which maps a
+# room id to its own (verbs, targets, keys) arrays and takes precedence
+# over the shared arrays, so an update costs time in proportion to the
+# rooms it changes.  A passage whose key names no object is compiled with
+# the key UNKNOWN_KEY, which can never be carried, and the rooms that use
+# each unknown name are remembered so that they can be compiled again if
+# an object with that name is added.  If any part of an update fails, the
+# rooms, objects and synonyms it touched are put back as they were.
+#
+# Checking that nothing refers to a deleted room must not take time in
+# proportion to the size of the world either.  The objects are indexed
+# by starting room in initial_contents, the passages in patches by
+# target in patch_sources, and the positions in the shared arrays are
+# sorted by target in target_order, with the targets themselves in
+# sorted_targets, so the rooms that lead to a room are found by binary
+# search, as a LazyWorld finds rooms by name.  The sorted arrays take
+# about as long to build as the passage arrays themselves, so they are
+# built when they are first needed, or ahead of time by WorldReloader.
+
+from array import array
+from bisect import bisect_left, bisect_right
+import sys
+
+START_ROOM = "START"
+EXIT_ROOM = "EXIT"
+PLAYER = "PLAYER"
+PLAYER_ID = -1
+EXIT_ID = -2
+NO_KEY = -1
+UNKNOWN_WORD = -1
+NO_OBJECT = -1
+UNKNOWN_KEY = 0x7fffffff
+FORCED = "FORCED"
+FORCED_MARKER = "-"
+
+class World:
+
+    def __init__(self, rooms, objects, synonyms, verbs=()):
+        """Creates a World from the rooms, objects and synonyms dictionaries
+        read by AdvGame.readWorld.  Rooms and objects are numbered in the
+        order they appear in the data files, and verbs lists the built-in
+        verbs to add to the vocabulary."""
+        self.rooms = rooms
+        self.objects = objects
+        self.synonyms = synonyms
+
+        self.indexRooms()
+
+        self.vocabulary = { }
+        self.words = [ ]
+        self.word_ids = { }
+        for verb in verbs:
+            self.internWord(verb)
+
+        self.object_list = [ ]
+        self.object_ids = { }
+        self.initial_locations = [ ]
+        self.initial_contents = { }
+        self.presence_texts = [ ]
+        if objects is not None:
+            for name, object in objects.items():
+                location = object.getInitialLocation()
+                if location == PLAYER:
+                    room_id = PLAYER_ID
+                else:
+                    room_id = self.findRoomId(location)
+                    if room_id is None:
+                        raise ValueError("Unknown room " + location
+                                         + " for object " + name)
+                self.object_ids[name] = len(self.object_list)
+                self.object_list.append(object)
+                self.initial_locations.append(room_id)
+                self.initial_contents.setdefault(room_id, set()).add(
+                    len(self.object_list) - 1)
+                self.presence_texts.append("There is " + object.getDescription()
+                                           + " here.\n")
+                self.internWord(name)
+
+        self.short_texts = { }
+        self.generation = 0
+        self.unknown_keys = { }
+        self.passage_patches = { }
+        self.patch_sources = { }
+        self.deleted_rooms = { }
+        self.forced_word = self.internWord(FORCED)
+        self.indexPassages()
+        self.forced_jumps = { }
+        self.resolving = set()
+        self.indexForcedRooms()
+
+        if synonyms is not None:
+            for key, value in synonyms.items():
+                self.vocabulary[sys.intern(key)] = self.internWord(value)
+
+        self.word_objects = [ NO_OBJECT ] * len(self.words)
+        for name, object_id in self.object_ids.items():
+            self.word_objects[self.vocabulary[name]] = object_id
+
+    def indexRooms(self):
+        """Numbers the rooms in the order they appear in the rooms file."""
+        self.room_list = [ ]
+        self.room_ids = { }
+        for name, room in self.rooms.items():
+            if name != START_ROOM:
+                self.room_ids[name] = len(self.room_list)
+                self.room_list.append(room)
+        if len(self.room_list) != 0:
+            self.room_ids[START_ROOM] = 0
+
+    def indexPassages(self):
+        """Builds the passage arrays for every room."""
+        self.target_order = None
+        self.sorted_targets = None
+        self.passage_starts = array("i", [ 0 ])
+        self.passage_verbs = array("i")
+        self.passage_targets = array("i")
+        self.passage_keys = array("i")
+        for room_id, room in enumerate(self.room_list):
+            verbs, targets, keys = self.compilePassages(room, room_id)
+            self.passage_verbs.extend(verbs)
+            self.passage_targets.extend(targets)
+            self.passage_keys.extend(keys)
+            self.passage_starts.append(len(self.passage_verbs))
+
+    def indexPassageSources(self):
+        """Sorts the positions in the shared passage arrays by target, so
+        that getPassageSources can find the passages to a room by binary
+        search.  This is done when a room is first deleted, unless it has
+        been done ahead of time."""
+        targets = self.passage_targets
+        self.target_order = array("i", sorted(range(len(targets)),
+                                              key=targets.__getitem__))
+        self.sorted_targets = array("i", sorted(targets))
+
+    def getPassageSources(self, room_id):
+        """Returns the set of ids of the rooms with a passage to the room
+        with the specified id."""
+        if self.target_order is None:
+            self.indexPassageSources()
+        sources = set(self.patch_sources.get(room_id, ()))
+        first = bisect_left(self.sorted_targets, room_id)
+        last = bisect_right(self.sorted_targets, room_id, first)
+        for i in self.target_order[first:last]:
+            source = bisect_right(self.passage_starts, i) - 1
+            # A patched room no longer uses the shared arrays.
+            if source not in self.passage_patches:
+                sources.add(source)
+        return sources
+
+    def setPatch(self, room_id, patch):
+        """Makes patch the (verbs, targets, keys) arrays of a room, or
+        removes the room's patch if patch is None, keeping patch_sources
+        in step."""
+        old = self.passage_patches.pop(room_id, None)
+        if old is not None:
+            for target in set(old[1]):
+                sources = self.patch_sources[target]
+                sources.discard(room_id)
+                if len(sources) == 0:
+                    del self.patch_sources[target]
+        if patch is not None:
+            self.passage_patches[room_id] = patch
+            for target in set(patch[1]):
+                self.patch_sources.setdefault(target, set()).add(room_id)
+
+    def compilePassages(self, room, room_id=None):
+        """Returns the (verbs, targets, keys) arrays for the passages of
+        a room, sorted by verb id and otherwise in their original order.
+        If room_id is given, any keys that name no object are recorded in
+        unknown_keys."""
+        entries = [ ]
+        for response, next, key in room.getPassages():
+            if next == EXIT_ROOM:
+                next_id = EXIT_ID
+            else:
+                next_id = self.findRoomId(next)
+                if next_id is None:
+                    raise ValueError("Unknown room " + next + " in passage "
+                                     + response + " from " + room.getName())
+            key_id = NO_KEY
+            if key is not None:
+                # A key that names no object can never be carried.
+                key_id = self.object_ids.get(key, UNKNOWN_KEY)
+                if key_id == UNKNOWN_KEY and room_id is not None:
+                    self.unknown_keys.setdefault(key, set()).add(room_id)
+            entries.append((self.internWord(response), next_id, key_id))
+        entries.sort(key=lambda entry: entry[0])
+        return (array("i", [ entry[0] for entry in entries ]),
+                array("i", [ entry[1] for entry in entries ]),
+                array("i", [ entry[2] for entry in entries ]))
+
+    def getPassageRange(self, room_id):
+        """Returns the tuple (verbs, targets, keys, start, end), where the
+        passages of the room occupy positions start to end - 1 of the
+        three parallel arrays."""
+        patch = self.passage_patches.get(room_id)
+        if patch is not None:
+            return patch[0], patch[1], patch[2], 0, len(patch[0])
+        return (self.passage_verbs, self.passage_targets, self.passage_keys,
+                self.passage_starts[room_id], self.passage_starts[room_id + 1])
+
+    def indexForcedRooms(self):
+        """Resolves every forced room and checks that no combination of
+        keys can make the forced rooms loop forever."""
+        self.conditional_rooms = set()
+        for room_id in range(self.getRoomCount()):
+            jump = self.getForcedJump(room_id)
+            if jump is not None and jump[1] is None:
+                self.conditional_rooms.add(room_id)
+        self.checkForcedCycles()
+
+    def checkForcedCycles(self):
+        """Checks that no cycle of forced rooms passes through a room that
+        checks a key."""
+        ACTIVE, DONE = 1, 2
+        marks = { }
+        for origin in sorted(self.conditional_rooms):
+            if origin in marks: continue
+            marks[origin] = ACTIVE
+            stack = [ (origin, iter(self.getForcedSuccessors(origin))) ]
+            while len(stack) != 0:
+                room_id, successors = stack[-1]
+                next_id = next(successors, None)
+                if next_id is None:
+                    marks[room_id] = DONE
+                    stack.pop()
+                elif marks.get(next_id) == ACTIVE:
+                    raise ValueError("Forced rooms form a cycle through "
+                                     + self.getRoomById(next_id).getName())
+                elif next_id not in marks:
+                    marks[next_id] = ACTIVE
+                    stack.append((next_id,
+                                  iter(self.getForcedSuccessors(next_id))))
+
+    def getForcedSuccessors(self, room_id):
+        """Returns the ids of the key-checking forced rooms at which the
+        player can next stop after a key-checking forced room."""
+        successors = [ ]
+        for next_id, key_id in self.getForcedTargets(room_id):
+            if next_id == EXIT_ID: continue
+            jump = self.getForcedJump(next_id)
+            if jump is not None and jump[1] is not None:
+                # A resolved jump always ends outside the forced rooms or
+                # at a key-checking one.
+                next_id = jump[1]
+                if next_id == EXIT_ID: continue
+                jump = self.getForcedJump(next_id)
+            if jump is not None and jump[1] is None:
+                successors.append(next_id)
+        return successors
+
+    def getForcedTargets(self, room_id):
+        """Returns the list of (next_id, key_id) pairs for the FORCED
+        passages of a forced room that the player might take, which ends
+        with the first one that does not need a key."""
+        verbs, targets, keys, start, end = self.getPassageRange(room_id)
+        first = bisect_left(verbs, self.forced_word, start, end)
+        i = first
+        result = [ ]
+        while i < end and verbs[i] == self.forced_word:
+            key_id = keys[i]
+            if key_id == NO_KEY:
+                result.append((targets[i], key_id))
+                return result
+            if key_id < len(self.object_list):
+                result.append((targets[i], key_id))
+            i += 1
+        name = self.getRoomById(room_id).getName()
+        if i == first:
+            raise ValueError("Forced room " + name + " has no FORCED passage")
+        raise ValueError("Forced room " + name
+                         + " has no FORCED passage without a key")
+
+    def getForcedJump(self, room_id):
+        """Returns None if the room is not a forced room, and otherwise the
+        pair (text, next_id) described in the notes on forced rooms."""
+        jump = self.forced_jumps.get(room_id)
+        if jump is None:
+            room = self.getRoomById(room_id)
+            if room.getShortDescription() == FORCED_MARKER:
+                jump = self.buildForcedJump(room_id, room)
+                self.forced_jumps[room_id] = jump
+        return jump
+
+    def buildForcedJump(self, room_id, room):
+        """Computes the jump for a forced room by following its chain."""
+        text = room.getLongText()
+        targets = self.getForcedTargets(room_id)
+        if len(targets) > 1:
+            return (text, None)
+        next_id = targets[0][0]
+        if next_id == EXIT_ID:
+            return (text, next_id)
+        if next_id == room_id or next_id in self.resolving:
+            raise ValueError("Forced rooms form a cycle through "
+                             + self.getRoomById(next_id).getName())
+        self.resolving.add(room_id)
+        try:
+            jump = self.getForcedJump(next_id)
+        finally:
+            self.resolving.discard(room_id)
+        if jump is not None and jump[1] is not None:
+            return (text + jump[0], jump[1])
+        return (text, next_id)
+
+    def followForcedRooms(self, room_id, state=None):
+        """Returns None if the room is not a forced room.  Otherwise,
+        returns the pair (text, next_id), where text is everything printed
+        while passing through the forced rooms and next_id is the room in
+        which the player stops, or EXIT_ID if the game is over."""
+        jump = self.getForcedJump(room_id)
+        if jump is None:
+            return None
+        text, next_id = jump
+        # A resolved jump that stops at a key-checking forced room must
+        # carry on from there.
+        if next_id is not None and (next_id == EXIT_ID
+                                    or self.getForcedJump(next_id) is None):
+            return jump
+        parts = [ ]
+        seen = set()
+        while jump is not None:
+            text, next_id = jump
+            parts.append(text)
+            if next_id is None:
+                if room_id in seen:
+                    raise ValueError("Forced rooms form a cycle through "
+                                     + self.getRoomById(room_id).getName())
+                seen.add(room_id)
+                next_id = self.getNextRoomId(room_id, self.forced_word, state)
+            if next_id == EXIT_ID: break
+            room_id = next_id
+            jump = self.getForcedJump(room_id)
+        return "".join(parts), next_id
+
+    def findRoomId(self, name):
+        """Returns the id of the room with the specified name, or None
+        if there is no such room."""
+        return self.room_ids.get(name)
+
+    def internWord(self, word):
+        """Adds a canonical word to the vocabulary if it is not already
+        there and returns its id."""
+        word_id = self.vocabulary.get(word)
+        if word_id is None:
+            word = sys.intern(word)
+            word_id = len(self.words)
+            self.vocabulary[word] = word_id
+            self.word_ids[word] = word_id
+            self.words.append(word)
+        return word_id
+
+    def lookupWord(self, token):
+        """Returns the id of the canonical word for token, following any
+        synonym, or UNKNOWN_WORD if the token is not in the vocabulary."""
+        return self.vocabulary.get(token, UNKNOWN_WORD)
+
+    def getWord(self, word_id):
+        """Returns the canonical spelling of the word with the given id."""
+        return self.words[word_id]
+
+    def canonicalize(self, tokens):
+        """Replaces each token that has a synonym with its canonical word,
+        leaving unknown tokens unchanged."""
+        vocabulary = self.vocabulary
+        words = self.words
+        return [ words[vocabulary[token]] if token in vocabulary else token
+                 for token in tokens ]
+
+    def getRoom(self, name):
+        """Returns the AdvRoom object with the specified name."""
+        return self.rooms[name]
+
+    def getRoomId(self, name):
+        """Returns the integer id of the room with the specified name."""
+        return self.room_ids[name]
+
+    def getRoomById(self, room_id):
+        """Returns the AdvRoom object with the specified id."""
+        return self.room_list[room_id]
+
+    def getRoomCount(self):
+        """Returns the number of rooms in this world."""
+        return len(self.room_list)
+
+    def getShortText(self, room_id):
+        """Returns the short description of a room as a block of output
+        ending with a newline.  Each block is rendered once and shared by
+        every player."""
+        text = self.short_texts.get(room_id)
+        if text is None:
+            text = self.getRoomById(room_id).getShortDescription() + "\n"
+            self.short_texts[room_id] = text
+        return text
+
+    def getObject(self, object_id):
+        """Returns the AdvObject with the specified id."""
+        return self.object_list[object_id]
+
+    def getPresenceText(self, object_id):
+        """Returns the line that tells the player an object is in the
+        room, rendered when the World was created."""
+        return self.presence_texts[object_id]
+
+    def getObjectId(self, name):
+        """Returns the id of the object with the specified name or one of
+        its synonyms, or None if there is no such object."""
+        word_id = self.vocabulary.get(name)
+        if word_id is None:
+            return None
+        if word_id >= len(self.word_objects):
+            return None
+        object_id = self.word_objects[word_id]
+        if object_id == NO_OBJECT:
+            return None
+        return object_id
+
+    def getObjectCount(self):
+        """Returns the number of objects in this world."""
+        return len(self.object_list)
+
+    def getDeletedRoomIds(self):
+        """Returns the set of ids of the rooms that have been deleted."""
+        return set(self.deleted_rooms.values())
+
+    def getInitialLocations(self):
+        """Returns the list of starting room ids for each object, where
+        PLAYER_ID means that the player starts out carrying it."""
+        return self.initial_locations
+
+    def moveInitialLocation(self, object_id, location_id):
+        """Changes the starting room of an object, keeping initial_contents
+        in step.  If location_id is None, the object is only removed from
+        initial_contents."""
+        old = self.initial_locations[object_id]
+        contents = self.initial_contents.get(old)
+        if contents is not None:
+            contents.discard(object_id)
+            if len(contents) == 0:
+                del self.initial_contents[old]
+        if location_id is not None:
+            self.initial_locations[object_id] = location_id
+            self.initial_contents.setdefault(location_id, set()).add(
+                object_id)
+
+    def getNextRoom(self, room, cmd, state=None):
+        """Returns the name of the room reached by applying cmd in the
+        specified room, or None if cmd does not lead anywhere.  Keyed
+        passages are open only if state shows the player carrying the
+        key."""
+        next_id = self.getNextRoomId(self.getRoomId(room.getName()),
+                                     self.lookupWord(cmd), state)
+        if next_id is None:
+            return None
+        if next_id == EXIT_ID:
+            return EXIT_ROOM
+        return self.getRoomById(next_id).getName()
+
+    def getNextRoomId(self, room_id, word_id, state=None):
+        """Returns the id of the room reached by taking the passage with
+        the given verb id out of a room, EXIT_ID if the passage ends the
+        game, or None if there is no open passage with that verb."""
+        verbs, targets, keys, start, end = self.getPassageRange(room_id)
+        i = bisect_left(verbs, word_id, start, end)
+        while i < end and verbs[i] == word_id:
+            key_id = keys[i]
+            if key_id == NO_KEY:
+                return targets[i]
+            if (state is not None and key_id < len(self.object_list)
+                    and state.isCarrying(key_id)):
+                return targets[i]
+            i += 1
+        return None
+
+    def applyUpdate(self, rooms=(), deleted=(), objects=(), synonyms=None,
+                    removedSynonyms=()):
+        """Brings edits to the data files into this World, as described
+        in the notes on updates.  The rooms and objects lists hold new or
+        changed AdvRoom and AdvObject definitions, deleted lists the
+        names of deleted rooms, synonyms maps new or changed synonyms to
+        their words and removedSynonyms lists the synonyms that are gone.
+        If the update is not valid, it raises ValueError and puts back
+        every room, object and synonym it touched, so the game plays as
+        it did before.  Words it added stay in the vocabulary, where
+        nothing refers to them, and forced jumps are resolved again as
+        they are needed."""
+        room_count = len(self.room_list)
+        object_count = len(self.object_list)
+        saved_rooms = { }
+        saved_names = { }
+        saved_objects = { }
+        saved_synonyms = { }
+        saved_synonym_table = self.synonyms
+        saved_object_table = self.objects
+        saved_deleted = dict(self.deleted_rooms)
+        saved_conditional = set(self.conditional_rooms)
+        saved_unknown = { key: set(room_ids) for key, room_ids
+                          in self.unknown_keys.items() }
+        added_objects = [ ]
+        # The ids of the rooms whose passages must be compiled, in order
+        changed = { }
+
+        def saveRoom(room_id):
+            if room_id < room_count and room_id not in saved_rooms:
+                saved_rooms[room_id] = (self.room_list[room_id],
+                                        self.passage_patches.get(room_id))
+
+        def saveName(name):
+            if name not in saved_names:
+                saved_names[name] = self.room_ids.get(name)
+
+        try:
+            deleted_ids = set()
+            for name in deleted:
+                room_id = self.room_ids.get(name)
+                if room_id is None or name == START_ROOM:
+                    raise ValueError("Unknown room " + name)
+                if room_id == 0:
+                    raise ValueError("The first room cannot be deleted")
+                saveName(name)
+                del self.room_ids[name]
+                del self.rooms[name]
+                self.deleted_rooms[name] = room_id
+                deleted_ids.add(room_id)
+            for room in rooms:
+                name = room.getName()
+                room_id = self.room_ids.get(name)
+                if room_id is None:
+                    # A deleted room that comes back keeps its old id.
+                    room_id = self.deleted_rooms.pop(name, None)
+                    if room_id is None:
+                        room_id = len(self.room_list)
+                        self.room_list.append(room)
+                    saveName(name)
+                    self.room_ids[name] = room_id
+                saveRoom(room_id)
+                self.room_list[room_id] = room
+                self.rooms[name] = room
+                if room_id == 0:
+                    self.rooms[START_ROOM] = room
+                changed[room_id] = None
+            if len(objects) != 0 and self.objects is None:
+                self.objects = { }
+            for object in objects:
+                name = object.getName()
+                location = object.getInitialLocation()
+                if location == PLAYER:
+                    location_id = PLAYER_ID
+                else:
+                    location_id = self.findRoomId(location)
+                    if location_id is None:
+                        raise ValueError("Unknown room " + location
+                                         + " for object " + name)
+                text = "There is " + object.getDescription() + " here.\n"
+                object_id = self.object_ids.get(name)
+                if object_id is None:
+                    object_id = len(self.object_list)
+                    self.object_ids[name] = object_id
+                    self.object_list.append(object)
+                    self.initial_locations.append(location_id)
+                    self.initial_contents.setdefault(location_id, set()).add(
+                        object_id)
+                    self.presence_texts.append(text)
+                    added_objects.append(name)
+                    word_id = self.internWord(name)
+                    self.word_objects.extend([ NO_OBJECT ] * (len(self.words)
+                                                 - len(self.word_objects)))
+                    self.word_objects[word_id] = object_id
+                    # Passages that name the new object as their key must
+                    # be compiled again.
+                    for room_id in self.unknown_keys.pop(name, ()):
+                        saveRoom(room_id)
+                        changed[room_id] = None
+                else:
+                    if object_id not in saved_objects:
+                        saved_objects[object_id] = (
+                            self.object_list[object_id],
+                            self.presence_texts[object_id],
+                            self.initial_locations[object_id])
+                    self.object_list[object_id] = object
+                    self.presence_texts[object_id] = text
+                    self.moveInitialLocation(object_id, location_id)
+                self.objects[name] = object
+            for room_id in changed:
+                self.setPatch(room_id, self.compilePassages(
+                    self.room_list[room_id], room_id))
+                self.short_texts.pop(room_id, None)
+            if len(deleted_ids) != 0:
+                self.checkDeletedRooms(deleted_ids)
+            if synonyms or removedSynonyms:
+                if self.synonyms is None:
+                    self.synonyms = { }
+                for key in removedSynonyms:
+                    saved_synonyms.setdefault(key, (self.synonyms.get(key),
+                                                    self.vocabulary.get(key)))
+                    self.synonyms.pop(key, None)
+                    self.vocabulary.pop(key, None)
+                    if key in self.word_ids:
+                        self.vocabulary[key] = self.word_ids[key]
+                for key, value in (synonyms or { }).items():
+                    saved_synonyms.setdefault(key, (self.synonyms.get(key),
+                                                    self.vocabulary.get(key)))
+                    self.synonyms[key] = value
+                    self.vocabulary[sys.intern(key)] = self.internWord(value)
+            # Forced chains may pass through any of the changed rooms, so
+            # every jump is resolved again, and the changed rooms at once.
+            self.forced_jumps.clear()
+            for room_id in changed:
+                self.conditional_rooms.discard(room_id)
+                jump = self.getForcedJump(room_id)
+                if jump is not None and jump[1] is None:
+                    self.conditional_rooms.add(room_id)
+            self.checkForcedCycles()
+        except Exception:
+            del self.room_list[room_count:]
+            for room_id in changed:
+                self.setPatch(room_id, None)
+                self.short_texts.pop(room_id, None)
+            for room_id, (room, patch) in saved_rooms.items():
+                self.room_list[room_id] = room
+                self.setPatch(room_id, patch)
+            for name, room_id in saved_names.items():
+                if room_id is None:
+                    self.room_ids.pop(name, None)
+                    self.rooms.pop(name, None)
+                else:
+                    self.room_ids[name] = room_id
+                    self.rooms[name] = self.room_list[room_id]
+            for room_id, (room, patch) in saved_rooms.items():
+                if self.room_ids.get(room.getName()) == room_id:
+                    self.rooms[room.getName()] = room
+            if len(self.room_list) != 0:
+                self.rooms[START_ROOM] = self.room_list[0]
+            for name in added_objects:
+                del self.object_ids[name]
+                self.objects.pop(name, None)
+                self.word_objects[self.vocabulary[name]] = NO_OBJECT
+            for object_id in range(object_count, len(self.initial_locations)):
+                self.moveInitialLocation(object_id, None)
+            del self.object_list[object_count:]
+            del self.initial_locations[object_count:]
+            del self.presence_texts[object_count:]
+            for object_id, (object, text, location) in saved_objects.items():
+                self.object_list[object_id] = object
+                self.presence_texts[object_id] = text
+                self.moveInitialLocation(object_id, location)
+                self.objects[object.getName()] = object
+            for key, (value, word_id) in saved_synonyms.items():
+                if value is None:
+                    self.synonyms.pop(key, None)
+                else:
+                    self.synonyms[key] = value
+                if word_id is None:
+                    self.vocabulary.pop(key, None)
+                else:
+                    self.vocabulary[key] = word_id
+            self.synonyms = saved_synonym_table
+            self.objects = saved_object_table
+            self.deleted_rooms = saved_deleted
+            self.conditional_rooms = saved_conditional
+            self.unknown_keys = saved_unknown
+            self.forced_jumps.clear()
+            raise
+        self.generation += 1
+
+    def checkDeletedRooms(self, deleted_ids):
+        """Raises ValueError if any room or object that is not itself being
+        deleted refers to one of the rooms with the specified ids."""
+        ignored = self.getDeletedRoomIds()
+        for room_id in sorted(deleted_ids):
+            contents = self.initial_contents.get(room_id)
+            if contents:
+                object = self.object_list[min(contents)]
+                raise ValueError("Object " + object.getName()
+                                 + " starts in deleted room "
+                                 + self.getRoomById(room_id).getName())
+            for source in sorted(self.getPassageSources(room_id)):
+                if source not in ignored:
+                    self.reportDeletedPassage(source, room_id)
+
+    def reportDeletedPassage(self, room_id, target):
+        """Raises the ValueError for a passage to a deleted room."""
+        raise ValueError("Room " + self.getRoomById(room_id).getName()
+                         + " has a passage to deleted room "
+                         + self.getRoomById(target).getName())
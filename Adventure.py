@@ -1,8 +1,13 @@
 # File: Adventure.py
 # ------------------
-# This program plays the CSCI 121 Adventure game.
+# This program plays the CSCI 121 Adventure game.  The data file prefix
+# may be given on the command line and defaults to DATA_FILE_PREFIX.
+# Every turn is autosaved, so a game that is interrupted carries on
+# where it left off the next time the program runs.
 
+import sys
 from AdvGame import AdvGame
+from AdvSave import AUTOSAVE_SUFFIX
 
 # Constants
 
@@ -10,11 +15,11 @@ DATA_FILE_PREFIX = "Crowther"
 
 # Main program
 
-def Adventure():
-    game = AdvGame(DATA_FILE_PREFIX)
-    game.run()
+def Adventure(prefix=DATA_FILE_PREFIX):
+    game = AdvGame(prefix)
+    game.run(autosavePath=prefix + AUTOSAVE_SUFFIX)
 
 # Startup code
 
 if __name__ == "__main__":
-    Adventure()
+    Adventure(*sys.argv[1:2])
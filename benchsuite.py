@@ -0,0 +1,317 @@
+# File: benchsuite.py
+
+"""
+This program runs a suite of benchmarks covering each part of the game
+and compares the results with a JSON baseline.  It measures parsing the
+room and object files of the bundled worlds and of a generated large
+world, TokenScanner throughput, synonym resolution, getNextRoom, TAKE
+and DROP, and complete scripted games.  It exits with status 1 if any
+benchmark has slowed down by more than its threshold, so it can be run
+as a regression check.  It needs nothing beyond the standard library.
+"""
+
+# Implementation notes
+# --------------------
+# Every benchmark is a function that takes a number of passes, does that
+# much work and returns the number of operations it performed.  As in
+# timeit.autorange, the number of passes is doubled until a run takes at
+# least MIN_RUN_TIME seconds, and the benchmark is then timed repeat
+# times.  The best rate is kept, since slower runs differ from it only
+# by interference from the rest of the machine.
+#
+# A baseline file holds the rate for each benchmark, the default
+# threshold and, optionally, a threshold for particular benchmarks that
+# are noisier than the rest.  A benchmark regresses if its rate falls
+# below (1 - threshold) times its baseline rate.  Rates depend on the
+# machine, so a baseline should be saved on the machine that checks it.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from AdvGame import AdvGame
+from AdvGenerate import generateWorld
+from AdvObject import AdvObject
+from AdvRoom import AdvRoom
+from AdvSession import Session
+from AdvState import GameState
+from AdvWorld import PLAYER_ID
+from sessionbench import DEFAULT_SCRIPT, playScripts
+from tokenscanner import TokenScanner
+
+# Constants
+
+BASELINE_VERSION = 1
+DEFAULT_BASELINE = "benchmarks.json"
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 7
+DEFAULT_GENERATED_ROOMS = 20000
+MIN_RUN_TIME = 0.1
+BUNDLED_WORLDS = [ "Tiny", "Small", "Crowther" ]
+
+TYPICAL_COMMANDS = [ "TAKE LAMP", "DROP KEYS WATER", "TAKE THE GOLD NUGGET",
+                     "INVENTORY", "XYZZY", "DROP ROD, BIRD AND CAGE",
+                     "N", "SOUTH", "IN", "LOOK" ]
+
+# Benchmarks
+
+def parseRooms(prefix):
+    """Returns a benchmark that reads every room in a rooms file."""
+    def run(passes):
+        count = 0
+        for i in range(passes):
+            with open(prefix + "Rooms.txt") as f:
+                while AdvRoom.readRoom(f) is not None:
+                    count += 1
+        return count
+    return run
+
+def parseObjects(prefix):
+    """Returns a benchmark that reads every object in an objects file."""
+    def run(passes):
+        count = 0
+        for i in range(passes):
+            with open(prefix + "Objects.txt") as f:
+                while AdvObject.readObject(f) is not None:
+                    count += 1
+        return count
+    return run
+
+def scanTokens(passes):
+    """Tokenizes typical commands one token at a time."""
+    count = 0
+    for i in range(passes):
+        for text in TYPICAL_COMMANDS:
+            scanner = TokenScanner(text)
+            scanner.ignoreWhitespace()
+            while scanner.hasMoreTokens():
+                scanner.nextToken()
+                count += 1
+    return count
+
+def tokenizeCommands(passes):
+    """Tokenizes typical commands with the single-call tokenize method
+    that sessions use."""
+    scanner = TokenScanner()
+    scanner.ignoreWhitespace()
+    count = 0
+    for i in range(passes):
+        for text in TYPICAL_COMMANDS:
+            count += len(scanner.tokenize(text))
+    return count
+
+def resolveSynonyms(world):
+    """Returns a benchmark that replaces synonyms in tokenized commands
+    as a session does, first for the whole command and then for each
+    of its words."""
+    scanner = TokenScanner()
+    scanner.ignoreWhitespace()
+    commands = [ (text, scanner.tokenize(text)) for text in TYPICAL_COMMANDS ]
+    synonyms = world.synonyms or { }
+    def run(passes):
+        for i in range(passes):
+            for text, tokens in commands:
+                synonyms.get(text, text)
+                world.canonicalize(tokens)
+        return passes * len(commands)
+    return run
+
+def findNextRooms(world):
+    """Returns a benchmark that calls getNextRoom for every verb of every
+    room, carrying every object so that keyed passages are open."""
+    state = GameState(world)
+    for object_id in range(world.getObjectCount()):
+        state.moveObject(object_id, PLAYER_ID)
+    cases = [ ]
+    for room_id in range(world.getRoomCount()):
+        verbs, targets, keys, start, end = world.getPassageRange(room_id)
+        room = world.getRoomById(room_id)
+        for word_id in sorted(set(verbs[start:end])):
+            cases.append((room, world.getWord(word_id)))
+    def run(passes):
+        for i in range(passes):
+            for room, cmd in cases:
+                world.getNextRoom(room, cmd, state)
+        return passes * len(cases)
+    return run
+
+def takeAndDrop(world):
+    """Returns a benchmark that takes and drops the keys in the building
+    over and over."""
+    def run(passes):
+        session = Session(world)
+        session.start()
+        session.step("IN")
+        for i in range(passes):
+            session.step("TAKE KEYS")
+            session.step("DROP KEYS")
+        return 2 * passes
+    return run
+
+def playGames(world):
+    """Returns a benchmark that plays complete scripted games."""
+    def run(passes):
+        playScripts(world, DEFAULT_SCRIPT, passes)
+        return passes
+    return run
+
+def getBenchmarks(generated):
+    """Returns the list of (name, unit, function) triples for the suite,
+    where generated is the prefix of a generated world or None."""
+    benchmarks = [ ]
+    worlds = [ (name, name) for name in BUNDLED_WORLDS ]
+    if generated is not None:
+        worlds.append(("Generated", generated))
+    for label, prefix in worlds:
+        benchmarks.append(("parse.rooms." + label, "rooms/s",
+                           parseRooms(prefix)))
+        if os.path.isfile(prefix + "Objects.txt"):
+            benchmarks.append(("parse.objects." + label, "objects/s",
+                               parseObjects(prefix)))
+    benchmarks.append(("tokens.scanner", "tokens/s", scanTokens))
+    benchmarks.append(("tokens.tokenize", "tokens/s", tokenizeCommands))
+    world = AdvGame("Crowther").world
+    benchmarks.append(("synonyms.Crowther", "commands/s",
+                       resolveSynonyms(world)))
+    benchmarks.append(("nextroom.Crowther", "calls/s", findNextRooms(world)))
+    benchmarks.append(("takedrop.Crowther", "commands/s", takeAndDrop(world)))
+    benchmarks.append(("play.Crowther", "games/s", playGames(world)))
+    return benchmarks
+
+# Timing and baselines
+
+def measure(function, repeat):
+    """Returns the best rate in operations per second for a benchmark.
+    As in timeit, garbage collection is turned off while it runs."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        passes = 1
+        while True:
+            start = time.perf_counter()
+            count = function(passes)
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_RUN_TIME: break
+            passes *= 2
+        best = count / elapsed
+        for i in range(repeat - 1):
+            start = time.perf_counter()
+            count = function(passes)
+            best = max(best, count / (time.perf_counter() - start))
+    finally:
+        if enabled:
+            gc.enable()
+    return best
+
+def readBaseline(filename):
+    """Returns the baseline stored in a file, or None if there is none."""
+    try:
+        with open(filename) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        return None
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(filename + " is not a benchmark baseline")
+    return baseline
+
+def writeBaseline(filename, baseline, results, threshold):
+    """Writes the results to the baseline file, keeping the entries and
+    thresholds of any benchmarks that were not run."""
+    if baseline is None:
+        baseline = { "version": BASELINE_VERSION, "results": { },
+                     "thresholds": { } }
+    baseline["machine"] = getMachine()
+    baseline["threshold"] = threshold
+    for name, (unit, rate) in results.items():
+        baseline["results"][name] = { "unit": unit, "rate": rate }
+    with open(filename, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def getMachine():
+    """Returns a description of this machine and Python, which is stored
+    with a baseline."""
+    return { "platform": platform.platform(),
+             "processor": platform.machine(),
+             "python": platform.python_version() }
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Run the benchmark suite and check it for regressions.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline file (default %s)" % DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="allowed slowdown as a fraction (default from "
+                             "the baseline, or %g)" % DEFAULT_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="timed runs of each benchmark (default %d)"
+                             % DEFAULT_REPEAT)
+    parser.add_argument("--only", action="append", default=None,
+                        metavar="PREFIX",
+                        help="run only benchmarks whose names start with "
+                             "PREFIX (may be repeated)")
+    parser.add_argument("--generated-rooms", type=int,
+                        default=DEFAULT_GENERATED_ROOMS,
+                        help="rooms in the generated world, or 0 to skip it "
+                             "(default %d)" % DEFAULT_GENERATED_ROOMS)
+    options = parser.parse_args(args)
+    baseline = readBaseline(options.baseline)
+    threshold = options.threshold
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLD
+        if baseline is not None:
+            threshold = baseline.get("threshold", DEFAULT_THRESHOLD)
+    if baseline is not None and baseline.get("machine") != getMachine():
+        print("Warning: %s was saved on a different machine or Python" %
+              options.baseline)
+    results = { }
+    regressions = [ ]
+    with tempfile.TemporaryDirectory() as directory:
+        generated = None
+        if options.generated_rooms > 0:
+            generated = os.path.join(directory, "Generated")
+            generateWorld(generated, rooms=options.generated_rooms,
+                          objects=options.generated_rooms // 20, seed=1)
+        for name, unit, function in getBenchmarks(generated):
+            if options.only is not None and not any(name.startswith(prefix)
+                                                    for prefix in options.only):
+                continue
+            rate = measure(function, options.repeat)
+            results[name] = (unit, rate)
+            line = "%-24s %14.1f %-11s" % (name, rate, unit)
+            entry = None
+            if baseline is not None:
+                entry = baseline["results"].get(name)
+            if entry is None:
+                print(line + "  (no baseline)")
+                continue
+            change = rate / entry["rate"] - 1.0
+            allowed = baseline.get("thresholds", { }).get(name, threshold)
+            status = ""
+            if change < -allowed:
+                status = "  REGRESSION (allowed -%.0f%%)" % (100 * allowed)
+                regressions.append(name)
+            print(line + "  %+6.1f%%%s" % (100 * change, status))
+            sys.stdout.flush()
+    if options.save:
+        writeBaseline(options.baseline, baseline, results, threshold)
+        print("Saved %d results to %s" % (len(results), options.baseline))
+        return 0
+    if len(regressions) != 0:
+        print("%d of %d benchmarks regressed: %s" %
+              (len(regressions), len(results), ", ".join(regressions)))
+        return 1
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# File: memorybench.py
+
+"""
+This program uses tracemalloc to report how many bytes each room of a
+loaded world occupies, both for the bundled worlds and for a generated
+world of any size.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from AdvGame import AdvGame
+from AdvGenerate import generateWorld
+from AdvLazyWorld import LazyWorld
+from AdvSession import Session
+from AdvWorld import World
+
+def measure(function):
+    """Calls function and returns the pair (result, bytes), where bytes
+    is the memory still allocated by the call when it returns."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+def reportWorld(prefix, label, lazy):
+    """Prints the bytes per room for the rooms, the world indexes and, if
+    lazy is True, a LazyWorld built over the same files."""
+    rooms, room_bytes = measure(lambda: AdvGame.readRooms(prefix))
+    objects = AdvGame.readObjects(prefix)
+    synonyms = AdvGame.readSynonyms(prefix)
+    world, index_bytes = measure(
+        lambda: World(rooms, objects, synonyms, verbs=Session.verbs))
+    count = world.getRoomCount()
+    print("%-10s %9d rooms   rooms %7.1f B   indexes %7.1f B   "
+          "total %7.1f B per room" %
+          (label, count, room_bytes / count, index_bytes / count,
+           (room_bytes + index_bytes) / count))
+    if lazy:
+        del world, rooms
+        world, lazy_bytes = measure(
+            lambda: LazyWorld(prefix + "Rooms.txt", objects, synonyms,
+                              verbs=Session.verbs))
+        print("%-10s %9d rooms   lazy index %7.1f B per room" %
+              (label, count, lazy_bytes / count))
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Report the memory used per room by loaded worlds.")
+    parser.add_argument("prefixes", nargs="*", metavar="PREFIX",
+                        default=[ "Crowther" ],
+                        help="data file prefixes (default Crowther)")
+    parser.add_argument("--rooms", type=int, default=1000000,
+                        help="rooms in the generated world (default 1000000)")
+    parser.add_argument("--no-generate", action="store_true",
+                        help="skip the generated world")
+    parser.add_argument("--lazy", action="store_true",
+                        help="also measure the lazy loading mode")
+    options = parser.parse_args(args)
+    for prefix in options.prefixes:
+        reportWorld(prefix, os.path.basename(prefix), options.lazy)
+    if not options.no_generate:
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = os.path.join(directory, "Generated")
+            generateWorld(prefix, rooms=options.rooms, seed=1)
+            reportWorld(prefix, "Generated", options.lazy)
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# File: outputbench.py
+
+"""
+This program measures how many bytes and write system calls each turn
+of a game produces.  It plays a script of commands through a Session and
+sends the output to a line-buffered stream, like a terminal, either one
+line at a time as print would or as a single write per turn as AdvGame
+does.
+"""
+
+import argparse
+import io
+import sys
+import time
+from AdvGame import AdvGame, PROMPT
+from AdvSession import Session
+from sessionbench import DEFAULT_SCRIPT
+
+class CountingWriter(io.RawIOBase):
+
+    """This class stands in for a file descriptor and counts the calls
+    that would have been write system calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.calls += 1
+        self.bytes += len(data)
+        return len(data)
+
+def writeLines(stream, output):
+    """Writes the output of a turn one line at a time, followed by the
+    prompt, which input flushes separately."""
+    for line in output.splitlines(True):
+        stream.write(line)
+    stream.write(PROMPT)
+    stream.flush()
+
+def writeTurn(stream, output):
+    """Writes the output of a turn and the prompt in a single write."""
+    stream.write(output + PROMPT)
+    stream.flush()
+
+def playGames(world, script, games, writer):
+    """Plays the script in games sessions, sending the output through
+    writer, and returns (turns, calls, bytes, seconds)."""
+    raw = CountingWriter()
+    stream = io.TextIOWrapper(io.BufferedWriter(raw), encoding="utf-8",
+                              line_buffering=True)
+    turns = 0
+    start = time.perf_counter()
+    for i in range(games):
+        session = Session(world)
+        writer(stream, session.start())
+        for command in script:
+            if session.isFinished(): break
+            writer(stream, session.step(command))
+            turns += 1
+    elapsed = time.perf_counter() - start
+    return turns, raw.calls, raw.bytes, elapsed
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Measure bytes and write calls per turn of output.")
+    parser.add_argument("--prefix", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--games", type=int, default=2000,
+                        help="number of games to play (default 2000)")
+    options = parser.parse_args(args)
+    world = AdvGame(options.prefix).world
+    for label, writer in [ ("per line", writeLines), ("per turn", writeTurn) ]:
+        turns, calls, count, elapsed = playGames(world, DEFAULT_SCRIPT,
+                                                 options.games, writer)
+        print("%-9s %7.1f bytes   %5.2f writes   %6.2f us per turn" %
+              (label, count / turns, calls / turns, elapsed / turns * 1e6))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
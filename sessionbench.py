@@ -0,0 +1,60 @@
+# File: sessionbench.py
+
+"""
+This program measures how many commands per second a Session can
+process by replaying a script of commands against a world.
+"""
+
+import argparse
+import sys
+import time
+from AdvGame import AdvGame
+from AdvSession import Session
+
+# Constants
+
+DEFAULT_SCRIPT = [
+    "IN", "TAKE KEYS", "INVENTORY", "OUT", "S", "S", "S", "D", "W",
+    "TAKE LAMP", "LOOK", "W", "TAKE ROD", "DROP ROD", "E", "E", "HELP",
+    "DROP KEYS", "TAKE KEYS", "FOO", "XYZZY", "U", "N", "N", "N", "I",
+    "DROP WATER LAMP", "TAKE WATER LAMP"
+]
+
+def playScripts(world, script, games):
+    """Plays the script in games fresh sessions and returns the number
+    of commands processed."""
+    commands = 0
+    for i in range(games):
+        session = Session(world)
+        session.start()
+        commands += len(session.runScript(script))
+    return commands
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Measure Session throughput in commands per second.")
+    parser.add_argument("--prefix", default="Crowther",
+                        help="data file prefix (default Crowther)")
+    parser.add_argument("--games", type=int, default=2000,
+                        help="number of games to play (default 2000)")
+    parser.add_argument("--script", metavar="FILE",
+                        help="file of commands to play, one per line")
+    options = parser.parse_args(args)
+    script = DEFAULT_SCRIPT
+    if options.script is not None:
+        with open(options.script) as f:
+            script = [ line.rstrip("\r\n") for line in f ]
+    world = AdvGame(options.prefix).world
+    start = time.perf_counter()
+    commands = playScripts(world, script, options.games)
+    elapsed = time.perf_counter() - start
+    print("%d commands in %.2f s (%.0f commands per second)" %
+          (commands, elapsed, commands / elapsed))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# File: test_AdvCache.py
+
+"""
+This module tests that a cache whose header is valid but whose world
+data has the wrong shape is ignored, so that the game is read from its
+data files and the cache is written again.
+"""
+
+import marshal
+import shutil
+import pytest
+import AdvCache
+from AdvGame import AdvGame
+
+def copyWorld(directory, name="Small"):
+    """Copies the data files of a world into directory and returns the
+    prefix of the copies."""
+    for suffix in AdvCache.SOURCE_SUFFIXES:
+        shutil.copy(name + suffix, str(directory))
+    return str(directory / name)
+
+def replaceData(prefix, data):
+    """Replaces the world data in the cache for prefix, keeping its
+    header."""
+    filename = AdvCache.getCachePath(prefix)
+    with open(filename, "rb") as f:
+        header = marshal.load(f)
+    with open(filename, "wb") as f:
+        marshal.dump(header, f)
+        marshal.dump(data, f)
+
+@pytest.mark.parametrize("data", [
+    ([ ], None),
+    ([ 7 ], None, None),
+    ([ (7, "Room", "Text\n", [ ]) ], None, None),
+    ([ ("Room", "Room", "Text\n", [ 7 ]) ], None, None),
+    ([ ("Room", "Room", "Text\n", [ ]) ], [ ("LAMP", "a lamp") ], None),
+    "not a world" ])
+def test_wrong_shape_falls_back_to_parsing(tmp_path, data):
+    prefix = copyWorld(tmp_path)
+    AdvCache.compileWorld(prefix)
+    expected = AdvCache.encodeWorld(AdvCache.readCache(prefix))
+    replaceData(prefix, data)
+    assert AdvCache.readCache(prefix) is None
+    world = AdvGame(prefix).world
+    assert world.getRoomCount() == len(expected[0])
+    assert AdvCache.encodeWorld(AdvCache.readCache(prefix)) == expected
@@ -0,0 +1,49 @@
+# File: test_AdvGame.py
+
+"""
+This module tests that a game played with an autosave path is resumed
+after it is cut short and starts afresh once it has ended.
+"""
+
+import io
+import os
+import pytest
+from AdvGame import AdvGame, RESUME_MESSAGE, RESUME_FAILED_MESSAGE
+from AdvSave import JOURNAL_SUFFIX
+
+@pytest.fixture(scope="module")
+def game():
+    return AdvGame("Crowther", useCache=False)
+
+def play(game, monkeypatch, capsys, path, commands):
+    """Runs the game on the commands and returns its output.  The game
+    is cut short by the end of its input unless it ends first."""
+    monkeypatch.setattr("sys.stdin", io.StringIO("".join(
+        command + "\n" for command in commands)))
+    try:
+        game.run(autosavePath=path)
+    except EOFError:
+        pass
+    return capsys.readouterr().out
+
+def test_interrupted_game_is_resumed(game, monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / "Autosave.dat")
+    output = play(game, monkeypatch, capsys, path, [ "IN", "TAKE KEYS" ])
+    assert not output.startswith(RESUME_MESSAGE)
+    output = play(game, monkeypatch, capsys, path, [ "INVENTORY", "QUIT" ])
+    assert output.startswith(RESUME_MESSAGE + "Inside building\n")
+    assert "a set of keys" in output
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + JOURNAL_SUFFIX)
+    output = play(game, monkeypatch, capsys, path, [ "INVENTORY" ])
+    assert output.startswith("You are standing at the end of a road")
+    assert "a set of keys" not in output
+
+def test_damaged_autosave_starts_afresh(game, monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / "Autosave.dat")
+    with open(path, "wb") as f:
+        f.write(b"not a saved game")
+    output = play(game, monkeypatch, capsys, path, [ "IN" ])
+    assert output.startswith(RESUME_FAILED_MESSAGE + "You are standing")
+    output = play(game, monkeypatch, capsys, path, [ ])
+    assert output.startswith(RESUME_MESSAGE + "Inside building\n")
@@ -0,0 +1,94 @@
+# File: test_AdvGraph.py
+
+"""
+This module tests the passage masks of WorldGraph against the passages
+that the game itself would choose.  It is skipped if NumPy is not
+installed.
+"""
+
+import random
+import pytest
+from AdvGame import AdvGame
+from AdvWorld import NO_KEY
+
+np = pytest.importorskip("numpy")
+from AdvGraph import WorldGraph
+
+# Constants
+
+EXIT_FIRST_ROOMS = """Start
+Start
+The first room.
+-----
+NORTH: EXIT/KEYS
+NORTH: Hall
+EAST: Hall
+
+Hall
+Hall
+The second room.
+-----
+WEST: Start
+"""
+
+EXIT_FIRST_OBJECTS = """KEYS
+a set of keys
+Hall
+"""
+
+def writeWorld(directory, rooms, objects=None):
+    """Writes the data files for a world and returns their prefix."""
+    prefix = str(directory / "Test")
+    with open(prefix + "Rooms.txt", "w") as f:
+        f.write(rooms)
+    if objects is not None:
+        with open(prefix + "Objects.txt", "w") as f:
+            f.write(objects)
+    return prefix
+
+def getChosenPassages(world, carried):
+    """Returns the (room_id, target) pairs of the passages that a player
+    carrying the objects in carried would take, found one room at a time
+    as the game does."""
+    count = world.getObjectCount()
+    chosen = [ ]
+    for room_id in range(world.getRoomCount()):
+        verbs, targets, keys, start, end = world.getPassageRange(room_id)
+        taken = set()
+        for i in range(start, end):
+            if verbs[i] in taken: continue
+            if keys[i] == NO_KEY or (keys[i] < count and keys[i] in carried):
+                taken.add(verbs[i])
+                if targets[i] >= 0:
+                    chosen.append((room_id, targets[i]))
+    return chosen
+
+def getMaskedPassages(graph, mask):
+    """Returns the (room_id, target) pairs of the passages in mask."""
+    return list(zip(graph.rows[mask].tolist(), graph.targets[mask].tolist()))
+
+def test_keyed_exit_hides_later_passages(tmp_path):
+    world = AdvGame(writeWorld(tmp_path, EXIT_FIRST_ROOMS, EXIT_FIRST_OBJECTS),
+                    useCache=False).world
+    graph = WorldGraph(world)
+    start = world.findRoomId("Start")
+    hall = world.findRoomId("Hall")
+    keys = world.getObjectId("KEYS")
+    assert graph.getPassageCount() == 3
+    without = getMaskedPassages(graph, graph.getPassageMask([ ]))
+    assert without.count((start, hall)) == 2
+    carrying = getMaskedPassages(graph, graph.getPassageMask([ keys ]))
+    assert carrying.count((start, hall)) == 1
+
+@pytest.mark.parametrize("prefix", [ "Small", "Crowther" ])
+def test_mask_matches_game(prefix):
+    world = AdvGame(prefix).world
+    graph = WorldGraph(world)
+    rng = random.Random(15)
+    count = world.getObjectCount()
+    for trial in range(20):
+        carried = [ object_id for object_id in range(count)
+                    if rng.random() < 0.5 ]
+        mask = graph.getPassageMask(carried)
+        assert (sorted(getMaskedPassages(graph, mask))
+                == sorted(getChosenPassages(world, set(carried))))
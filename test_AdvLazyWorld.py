@@ -0,0 +1,38 @@
+# File: test_AdvLazyWorld.py
+
+"""
+This module tests that a LazyWorld plays exactly like an eager World
+while keeping no more than its cache size of parsed rooms, and nothing
+derived from them, in memory.
+"""
+
+import random
+from AdvGame import AdvGame
+from AdvGenerate import generateWorld
+from AdvSession import Session
+
+def playRandomly(world, seed, turns):
+    """Plays random passage names in a session and returns its output."""
+    rng = random.Random(seed)
+    session = Session(world)
+    outputs = [ session.start() ]
+    for turn in range(turns):
+        if session.isFinished(): break
+        verbs, targets, keys, start, end = \
+            world.getPassageRange(session.getState().getCurrentRoom())
+        command = "LOOK"
+        if end != start:
+            command = world.getWord(verbs[rng.randrange(start, end)])
+        outputs.append(session.step(command))
+    return outputs
+
+def test_lazy_world_matches_eager(tmp_path):
+    prefix = str(tmp_path / "Generated")
+    generateWorld(prefix, rooms=400, chains=40, objects=10, seed=19)
+    eager = AdvGame(prefix, useCache=False).world
+    lazy = AdvGame(prefix, lazy=True, cacheSize=8).world
+    for seed in range(5):
+        assert playRandomly(lazy, seed, 300) == playRandomly(eager, seed, 300)
+    assert lazy.getCachedRoomCount() <= 8
+    assert len(lazy.forced_jumps) == 0
+    assert len(lazy.short_texts) == 0
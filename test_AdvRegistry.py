@@ -0,0 +1,101 @@
+# File: test_AdvRegistry.py
+
+"""
+This module tests that a WorldRegistry shares worlds between names and
+callers, counts their users, and reads an evicted world without holding
+up the event loop.
+"""
+
+import asyncio
+import pytest
+import time
+from AdvRegistry import WorldRegistry
+
+def makeRegistry():
+    registry = WorldRegistry(idleTimeout=0, processes=1)
+    registry.register("Tiny")
+    registry.register("Small")
+    registry.register("Small", "Copy")
+    return registry
+
+def test_identical_files_share_one_world():
+    registry = makeRegistry()
+    registry.load()
+    assert registry.getStats()["distinct"] == 2
+    assert registry.acquire("Small") is registry.acquire("Copy")
+    assert registry.getStats()["in_use"] == 1
+
+def test_evict_only_unused_worlds():
+    registry = makeRegistry()
+    registry.load()
+    registry.acquire("Tiny")
+    assert registry.evictIdle() == [ "Copy", "Small" ]
+    assert registry.isLoaded("Tiny")
+    registry.release("Tiny")
+    assert registry.evictIdle() == [ "Tiny" ]
+
+class SlowRegistry(WorldRegistry):
+
+    """This class records each read and the ticks of the event loop while
+    it took place, and makes the read slow enough to measure."""
+
+    def __init__(self, ticks):
+        WorldRegistry.__init__(self, idleTimeout=0, processes=1)
+        self.ticks = ticks
+        self.reads = [ ]
+
+    def readWorlds(self, prefixes, known):
+        start = len(self.ticks)
+        time.sleep(0.05)
+        result = WorldRegistry.readWorlds(self, prefixes, known)
+        self.reads.append((prefixes, len(self.ticks) - start))
+        return result
+
+def test_concurrent_acquires_share_one_read():
+    ticks = [ ]
+    registry = SlowRegistry(ticks)
+    registry.register("Small")
+    registry.register("Small", "Copy")
+
+    async def tick():
+        while True:
+            ticks.append(len(ticks))
+            await asyncio.sleep(0.001)
+
+    async def play():
+        ticker = asyncio.ensure_future(tick())
+        worlds = await asyncio.gather(
+            *[ registry.acquireAsync(name)
+               for name in [ "Small", "Small", "Copy", "Small" ] ])
+        ticker.cancel()
+        return worlds
+
+    worlds = asyncio.run(play())
+    assert all(world is worlds[0] for world in worlds)
+    assert sorted(prefixes for prefixes, count in registry.reads) == \
+           [ [ "Small" ], [ "Small" ] ]
+    assert registry.loads == 1
+    assert registry.entries[registry.keys["Small"]].users == 4
+    assert registry.reading == { }
+    # The event loop kept running while the worlds were read.
+    assert all(count > 1 for prefixes, count in registry.reads)
+
+def test_evicted_world_is_read_again():
+    registry = makeRegistry()
+
+    async def play():
+        world = await registry.acquireAsync("Tiny")
+        registry.release("Tiny")
+        assert registry.evictIdle() == [ "Tiny" ]
+        return world, await registry.acquireAsync("Tiny")
+
+    first, second = asyncio.run(play())
+    assert first is not second
+    assert registry.loads == 2
+    assert registry.getStats()["in_use"] == 1
+
+def test_unknown_world_is_refused():
+    registry = makeRegistry()
+    with pytest.raises(ValueError):
+        asyncio.run(registry.acquireAsync("Nowhere"))
+    assert registry.reading == { }
@@ -0,0 +1,160 @@
+# File: test_AdvSave.py
+
+"""
+This module tests that damaged snapshots, and those left in a deleted
+room, are refused and that a Journal recovers the game after a crash,
+both when its last record was cut short and when it was left behind by
+a compaction that did not finish.
+"""
+
+import os
+import pytest
+from AdvGame import AdvGame
+from AdvRoom import AdvRoom
+from AdvSave import Journal, encodeState, decodeState, encodeChanges
+from AdvSave import JOURNAL_SUFFIX
+from AdvSession import Session
+from AdvState import CHANGE_ROOM, CHANGE_VISITED, CHANGE_OBJECT
+
+@pytest.fixture(scope="module")
+def world():
+    return AdvGame("Crowther", useCache=False).world
+
+def getSummary(state):
+    """Returns the parts of a GameState that a snapshot records."""
+    return (state.current, bytes(state.visited), list(state.locations))
+
+def playJournaled(world, filename, commands, compactAfter=1000):
+    """Plays commands in a session recorded by a new Journal on filename,
+    which is left open, and returns the pair (session, journal)."""
+    journal = Journal(filename, world, compactAfter)
+    session = Session(world, journal.restore(), journal)
+    session.start()
+    for command in commands:
+        session.step(command)
+    return session, journal
+
+def test_snapshot_round_trip(world):
+    session = Session(world)
+    session.start()
+    session.runScript([ "IN", "TAKE KEYS", "OUT" ])
+    state, generation = decodeState(world, encodeState(session.getState(), 7))
+    assert generation == 7
+    assert getSummary(state) == getSummary(session.getState())
+
+@pytest.mark.parametrize("current, location", [ (None, 0), (-1, None),
+                                                 (None, -2), (None, None) ])
+def test_snapshot_out_of_range(world, current, location):
+    state = Session(world).getState()
+    count = world.getRoomCount()
+    state.current = count if current is None else current
+    state.locations[0] = count if location is None else location
+    with pytest.raises(ValueError):
+        decodeState(world, encodeState(state))
+
+def test_restore_out_of_range(world, tmp_path):
+    filename = str(tmp_path / "Save.dat")
+    state = Session(world).getState()
+    state.current = world.getRoomCount()
+    with open(filename, "wb") as f:
+        f.write(encodeState(state))
+    session = Session(world, savePath=filename)
+    session.start()
+    assert "could not be read" in session.step("RESTORE")
+    assert session.getCurrentRoom() == "OutsideBuilding"
+    assert "building" in session.step("LOOK")
+
+def test_restore_in_deleted_room(tmp_path):
+    world = AdvGame("Small", useCache=False).world
+    session = Session(world, savePath=str(tmp_path / "Save.dat"))
+    session.start()
+    session.step("WEST")
+    assert session.step("SAVE").startswith("Game saved.")
+    session.step("EAST")
+    room = world.getRoom("OutsideBuilding")
+    passages = [ passage for passage in room.getPassages()
+                 if passage[1] != "EndOfRoad" ]
+    world.applyUpdate([ AdvRoom("OutsideBuilding",
+                                room.getShortDescription(),
+                                room.getLongText(), passages) ],
+                      [ "EndOfRoad" ])
+    assert "could not be read" in session.step("RESTORE")
+    assert session.getCurrentRoom() == "OutsideBuilding"
+
+def test_journal_restores_every_turn(world, tmp_path):
+    filename = str(tmp_path / "player.dat")
+    session, journal = playJournaled(world, filename,
+                                     [ "IN", "TAKE KEYS", "TAKE LAMP", "OUT" ])
+    journal.close()
+    restored = Journal(filename, world).restore()
+    assert getSummary(restored) == getSummary(session.getState())
+
+def test_journal_drops_torn_record(world, tmp_path):
+    filename = str(tmp_path / "player.dat")
+    session, journal = playJournaled(world, filename, [ "IN", "TAKE KEYS" ])
+    expected = getSummary(session.getState())
+    journal.close()
+    # A record for a move elsewhere, cut short partway through the write.
+    torn = encodeChanges([ (CHANGE_ROOM, 5, 0) ])
+    with open(filename + JOURNAL_SUFFIX, "ab") as f:
+        f.write(torn[:-3])
+    journal = Journal(filename, world)
+    state = journal.restore()
+    assert getSummary(state) == expected
+    # New records must follow the last complete one, not the torn bytes.
+    session = Session(world, state, journal)
+    session.step("OUT")
+    expected = getSummary(session.getState())
+    journal.close()
+    assert getSummary(Journal(filename, world).restore()) == expected
+
+@pytest.mark.parametrize("kind, index, value", [
+    (CHANGE_ROOM, None, 0), (CHANGE_ROOM, -1, 0), (CHANGE_VISITED, None, 0),
+    (CHANGE_VISITED, -1, 0), (CHANGE_OBJECT, -1, 0), (CHANGE_OBJECT, 0, None),
+    (CHANGE_OBJECT, 0, -3), (CHANGE_OBJECT, 1000, 0), (9, 0, 0) ])
+def test_journal_refuses_record_out_of_range(world, tmp_path, kind, index,
+                                             value):
+    filename = str(tmp_path / "player.dat")
+    session, journal = playJournaled(world, filename, [ "IN", "TAKE KEYS" ])
+    journal.close()
+    # A complete record, as a journal written for a larger world would
+    # hold, must not reach the state unchecked.
+    count = world.getRoomCount()
+    record = encodeChanges([ (kind, count if index is None else index,
+                              count if value is None else value) ])
+    with open(filename + JOURNAL_SUFFIX, "ab") as f:
+        f.write(record)
+    with pytest.raises(ValueError):
+        Journal(filename, world).restore()
+
+def test_journal_ignores_previous_generation(world, tmp_path):
+    filename = str(tmp_path / "player.dat")
+    session, journal = playJournaled(world, filename, [ "IN", "TAKE KEYS" ])
+    with open(filename + JOURNAL_SUFFIX, "rb") as f:
+        stale = f.read()
+    session.step("OUT")
+    journal.reset(session.getState())
+    expected = getSummary(session.getState())
+    journal.close()
+    # A crash after the new snapshot was written but before the journal
+    # was replaced leaves the old journal, whose changes the snapshot
+    # already includes and which would move the player back inside.
+    with open(filename + JOURNAL_SUFFIX, "wb") as f:
+        f.write(stale)
+    journal = Journal(filename, world)
+    state = journal.restore()
+    assert getSummary(state) == expected
+    assert journal.records == 0
+    journal.close()
+
+def test_journal_compacts(world, tmp_path):
+    filename = str(tmp_path / "player.dat")
+    commands = [ "IN", "OUT" ] * 5
+    session, journal = playJournaled(world, filename, commands, 3)
+    assert journal.generation > 1
+    assert journal.records <= 3
+    journal.close()
+    assert (os.path.getsize(filename + JOURNAL_SUFFIX)
+            < len(commands) * len(encodeChanges([ (CHANGE_ROOM, 0, 0) ])))
+    restored = Journal(filename, world).restore()
+    assert getSummary(restored) == getSummary(session.getState())
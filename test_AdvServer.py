@@ -0,0 +1,57 @@
+# File: test_AdvServer.py
+
+"""
+This module tests that a server with a SessionManager keeps no more of
+its sessions in memory than the manager allows, even while the players
+of the hibernated ones stay connected.
+"""
+
+import asyncio
+import gc
+import weakref
+import pytest
+from AdvGame import AdvGame
+from AdvServer import AdvServer, PROMPT, ENCODING
+from AdvSessionManager import SessionManager
+
+@pytest.fixture(scope="module")
+def world():
+    return AdvGame("Small", useCache=False).world
+
+async def connect(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    output = await reader.readuntil(PROMPT.encode(ENCODING))
+    return reader, writer, output.decode(ENCODING)
+
+async def send(connection, command):
+    reader, writer, output = connection
+    writer.write((command + "\n").encode(ENCODING))
+    output = await reader.readuntil(PROMPT.encode(ENCODING))
+    return output.decode(ENCODING)
+
+def test_idle_connection_does_not_keep_hibernated_session(world, tmp_path):
+    manager = SessionManager(world, str(tmp_path), 1)
+    server = AdvServer(world, manager=manager)
+
+    async def play():
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        first = await connect(port)
+        await send(first, "IN")
+        session = weakref.ref(next(iter(manager.live.values())))
+        second = await connect(port)
+        await send(second, "TAKE LAMP")
+        gc.collect()
+        released = session() is None
+        output = await send(first, "LOOK")
+        for reader, writer, greeting in [ first, second ]:
+            writer.close()
+            await writer.wait_closed()
+        listener.close()
+        await listener.wait_closed()
+        return released, output
+
+    released, output = asyncio.run(play())
+    assert released
+    assert manager.hibernations >= 1
+    assert "inside a building" in output
@@ -0,0 +1,118 @@
+# File: test_AdvSession.py
+
+"""
+This module tests that a Session plays a game with no terminal, that
+reaching EXIT ends a script cleanly, and that commands are understood
+through the vocabulary of the world, with synonyms for single words,
+and that TAKE ALL and DROP ALL move every object in order of their ids.
+"""
+
+import pytest
+from AdvGame import AdvGame
+from AdvObject import AdvObject
+from AdvRoom import AdvRoom
+from AdvSession import Session
+from AdvState import GameState
+from AdvWorld import World
+
+@pytest.fixture(scope="module")
+def world():
+    return AdvGame("Crowther", useCache=False).world
+
+def buildWorld(rooms, objects=()):
+    """Returns a World made from lists of AdvRoom and AdvObject
+    definitions, in which the game starts in the first room."""
+    room_table = { }
+    for room in rooms:
+        if len(room_table) == 0:
+            room_table["START"] = room
+        room_table[room.getName()] = room
+    object_table = { object.getName(): object for object in objects }
+    return World(room_table, object_table, None, Session.verbs)
+
+def test_session_needs_no_terminal(world, capsys):
+    session = Session(world)
+    output = session.start()
+    assert output == world.getRoom("OutsideBuilding").getLongText()
+    outputs = session.runScript([ "IN", "TAKE KEYS", "INVENTORY" ])
+    assert outputs[0].startswith("You are inside a building")
+    assert outputs[1] == "A set of keys was added to your inventory.\n"
+    assert outputs[2] == ("You are carrying:\n  a set of keys\n"
+                          "  a bottle of water\n")
+    assert session.step("SING") == "I don't understand that response.\n"
+    assert session.getCurrentRoom() == "InsideBuilding"
+    assert capsys.readouterr() == ("", "")
+
+def test_exit_ends_script():
+    world = buildWorld([
+        AdvRoom("Ledge", "Ledge", "A narrow ledge.\n",
+                [ ("JUMP", "Fall", None), ("WAIT", "Ledge", None) ]),
+        AdvRoom("Fall", "-", "You fall a long way down.\n",
+                [ ("FORCED", "EXIT", None) ])
+    ])
+    session = Session(world)
+    session.start()
+    outputs = session.runScript([ "WAIT", "JUMP", "WAIT", "LOOK" ])
+    assert outputs == [ "Ledge\n", "You fall a long way down.\n" ]
+    assert session.isFinished()
+    assert session.step("WAIT") == ""
+
+def test_quit_ends_script(world):
+    session = Session(world)
+    session.start()
+    assert session.runScript([ "IN", "Q", "OUT" ]) == [
+        world.getRoom("InsideBuilding").getLongText()
+        + "There is a set of keys here.\n", "" ]
+    assert session.isFinished()
+    assert session.getCurrentRoom() == "InsideBuilding"
+
+def test_synonyms_apply_to_each_word(world):
+    nugget = world.getObjectId("NUGGET")
+    state = GameState(world)
+    state.setCurrentRoom(world.getRoomId("NuggetRoom"))
+    session = Session(world, state)
+    session.start()
+    assert session.step("TAKE GOLD") == \
+           "A nugget of gold was added to your inventory.\n"
+    assert state.isCarrying(nugget)
+    assert session.step("RELEASE GOLD") == "You dropped a nugget of gold.\n"
+    assert not state.isCarrying(nugget)
+    assert session.step("CATCH GOLD").startswith("A nugget of gold")
+    assert state.isCarrying(nugget)
+
+def test_take_and_drop_all():
+    world = buildWorld([
+        AdvRoom("Hall", "Hall", "A hall.\n", [ ("EAST", "Attic", None) ]),
+        AdvRoom("Attic", "Attic", "An attic.\n", [ ("WEST", "Hall", None) ])
+    ], [ AdvObject("CUP", "a cup", "Hall"),
+         AdvObject("ANCHOR", "an anchor", "Attic"),
+         AdvObject("BELL", "a bell", "Hall"),
+         AdvObject("DRUM", "a drum", "PLAYER") ])
+    session = Session(world)
+    # Objects are listed in the order the objects file gives them.
+    assert session.start() == ("A hall.\nThere is a cup here.\n"
+                               "There is a bell here.\n")
+    assert session.step("TAKE ALL") == (
+        "A cup was added to your inventory.\n"
+        "A bell was added to your inventory.\n")
+    assert session.step("TAKE ALL") == \
+           "That object doesn't seem to be in this room.\n"
+    assert session.step("LOOK") == "A hall.\n"
+    assert session.step("EAST") == "An attic.\nThere is an anchor here.\n"
+    listing = ("There is a cup here.\nThere is an anchor here.\n"
+               "There is a bell here.\nThere is a drum here.\n")
+    # DROP describes the room again, with the objects in order of id.
+    assert session.step("DROP ALL") == ("You dropped a cup.\n"
+                                        "You dropped a bell.\n"
+                                        "You dropped a drum.\n"
+                                        "Attic\n" + listing)
+    assert session.step("DROP ALL") == (
+        "That object doesn't seem to be in your inventory.\n"
+        "Attic\n" + listing)
+    assert session.step("LOOK") == "An attic.\n" + listing
+    # Named objects are taken in the order named, and only once.
+    assert session.step("TAKE BELL BELL CUP") == (
+        "A bell was added to your inventory.\n"
+        "A cup was added to your inventory.\n")
+    assert session.step("INVENTORY") == \
+           "You are carrying:\n  a cup\n  a bell\n"
@@ -0,0 +1,82 @@
+# File: test_AdvSessionManager.py
+
+"""
+This module tests that a SessionManager hibernates and restores whole
+sessions, that the files of a discarded or earlier player are never
+handed to a new one, and that a game hibernated in a room that a reload
+deletes is not resumed there.
+"""
+
+import os
+import pytest
+from AdvGame import AdvGame
+from AdvRoom import AdvRoom
+from AdvSessionManager import SessionManager
+
+@pytest.fixture(scope="module")
+def world():
+    return AdvGame("Crowther", useCache=False).world
+
+def test_hibernated_session_is_restored(world, tmp_path):
+    manager = SessionManager(world, str(tmp_path), 1)
+    alice = manager.getSession("alice")
+    alice.start()
+    alice.step("IN")
+    alice.step("TAKE KEYS")
+    manager.getSession("bob").start()
+    assert manager.getLiveCount() == 1
+    alice = manager.getSession("alice")
+    assert alice.getCurrentRoom() == "InsideBuilding"
+    assert "a set of keys" in alice.step("INVENTORY")
+
+def test_discard_removes_save(world, tmp_path):
+    manager = SessionManager(world, str(tmp_path))
+    session = manager.getSession("player")
+    session.start()
+    session.step("IN")
+    assert session.step("SAVE").startswith("Game saved.")
+    manager.hibernateAll()
+    manager.discard("player")
+    assert os.listdir(str(tmp_path)) == [ ]
+    session = manager.getSession("player")
+    session.start()
+    assert "There is no saved game." in session.step("RESTORE")
+
+def test_clear_removes_files_of_earlier_run(world, tmp_path):
+    earlier = SessionManager(world, str(tmp_path))
+    session = earlier.getSession("connection1")
+    session.start()
+    session.step("IN")
+    session.step("TAKE KEYS")
+    session.step("SAVE")
+    earlier.hibernateAll()
+    manager = SessionManager(world, str(tmp_path))
+    manager.clear()
+    session = manager.getSession("connection1")
+    assert session.getCurrentRoom() == "OutsideBuilding"
+    assert "end of a road" in session.start()
+    assert "There is no saved game." in session.step("RESTORE")
+
+def deleteEndOfRoad(world):
+    """Deletes EndOfRoad from Small, along with the passages to it."""
+    room = world.getRoom("OutsideBuilding")
+    passages = [ passage for passage in room.getPassages()
+                 if passage[1] != "EndOfRoad" ]
+    world.applyUpdate([ AdvRoom("OutsideBuilding",
+                                room.getShortDescription(),
+                                room.getLongText(), passages) ],
+                      [ "EndOfRoad" ])
+
+def test_hibernated_game_in_deleted_room_is_refused(tmp_path):
+    world = AdvGame("Small", useCache=False).world
+    manager = SessionManager(world, str(tmp_path), 1)
+    alice = manager.getSession("alice")
+    alice.start()
+    alice.step("WEST")
+    bob = manager.getSession("bob")
+    bob.start()
+    deleteEndOfRoad(world)
+    with pytest.raises(ValueError):
+        manager.getSession("alice")
+    assert manager.getSession("bob") is bob
+    assert "inside a building" in bob.step("IN")
@@ -0,0 +1,76 @@
+# File: test_AdvState.py
+
+"""
+This module tests that the progress of each player is kept in its own
+compact GameState, so that many sessions can share one World without
+seeing each other's changes, and that the index of the objects at each
+location stays in step with the objects as they move.
+"""
+
+import random
+import pytest
+from AdvGame import AdvGame
+from AdvSession import Session
+from AdvState import GameState
+from AdvWorld import PLAYER_ID
+
+@pytest.fixture(scope="module")
+def world():
+    return AdvGame("Crowther", useCache=False).world
+
+def test_sessions_share_world_but_not_state(world):
+    initial = list(world.getInitialLocations())
+    rooms = dict(world.rooms)
+    first = Session(world)
+    second = Session(world)
+    first.start()
+    second.start()
+    first.runScript([ "IN", "TAKE KEYS" ])
+    output = second.step("IN")
+    assert "There is a set of keys here." in output
+    assert second.step("TAKE KEYS").startswith("A set of keys")
+    assert first.step("DROP KEYS") == "You dropped a set of keys.\n"
+    keys = world.getObjectId("KEYS")
+    assert first.getState().getLocation(keys) == world.getRoomId(
+        "InsideBuilding")
+    assert second.getState().isCarrying(keys)
+    # The World itself is never changed by play.
+    assert world.getInitialLocations() == initial
+    assert world.rooms == rooms
+    # A room seen by one player is still new to the other.
+    first.step("OUT")
+    assert second.step("OUT").startswith("Outside building")
+    assert Session(world).start().startswith("You are standing")
+
+def test_state_is_compact(world):
+    state = GameState(world)
+    assert not hasattr(state, "__dict__")
+    assert len(state.visited) == (world.getRoomCount() + 7) // 8
+    assert len(state.locations) == world.getObjectCount()
+    assert state.locations.itemsize == 4
+    last = world.getRoomCount() - 1
+    assert not state.hasVisited(last)
+    state.setVisited(last)
+    assert state.hasVisited(last)
+    assert not state.hasVisited(last - 1)
+    state.moveObject(0, PLAYER_ID)
+    assert GameState(world).getLocation(0) == world.getInitialLocations()[0]
+
+def test_location_index_follows_moves(world):
+    rng = random.Random(1)
+    state = GameState(world)
+    state.getContents()
+    locations = [ PLAYER_ID ] + list(range(world.getRoomCount()))
+    for move in range(2000):
+        object_id = rng.randrange(world.getObjectCount())
+        state.moveObject(object_id, rng.choice(locations[:5]))
+        if move % 100 == 0:
+            expected = GameState(world)
+            expected.locations[:] = state.locations
+            assert state.getContents() == expected.getContents()
+    for location in locations[:5]:
+        objects = [ object_id for object_id in range(world.getObjectCount())
+                    if state.getLocation(object_id) == location ]
+        assert state.getObjectsAt(location) == objects
+        assert state.countObjectsAt(location) == len(objects)
+    assert state.getInventory() == state.getObjectsAt(PLAYER_ID)
@@ -0,0 +1,61 @@
+# File: test_AdvTranscript.py
+
+"""
+This module tests that transcripts replay to the states they recorded,
+including games that save and restore.
+"""
+
+import pytest
+from AdvGame import AdvGame
+from AdvSession import Session
+from AdvTranscript import Transcript, TranscriptRecorder
+
+@pytest.fixture(scope="module")
+def world():
+    return AdvGame("Crowther", useCache=False).world
+
+def recordGame(world, directory, commands, interval=100):
+    """Plays commands in a game that can save to a file in directory and
+    returns the pair (transcript, outputs), where outputs holds the text
+    of the opening description and of each command."""
+    filename = str(directory / "game.advt")
+    session = Session(world, savePath=str(directory / "Save.dat"))
+    recorder = TranscriptRecorder(filename, session, "Crowther", interval)
+    outputs = [ recorder.start() ]
+    for command in commands:
+        outputs.append(recorder.step(command))
+    recorder.close()
+    return Transcript(filename), outputs
+
+@pytest.mark.parametrize("interval", [ 1, 2, 100 ])
+def test_replay_matches_recording(world, tmp_path, interval):
+    commands = [ "IN", "TAKE KEYS", "OUT", "WEST", "EAST", "QUIT" ]
+    transcript, outputs = recordGame(world, tmp_path, commands, interval)
+    assert transcript.findDivergence(world) is None
+    assert transcript.findDivergence(world, True) is None
+    for turn in range(len(commands) + 1):
+        assert transcript.replayTo(world, turn)[1] == outputs[turn]
+
+@pytest.mark.parametrize("interval", [ 2, 100 ])
+def test_replay_restore(world, tmp_path, interval):
+    commands = [ "IN", "SAVE", "OUT", "RESTORE", "LOOK", "TAKE KEYS",
+                 "RESTORE", "OUT", "QUIT" ]
+    transcript, outputs = recordGame(world, tmp_path, commands, interval)
+    # The save file is gone by the time the game is replayed.
+    (tmp_path / "Save.dat").unlink()
+    assert transcript.findDivergence(world) is None
+    assert transcript.findDivergence(world, True) is None
+    for turn in range(len(commands) + 1):
+        session, output = transcript.replayTo(world, turn)
+        assert output == outputs[turn]
+    session, output = transcript.replayTo(world, 5)
+    assert "Game restored." not in output
+    assert session.getCurrentRoom() == "InsideBuilding"
+    assert "Game restored." in transcript.replayTo(world, 4)[1]
+
+def test_replay_failed_restore(world, tmp_path):
+    commands = [ "RESTORE", "IN", "QUIT" ]
+    transcript, outputs = recordGame(world, tmp_path, commands, 1)
+    assert "There is no saved game." in outputs[1]
+    assert transcript.findDivergence(world) is None
+    assert transcript.replayTo(world, 1)[1] == outputs[1]
@@ -0,0 +1,334 @@
+# File: test_AdvWorld.py
+
+"""
+This module tests how a World chooses passages, and that applyUpdate
+refuses invalid updates and puts back everything they touched, so that
+the game plays exactly as it did before, that the World still accepts a
+valid update afterwards, and that a room is deleted only once nothing
+refers to it.
+"""
+
+import random
+import sys
+import pytest
+from AdvGame import AdvGame
+from AdvObject import AdvObject
+from AdvRoom import AdvRoom
+from AdvSession import Session
+from AdvState import GameState
+from AdvWorld import World, PLAYER_ID, EXIT_ID, EXIT_ROOM, UNKNOWN_WORD
+from AdvWorld import NO_KEY, UNKNOWN_KEY
+
+def buildWorld(rooms, objects=(), synonyms=None):
+    """Returns a World made from lists of AdvRoom and AdvObject
+    definitions, in which the game starts in the first room."""
+    room_table = { }
+    for room in rooms:
+        if len(room_table) == 0:
+            room_table["START"] = room
+        room_table[room.getName()] = room
+    object_table = { object.getName(): object for object in objects }
+    return World(room_table, object_table, synonyms, Session.verbs)
+
+def loadWorld():
+    return AdvGame("Crowther", useCache=False).world
+
+def changeRoom(world, name, extra):
+    """Returns a copy of the named room with the extra passages added."""
+    room = world.getRoom(name)
+    return AdvRoom(name, room.getShortDescription(), room.getLongText(),
+                   room.getPassages() + extra)
+
+def getStructure(world):
+    """Returns the parts of a World that an update changes."""
+    return (
+        [ id(room) for room in world.room_list ],
+        { name: id(room) for name, room in world.rooms.items() },
+        dict(world.room_ids),
+        [ id(object) for object in world.object_list ],
+        dict(world.object_ids),
+        dict(world.objects or { }),
+        list(world.initial_locations),
+        { room_id: set(object_ids) for room_id, object_ids
+          in world.initial_contents.items() },
+        list(world.presence_texts),
+        { room_id: tuple(bytes(part) for part in patch)
+          for room_id, patch in world.passage_patches.items() },
+        { room_id: set(sources) for room_id, sources
+          in world.patch_sources.items() },
+        dict(world.synonyms or { }),
+        dict(world.deleted_rooms),
+        set(world.conditional_rooms),
+        { key: set(room_ids) for key, room_ids in world.unknown_keys.items() },
+        world.generation
+    )
+
+def playRandomly(world, seed, turns=200):
+    """Plays random passages, with TAKE ALL and DROP ALL, and returns the
+    output of the whole game."""
+    rng = random.Random(seed)
+    session = Session(world)
+    outputs = [ session.start() ]
+    for turn in range(turns):
+        if session.isFinished(): break
+        verbs, targets, keys, start, end = \
+            world.getPassageRange(session.getState().getCurrentRoom())
+        choice = rng.randrange(end - start + 2)
+        if choice == 0:
+            command = "TAKE ALL"
+        elif choice == 1:
+            command = "DROP ALL"
+        else:
+            command = world.getWord(verbs[start + choice - 2])
+        outputs.append(session.step(command))
+    return outputs
+
+def findPassageSources(world, target):
+    """Returns the ids of the rooms with a passage to target by looking
+    at every passage."""
+    sources = set()
+    for room_id in range(world.getRoomCount()):
+        verbs, targets, keys, start, end = world.getPassageRange(room_id)
+        if target in targets[start:end]:
+            sources.add(room_id)
+    return sources
+
+def test_passages_are_chosen_by_verb_and_key():
+    world = buildWorld([
+        AdvRoom("Hall", "Hall", "A hall.\n",
+                [ ("XYZZY", "Vault", "LAMP"), ("NORTH", "Cellar", None),
+                  ("XYZZY", "Cellar", None), ("WAVE", "Vault", "WAND"),
+                  ("OUT", "EXIT", None) ]),
+        AdvRoom("Vault", "Vault", "A vault.\n", [ ("OUT", "Hall", None) ]),
+        AdvRoom("Cellar", "Cellar", "A cellar.\n", [ ("UP", "Hall", None) ])
+    ], [ AdvObject("LAMP", "a lamp", "Cellar") ])
+    state = GameState(world)
+    hall = world.getRoom("Hall")
+    hall_id = world.getRoomId("Hall")
+    assert world.getNextRoom(hall, "XYZZY", state) == "Cellar"
+    assert world.getNextRoom(hall, "NORTH", state) == "Cellar"
+    # A key that names no object can never be carried.
+    assert world.getNextRoom(hall, "WAVE", state) is None
+    assert world.getNextRoom(hall, "SOUTH", state) is None
+    assert world.getNextRoom(hall, "PLUGH", state) is None
+    assert world.getNextRoom(hall, "OUT", state) == EXIT_ROOM
+    assert world.getNextRoomId(hall_id, world.lookupWord("OUT")) == EXIT_ID
+    state.moveObject(world.getObjectId("LAMP"), PLAYER_ID)
+    assert world.getNextRoom(hall, "XYZZY", state) == "Vault"
+    # Without a state, no key is carried.
+    assert world.getNextRoom(hall, "XYZZY") == "Cellar"
+
+def forcedRoom(name, text, passages):
+    """Returns a forced room with the specified passages."""
+    return AdvRoom(name, "-", text, passages)
+
+def test_forced_chain_is_resolved_at_load():
+    world = buildWorld([
+        AdvRoom("Ledge", "Ledge", "A ledge.\n", [ ("JUMP", "Slide", None) ]),
+        forcedRoom("Slide", "You slide down.\n", [ ("FORCED", "Chute", None) ]),
+        forcedRoom("Chute", "And further down.\n",
+                   [ ("FORCED", "Gate", None) ]),
+        forcedRoom("Gate", "A gate swings open.\n",
+                   [ ("FORCED", "Vault", "LAMP"), ("FORCED", "Cellar", None) ]),
+        AdvRoom("Vault", "Vault", "A vault.\n", [ ]),
+        AdvRoom("Cellar", "Cellar", "A cellar.\n", [ ])
+    ], [ AdvObject("LAMP", "a lamp", "Ledge") ])
+    # The unconditional part of the chain becomes a single jump.
+    assert world.getForcedJump(world.getRoomId("Slide")) == (
+        "You slide down.\nAnd further down.\n", world.getRoomId("Gate"))
+    assert world.conditional_rooms == { world.getRoomId("Gate") }
+    session = Session(world)
+    session.start()
+    assert session.step("JUMP") == ("You slide down.\nAnd further down.\n"
+                                    "A gate swings open.\nA cellar.\n")
+    session = Session(world)
+    session.start()
+    session.step("TAKE LAMP")
+    assert session.step("JUMP").endswith("A gate swings open.\nA vault.\n")
+
+@pytest.mark.parametrize("rooms, message", [
+    ([ forcedRoom("Loop", "Round.\n", [ ("FORCED", "Loop", None) ]) ],
+     "Forced rooms form a cycle through Loop"),
+    ([ forcedRoom("LoopA", "Round.\n", [ ("FORCED", "LoopB", None) ]),
+       forcedRoom("LoopB", "And round.\n", [ ("FORCED", "LoopA", None) ]) ],
+     "Forced rooms form a cycle through Loop"),
+    ([ forcedRoom("LoopA", "Round.\n", [ ("FORCED", "LoopB", "LAMP"),
+                                         ("FORCED", "Hall", None) ]),
+       forcedRoom("LoopB", "And round.\n", [ ("FORCED", "LoopA", None) ]) ],
+     "Forced rooms form a cycle through LoopA"),
+    ([ forcedRoom("Stuck", "Nowhere to go.\n", [ ("NORTH", "Hall", None) ]) ],
+     "Forced room Stuck has no FORCED passage$"),
+    ([ forcedRoom("Locked", "Locked in.\n", [ ("FORCED", "Hall", "LAMP") ]) ],
+     "Forced room Locked has no FORCED passage without a key"),
+    ([ forcedRoom("Lost", "Lost.\n", [ ("FORCED", "Nowhere", None) ]) ],
+     "Unknown room Nowhere in passage FORCED from Lost")
+])
+def test_bad_forced_rooms_are_refused_at_load(rooms, message):
+    hall = AdvRoom("Hall", "Hall", "A hall.\n",
+                   [ ("GO", rooms[0].getName(), None) ])
+    with pytest.raises(ValueError, match=message):
+        buildWorld([ hall ] + rooms, [ AdvObject("LAMP", "a lamp", "Hall") ])
+
+def test_passages_are_sorted_arrays():
+    world = loadWorld()
+    for room_id in range(world.getRoomCount()):
+        room = world.getRoomById(room_id)
+        verbs, targets, keys, start, end = world.getPassageRange(room_id)
+        assert verbs.typecode == targets.typecode == keys.typecode == "i"
+        expected = [ ]
+        for response, next, key in room.getPassages():
+            next_id = EXIT_ID if next == EXIT_ROOM else world.getRoomId(next)
+            key_id = NO_KEY
+            if key is not None:
+                key_id = world.getObjectId(key)
+                if key_id is None:
+                    key_id = UNKNOWN_KEY
+            expected.append((world.lookupWord(response), next_id, key_id))
+        # The sort is stable, so passages with the same verb are tried in
+        # the order the rooms file gives them.
+        expected.sort(key=lambda entry: entry[0])
+        assert list(zip(verbs[start:end], targets[start:end],
+                        keys[start:end])) == expected, room.getName()
+
+def test_rooms_are_compact():
+    world = loadWorld()
+    room = world.getRoom("OutsideBuilding")
+    assert not hasattr(room, "__dict__")
+    assert not hasattr(world.getObject(0), "__dict__")
+    text = room.getLongText()
+    assert isinstance(text, str) and text.endswith("\n")
+    assert room.getLongDescription() == text.split("\n")[:-1]
+    # Passages share the interned names of the rooms they lead to.
+    for response, next, key in room.getPassages():
+        assert next is world.getRoom(next).getName()
+
+def test_vocabulary_merges_synonyms():
+    world = loadWorld()
+    assert world.lookupWord("GOLD") == world.lookupWord("NUGGET")
+    assert world.getWord(world.lookupWord("GOLD")) == "NUGGET"
+    assert world.lookupWord("N") == world.lookupWord("NORTH")
+    assert world.lookupWord("LOOK") != UNKNOWN_WORD
+    assert world.lookupWord("XYZZY") != UNKNOWN_WORD
+    assert world.lookupWord("FROTZ") == UNKNOWN_WORD
+    assert world.canonicalize([ "CATCH", "GOLD", "FROTZ" ]) == \
+           [ "TAKE", "NUGGET", "FROTZ" ]
+    # Every canonical word has its own id, and the words are interned.
+    for word_id, word in enumerate(world.words):
+        assert world.lookupWord(word) == word_id or word in world.synonyms
+        assert world.getWord(word_id) is sys.intern(word)
+
+def test_room_with_many_exits():
+    count = 500
+    rooms = [ AdvRoom("Hub", "Hub", "A hub.\n",
+                      [ ("EXIT%d" % (count - i), "Room%d" % i, None)
+                        for i in range(count) ]) ]
+    rooms += [ AdvRoom("Room%d" % i, "Room", "A room.\n",
+                       [ ("BACK", "Hub", None) ]) for i in range(count) ]
+    world = buildWorld(rooms)
+    hub = world.getRoom("Hub")
+    for i in range(count):
+        assert world.getNextRoom(hub, "EXIT%d" % (count - i)) == "Room%d" % i
+    assert world.getNextRoom(hub, "EXIT0") is None
+
+def getRefusedUpdates(world):
+    """Returns a list of (label, arguments) pairs for invalid updates."""
+    return [
+        ("unknown room", {
+            "rooms": [ AdvRoom("Annex", "Annex", "A small annex.\n",
+                               [ ("OUT", "OutsideBuilding", None) ]),
+                       changeRoom(world, "OutsideBuilding",
+                                  [ ("NE", "Annex", None),
+                                    ("LAMP", "Nowhere", "TORCH") ]) ],
+            "objects": [ AdvObject("TORCH", "a torch", "Annex"),
+                         AdvObject("KEYS", "a ring of keys", "Annex") ] }),
+        ("forced cycle", {
+            "rooms": [ AdvRoom("LoopA", "-", "Round and round.\n",
+                               [ ("FORCED", "LoopB", None) ]),
+                       AdvRoom("LoopB", "-", "And round.\n",
+                               [ ("FORCED", "LoopA", None) ]),
+                       changeRoom(world, "InsideBuilding",
+                                  [ ("LOOP", "LoopA", None),
+                                    ("WAVE", "Valley", "WAND") ]) ],
+            "objects": [ AdvObject("RING", "a ring", "LoopA"),
+                         AdvObject("LAMP", "a dim lamp", "InsideBuilding") ],
+            "synonyms": { "SPIN": "LOOP", "Q": "QUIT" },
+            "removedSynonyms": [ "N", "GET" ] }),
+        ("deleted room in use", {
+            "rooms": [ changeRoom(world, "Valley",
+                                  [ ("WEST", "InsideBuilding", None) ]) ],
+            "deleted": [ "EndOfRoad" ] }),
+        ("deleted first room", {
+            "deleted": [ "OutsideBuilding" ] }),
+    ]
+
+@pytest.mark.parametrize("index", range(4))
+def test_refused_update_changes_nothing(index):
+    pristine = loadWorld()
+    world = loadWorld()
+    # A game in progress when the update arrives.
+    session = Session(world)
+    session.start()
+    session.runScript([ "IN", "TAKE KEYS", "OUT" ])
+    before = getStructure(world)
+    vocabulary = dict(world.vocabulary)
+    label, arguments = getRefusedUpdates(world)[index]
+    with pytest.raises(ValueError):
+        world.applyUpdate(**arguments)
+    assert getStructure(world) == before, label
+    for word, word_id in vocabulary.items():
+        assert world.vocabulary[word] == word_id, word
+    expected = Session(pristine)
+    expected.start()
+    expected.runScript([ "IN", "TAKE KEYS", "OUT" ])
+    for command in [ "INVENTORY", "WEST", "EAST", "IN", "DROP KEYS", "OUT" ]:
+        assert session.step(command) == expected.step(command), command
+    for seed in range(10):
+        assert playRandomly(world, seed) == playRandomly(pristine, seed)
+
+def test_valid_update_after_refused_one():
+    world = loadWorld()
+    for label, arguments in getRefusedUpdates(world):
+        with pytest.raises(ValueError):
+            world.applyUpdate(**arguments)
+    world.applyUpdate(
+        rooms=[ AdvRoom("Annex", "Annex", "A small annex.\n",
+                        [ ("OUT", "OutsideBuilding", None) ]),
+                changeRoom(world, "OutsideBuilding",
+                           [ ("NE", "Annex", None) ]) ],
+        objects=[ AdvObject("TORCH", "a torch", "Annex") ],
+        synonyms={ "NORTHEAST": "NE" })
+    assert world.generation == 1
+    session = Session(world)
+    session.start()
+    output = session.step("NORTHEAST")
+    assert output == "A small annex.\nThere is a torch here.\n"
+    assert "a torch" in session.runScript([ "TAKE TORCH", "INVENTORY" ])[1]
+    assert session.step("OUT").startswith("Outside building")
+
+def test_deleted_room_must_be_unused():
+    world = loadWorld()
+    outside = world.getRoom("OutsideBuilding")
+    with pytest.raises(ValueError, match="to deleted room EndOfRoad"):
+        world.applyUpdate(deleted=[ "EndOfRoad" ])
+    world.applyUpdate(
+        rooms=[ AdvRoom("Annex", "Annex", "A small annex.\n",
+                        [ ("OUT", "OutsideBuilding", None) ]),
+                changeRoom(world, "OutsideBuilding",
+                           [ ("NE", "Annex", None) ]) ],
+        objects=[ AdvObject("TORCH", "a torch", "Annex") ])
+    annex_id = world.getRoomId("Annex")
+    with pytest.raises(ValueError, match="Object TORCH starts in deleted room"):
+        world.applyUpdate(deleted=[ "Annex" ])
+    world.applyUpdate(objects=[ AdvObject("TORCH", "a torch",
+                                          "OutsideBuilding") ])
+    with pytest.raises(ValueError, match="Room OutsideBuilding has a passage "
+                                         "to deleted room Annex"):
+        world.applyUpdate(deleted=[ "Annex" ])
+    world.applyUpdate(rooms=[ outside ], deleted=[ "Annex" ])
+    assert world.getDeletedRoomIds() == { annex_id }
+    assert annex_id not in world.patch_sources
+    assert annex_id not in world.initial_contents
+    for name in [ "OutsideBuilding", "EndOfRoad", "InsideBuilding" ]:
+        room_id = world.getRoomId(name)
+        assert world.getPassageSources(room_id) == \
+               findPassageSources(world, room_id), name
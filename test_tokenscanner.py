@@ -0,0 +1,110 @@
+# File: test_tokenscanner.py
+
+"""
+This module tests that the fast mode of TokenScanner and its batch
+tokenizeLines method produce exactly the same tokens as the
+character-by-character scanner, on random inputs across every
+combination of configuration options, whether the lines come from a
+list or from an open file.
+"""
+
+import io
+import random
+import pytest
+from tokenscanner import TokenScanner
+
+# Constants
+
+CASES = 300
+SEED = 121
+
+ALPHABET = ("abcXYZ019_ \t\n\r\x0b\x0c\x1c\x85\xa0\u2028\u3000"
+            "=<>+-*/!?.,;:'\"\\[]^$()|\xe9\xb2\u0663\u2167")
+
+WORD_CHARACTERS = [ "", "_", "-", "]^\\[", "\xe9'", "=_" ]
+
+OPERATOR_SETS = [
+    [ ],
+    [ "=", "==", "<=", ">=", "!=" ],
+    [ "+", "++", "+++", "-=" ],
+    [ "<<=", "<>" ],
+    [ " ", "\n", "//" ],
+    [ "a=", "x", "..." ],
+]
+
+CONFIGURATIONS = [ (word_chars, operators, ignore_whitespace)
+                   for word_chars in WORD_CHARACTERS
+                   for operators in OPERATOR_SETS
+                   for ignore_whitespace in [ False, True ] ]
+
+def makeScanner(text, word_chars, operators, ignore_whitespace, fast):
+    """Returns a TokenScanner with the specified configuration."""
+    scanner = TokenScanner(text)
+    scanner.setFastMode(fast)
+    if ignore_whitespace:
+        scanner.ignoreWhitespace()
+    scanner.addWordCharacters(word_chars)
+    for op in operators:
+        scanner.addOperator(op)
+    return scanner
+
+def readTokens(scanner, rng=None):
+    """Reads every token using the hasMoreTokens/nextToken pattern,
+    occasionally pushing a token back if rng is supplied."""
+    tokens = [ ]
+    while scanner.hasMoreTokens():
+        token = scanner.nextToken()
+        if rng is not None and rng.random() < 0.1:
+            scanner.saveToken(token)
+            token = scanner.nextToken()
+        tokens.append(token)
+    return tokens
+
+def makeTexts(seed):
+    """Returns a list of fixed and random inputs."""
+    rng = random.Random(seed)
+    texts = [ "", " ", "TAKE LAMP", "  x  ", "a==b<=c", "+++++", "<<<=>" ]
+    for i in range(CASES):
+        length = rng.randint(0, 40)
+        texts.append("".join(rng.choice(ALPHABET) for j in range(length)))
+    return texts
+
+@pytest.mark.parametrize("config", CONFIGURATIONS)
+def test_fast_mode_matches_scanner(config):
+    rng = random.Random(SEED)
+    for text in makeTexts(SEED):
+        seed = rng.random()
+        expected = readTokens(makeScanner(text, *config, fast=False),
+                              random.Random(seed))
+        actual = readTokens(makeScanner(text, *config, fast=True),
+                            random.Random(seed))
+        assert actual == expected, text
+
+@pytest.mark.parametrize("fast", [ False, True ])
+@pytest.mark.parametrize("config", CONFIGURATIONS)
+def test_tokenize_lines_matches_scanner(config, fast):
+    texts = makeTexts(SEED)
+    scanner = makeScanner("", *config, fast=fast)
+    batch = list(scanner.tokenizeLines(texts))
+    assert len(batch) == len(texts)
+    for text, actual in zip(texts, batch):
+        expected = readTokens(makeScanner(text, *config, fast=False))
+        assert actual == expected, text
+
+@pytest.mark.parametrize("newline", [ None, "", "\n" ])
+def test_tokenize_lines_reads_file(newline):
+    # Lines read from a file cannot hold the characters that end them,
+    # and the last line has no line terminator at all.
+    lines = [ text.replace("\n", "").replace("\r", "")
+              for text in makeTexts(SEED) ] + [ "TAKE LAMP" ]
+    endings = [ "\r\n", "\n" ]
+    data = "".join(line + endings[i % 2] for i, line in enumerate(lines[:-1]))
+    data += lines[-1]
+    for config in CONFIGURATIONS:
+        expected = [ readTokens(makeScanner(line, *config, fast=False))
+                     for line in lines ]
+        for fast in [ False, True ]:
+            scanner = makeScanner("", *config, fast=fast)
+            source = io.StringIO(data, newline=newline)
+            assert list(scanner.tokenizeLines(source)) == expected, \
+                   (config, fast)
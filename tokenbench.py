@@ -0,0 +1,66 @@
+# File: tokenbench.py
+
+"""
+This program times the character-by-character TokenScanner, its fast
+mode and its batch tokenizeLines method on typical Adventure commands
+and on long inputs.  The tests in test_tokenscanner.py check that the
+three produce exactly the same tokens.
+"""
+
+import argparse
+import sys
+import time
+from tokenscanner import TokenScanner
+
+# Constants
+
+TYPICAL_COMMANDS = [ "TAKE LAMP", "DROP KEYS WATER", "TAKE THE GOLD NUGGET",
+                     "INVENTORY", "XYZZY", "DROP ROD, BIRD AND CAGE" ]
+
+def timeTokens(texts, fast, repeat):
+    """Returns the time in seconds to tokenize every text repeat times."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        for text in texts:
+            scanner = TokenScanner(text)
+            scanner.setFastMode(fast)
+            scanner.ignoreWhitespace()
+            while scanner.hasMoreTokens():
+                scanner.nextToken()
+    return time.perf_counter() - start
+
+def timeBatch(texts, repeat):
+    """Returns the time in seconds to tokenize every text repeat times
+    using a single call to tokenizeLines."""
+    scanner = TokenScanner()
+    scanner.ignoreWhitespace()
+    start = time.perf_counter()
+    for tokens in scanner.tokenizeLines(texts * repeat):
+        pass
+    return time.perf_counter() - start
+
+# Main program
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the TokenScanner fast paths.")
+    parser.add_argument("--repeat", type=int, default=2000,
+                        help="repetitions of the command benchmark")
+    options = parser.parse_args(args)
+    long_text = " ".join(TYPICAL_COMMANDS) * 2000
+    benchmarks = [ ("commands", TYPICAL_COMMANDS, options.repeat),
+                   ("long input", [ long_text ], 3) ]
+    for label, texts, repeat in benchmarks:
+        slow = timeTokens(texts, False, repeat)
+        fast = timeTokens(texts, True, repeat)
+        batch = timeBatch(texts, repeat)
+        count = repeat * len(texts)
+        print("%-12s slow %9.2f us   fast %9.2f us   batch %9.2f us" %
+              (label, slow / count * 1e6, fast / count * 1e6,
+               batch / count * 1e6))
+    return 0
+
+# Startup code
+
+if __name__ == "__main__":
+    sys.exit(main())
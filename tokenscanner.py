@@ -26,6 +26,20 @@ model that is shared across a variety of languages.
 # The TokenScanner class exports several additional methods that give
 # clients more control over its behavior.  Those methods are described
 # individually in the documentation.
+#
+# Fast mode
+# ---------
+# When the input is a string and the scanner is not configured to scan
+# numbers, strings or comments, nextToken does not read the input one
+# character at a time.  Instead, the scanner compiles its configuration
+# into a single regular expression that matches the optional whitespace
+# and the next token in one step.  The word alternative comes first, and
+# the operators are tried longest first, so the fast path returns exactly
+# the tokens that the character-by-character scanner would.  Compiled
+# patterns are shared by every scanner with the same configuration.
+# Calling setFastMode(False) forces the character-by-character scanner.
+
+import re
 
 class TokenScanner:
 
@@ -59,7 +73,10 @@ class TokenScanner:
         self._scanNumbersFlag = False
         self._scanStringsFlag = False
         self._operators = set()
+        self._operatorPrefixes = set()
         self._wordChars = ""
+        self._fastModeFlag = True
+        self._fastPattern = None
         self.setInput(input)
 
 # Sets the scanner input to the specified string or file.  Any previous
@@ -89,6 +106,14 @@ class TokenScanner:
     def nextToken(self):
         if len(self._savedTokens) != 0:
             return self._savedTokens.pop()
+        if self._file is None and len(self._savedCharacters) == 0:
+            pattern = self._fastPattern
+            if pattern is None:
+                pattern = self._compileFastPattern()
+            if pattern:
+                match = pattern.match(self._buffer, self._cp)
+                self._cp = match.end()
+                return match.group(1)
         while True:
             if self._ignoreWhitespaceFlag:
                 self.skipSpaces()
@@ -129,6 +154,56 @@ class TokenScanner:
                 op = op[0:-1]
             return op
 
+# Reads each string in source, which is either an iterable of strings or
+# an open file, and yields the list of tokens in each one.  Lines read from
+# a file have their line terminators removed first.  The configuration of
+# the scanner is resolved once for the whole batch, and the lines are
+# processed one at a time, so the batch can be arbitrarily long.  When the
+# fast path does not apply, this method reuses the scanner itself, which
+# replaces any input previously set.
+
+    def tokenizeLines(self, source):
+        strip = hasattr(source, "readline")
+        pattern = self._fastPattern
+        if pattern is None:
+            pattern = self._compileFastPattern()
+        if pattern:
+            findall = pattern.findall
+            for line in source:
+                if strip:
+                    line = line.rstrip("\r\n")
+                tokens = findall(line)
+                # The empty alternative only matches at the end of the line.
+                while len(tokens) != 0 and tokens[-1] == "":
+                    tokens.pop()
+                yield tokens
+        else:
+            for line in source:
+                if strip:
+                    line = line.rstrip("\r\n")
+                self.setInput(line)
+                tokens = [ ]
+                while True:
+                    token = self.nextToken()
+                    if token == "": break
+                    tokens.append(token)
+                yield tokens
+
+# Returns the list of tokens in the string text.  This method is the
+# single-line form of tokenizeLines.
+
+    def tokenize(self, text):
+        pattern = self._fastPattern
+        if pattern is None:
+            pattern = self._compileFastPattern()
+        if not pattern:
+            for tokens in self.tokenizeLines((text,)):
+                return tokens
+        tokens = pattern.findall(text)
+        while len(tokens) != 0 and tokens[-1] == "":
+            tokens.pop()
+        return tokens
+
 # Saves one token to reread later.
 
     def saveToken(self, token):
@@ -151,6 +226,7 @@ class TokenScanner:
 
     def ignoreWhitespace(self):
         self._ignoreWhitespaceFlag = True
+        self._fastPattern = None
 
 # Tells the scanner to ignore comments.  The scanner package recognizes
 # both the slash-star and slash-slash comment format from the C-based
@@ -162,6 +238,7 @@ class TokenScanner:
 
     def ignoreComments(self):
         self._ignoreCommentsFlag = True
+        self._fastPattern = None
 
 # Controls how the scanner treats tokens that begin with a digit.  By
 # default, the nextToken method treats numbers and letters identically
@@ -175,6 +252,7 @@ class TokenScanner:
 
     def scanNumbers(self):
         self._scanNumbersFlag = True
+        self._fastPattern = None
 
 # Controls how the scanner treats tokens enclosed in quotation marks.  By
 # default, quotation marks (either single or double) are treated just like
@@ -189,6 +267,7 @@ class TokenScanner:
 
     def scanStrings(self):
         self._scanStringsFlag = True
+        self._fastPattern = None
 
 # Adds the characters in chars to the set of characters that are acceptable
 # in an identifier.  For example, calling addWordCharacters("_") adds the
@@ -196,6 +275,7 @@ class TokenScanner:
 
     def addWordCharacters(self, chars):
         self._wordChars += chars
+        self._fastPattern = None
 
 # Defines a new multicharacter operator.  Whenever you call nextToken
 # when the input stream contains operator characters, the scanner returns
@@ -203,6 +283,18 @@ class TokenScanner:
 
     def addOperator(self, op):
         self._operators.add(op)
+        for i in range(len(op) + 1):
+            self._operatorPrefixes.add(op[:i])
+        self._fastPattern = None
+
+# Enables or disables the compiled fast path described in the package
+# documentation.  Fast mode is on by default and produces the same tokens
+# as the character-by-character scanner, so the only reason to turn it
+# off is to compare the two.
+
+    def setFastMode(self, flag):
+        self._fastModeFlag = flag
+        self._fastPattern = None
 
 # Returns the current position of the scanner in the self._buffer stream.
 # If saveToken has been called, this position corresponds to the
@@ -434,10 +526,46 @@ class TokenScanner:
         return op in self._operators
 
     def isOperatorPrefix(self, op):
-        for name in self._operators:
-            if name.startswith(op):
-                return True
-        return False
+        return op in self._operatorPrefixes
+
+    def _compileFastPattern(self):
+        if (not self._fastModeFlag or self._ignoreCommentsFlag
+                or self._scanNumbersFlag or self._scanStringsFlag):
+            self._fastPattern = False
+        else:
+            self._fastPattern = _compileTokenPattern(
+                self._wordChars, tuple(sorted(self._operators)),
+                self._ignoreWhitespaceFlag)
+        return self._fastPattern
+
+# Private functions
+
+_tokenPatterns = { }
+
+def _compileTokenPattern(wordChars, operators, ignoreWhitespace):
+    key = (wordChars, operators, ignoreWhitespace)
+    pattern = _tokenPatterns.get(key)
+    if pattern is not None:
+        return pattern
+    if wordChars == "":
+        word = "[^\\W_]+"
+    elif "_" in wordChars:
+        word = "[\\w" + _escapeClass(wordChars) + "]+"
+    else:
+        word = "(?:[^\\W_]|[" + _escapeClass(wordChars) + "])+"
+    multi = sorted((op for op in operators if len(op) > 1),
+                   key=len, reverse=True)
+    alternatives = [ word ] + [ re.escape(op) for op in multi ] + [ ".", "" ]
+    skip = ""
+    if ignoreWhitespace:
+        single = "".join(op for op in operators if len(op) == 1)
+        skip = "[^\\S" + _escapeClass(single) + "]*"
+    pattern = re.compile(skip + "(" + "|".join(alternatives) + ")", re.DOTALL)
+    _tokenPatterns[key] = pattern
+    return pattern
+
+def _escapeClass(chars):
+    return "".join("\\" + ch if ch in "\\]^-[" else ch for ch in chars)
 
 # Startup code
 